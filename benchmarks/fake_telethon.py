@@ -0,0 +1,291 @@
+"""بديل Telethon يعمل دون اتصال لقياس أداء محرك النشر.
+
+install() يسجل وحدات telethon وهمية في sys.modules قبل استيراد خدمات البوت، فتستخدم
+PostingService وTelegramClientPool العميل الوهمي دون أي حساب تيليجرام حقيقي.
+يمكن ضبط زمن الاستجابة ونسبة FloodWait ونسبة الأخطاء عبر FakeTransportConfig."""
+
+import asyncio
+import random
+import sys
+import threading
+import time
+import types
+
+
+class FakeTransportConfig:
+    """إعدادات النقل الوهمي"""
+
+    def __init__(self, latency_ms=50.0, jitter_ms=10.0, flood_rate=0.0, flood_seconds=1,
+                 error_rate=0.0, authorized=True, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.flood_rate = flood_rate
+        self.flood_seconds = flood_seconds
+        self.error_rate = error_rate
+        self.authorized = authorized
+        self.random = random.Random(seed)
+
+
+class FakeStats:
+    """عدادات وأزمنة الطلبات التي نفذها العميل الوهمي (آمنة من عدة خيوط)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {}
+        self.send_latencies = []
+
+    def reset(self):
+        with self._lock:
+            self.counts = {}
+            self.send_latencies = []
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def record_send(self, seconds):
+        with self._lock:
+            self.send_latencies.append(seconds)
+
+
+config = FakeTransportConfig()
+stats = FakeStats()
+
+
+# --- الأخطاء ---
+
+class RPCError(Exception):
+    pass
+
+
+class FloodWaitError(RPCError):
+    def __init__(self, seconds=0, request=None):
+        super().__init__(f"A wait of {seconds} seconds is required")
+        self.seconds = seconds
+        self.request = request
+
+
+class ChannelPrivateError(RPCError):
+    pass
+
+
+class ChatAdminRequiredError(RPCError):
+    pass
+
+
+class ChannelInvalidError(RPCError):
+    pass
+
+
+class PeerIdInvalidError(RPCError):
+    pass
+
+
+class ChatIdInvalidError(RPCError):
+    pass
+
+
+class SessionPasswordNeededError(RPCError):
+    pass
+
+
+class PhoneCodeInvalidError(RPCError):
+    pass
+
+
+_RANDOM_ERRORS = (ChatAdminRequiredError, ChannelPrivateError, PeerIdInvalidError)
+
+
+# --- الأنواع ---
+
+class Channel:
+    def __init__(self, id, access_hash=0, title=""):
+        self.id = id
+        self.access_hash = access_hash
+        self.title = title
+
+
+class Chat:
+    def __init__(self, id, title=""):
+        self.id = id
+        self.title = title
+
+
+class User:
+    def __init__(self, id, username=None, first_name=""):
+        self.id = id
+        self.username = username
+        self.first_name = first_name
+
+
+class InputPeerChannel:
+    def __init__(self, channel_id, access_hash):
+        self.channel_id = channel_id
+        self.access_hash = access_hash
+
+
+class InputPeerChat:
+    def __init__(self, chat_id):
+        self.chat_id = chat_id
+
+
+class InputPeerSelf:
+    pass
+
+
+class Message:
+    def __init__(self, id, message=""):
+        self.id = id
+        self.message = message
+
+
+class UpdateUserName:
+    def __init__(self, user_id, usernames=(), first_name=""):
+        self.user_id = user_id
+        self.usernames = list(usernames)
+        self.first_name = first_name
+
+
+# --- الطلبات ---
+
+class JoinChannelRequest:
+    def __init__(self, channel):
+        self.channel = channel
+
+
+class ForwardMessagesRequest:
+    def __init__(self, from_peer, id, to_peer, drop_author=False, random_id=None, **kwargs):
+        self.from_peer = from_peer
+        self.id = id
+        self.to_peer = to_peer
+        self.drop_author = drop_author
+
+
+# --- العميل ---
+
+class StringSession:
+    def __init__(self, string=None):
+        self.string = string
+
+    def save(self):
+        return self.string or ""
+
+
+class TelegramClient:
+    """عميل وهمي ينفذ connect وis_user_authorized وget_entity وsend_message وطلبات TL"""
+
+    _message_ids = 0
+
+    def __init__(self, session=None, api_id=None, api_hash=None, **kwargs):
+        self.session = session
+        self._connected = False
+        self._handlers = []
+
+    async def _network(self, name):
+        """محاكاة زمن الشبكة وحقن FloodWait والأخطاء"""
+        stats.count(name)
+        delay = max(0.0, config.random.gauss(config.latency_ms, config.jitter_ms)) / 1000.0
+        await asyncio.sleep(delay)
+        roll = config.random.random()
+        if roll < config.flood_rate:
+            stats.count("flood_wait")
+            raise FloodWaitError(config.flood_seconds)
+        if roll < config.flood_rate + config.error_rate:
+            stats.count("error")
+            raise config.random.choice(_RANDOM_ERRORS)("injected error")
+
+    async def connect(self):
+        stats.count("connect")
+        self._connected = True
+
+    def is_connected(self):
+        return self._connected
+
+    async def disconnect(self):
+        stats.count("disconnect")
+        self._connected = False
+
+    async def is_user_authorized(self):
+        return config.authorized
+
+    async def get_me(self):
+        stats.count("get_me")
+        return User(1, username="fake_user", first_name="Fake")
+
+    async def get_entity(self, entity):
+        stats.count("get_entity")
+        if isinstance(entity, str) and not entity.lstrip("-").isdigit():
+            return Channel(abs(hash(entity)) % 10 ** 9, access_hash=1)
+        return Channel(abs(int(entity)), access_hash=1)
+
+    async def get_dialogs(self, *args, **kwargs):
+        stats.count("get_dialogs")
+        return []
+
+    async def send_message(self, entity, message, **kwargs):
+        started = time.perf_counter()
+        await self._network("send_message")
+        stats.record_send(time.perf_counter() - started)
+        TelegramClient._message_ids += 1
+        return Message(TelegramClient._message_ids, message)
+
+    async def delete_messages(self, entity, message_ids, **kwargs):
+        stats.count("delete_messages")
+
+    def add_event_handler(self, callback, event=None):
+        self._handlers.append((callback, event))
+
+    def remove_event_handler(self, callback, event=None):
+        self._handlers = [item for item in self._handlers if item[0] is not callback]
+
+    async def __call__(self, request):
+        if isinstance(request, ForwardMessagesRequest):
+            started = time.perf_counter()
+            await self._network("forward_messages")
+            stats.record_send(time.perf_counter() - started)
+        else:
+            await self._network(type(request).__name__)
+        return request
+
+
+class NewMessage:
+    def __init__(self, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+
+
+class Raw(NewMessage):
+    pass
+
+
+def install():
+    """تسجيل وحدات telethon الوهمية في sys.modules (يجب الاستدعاء قبل استيراد خدمات البوت)"""
+    module = sys.modules[__name__]
+
+    def make(name, **attrs):
+        fake = types.ModuleType(name)
+        fake.__dict__.update(attrs)
+        sys.modules[name] = fake
+        return fake
+
+    telethon = make("telethon", TelegramClient=TelegramClient, __fake__=True)
+    telethon.errors = make(
+        "telethon.errors",
+        RPCError=RPCError, FloodWaitError=FloodWaitError, ChannelPrivateError=ChannelPrivateError,
+        ChatAdminRequiredError=ChatAdminRequiredError, ChannelInvalidError=ChannelInvalidError,
+        PeerIdInvalidError=PeerIdInvalidError, ChatIdInvalidError=ChatIdInvalidError,
+        SessionPasswordNeededError=SessionPasswordNeededError, PhoneCodeInvalidError=PhoneCodeInvalidError,
+    )
+    telethon.sessions = make("telethon.sessions", StringSession=StringSession)
+    telethon.events = make("telethon.events", NewMessage=NewMessage, Raw=Raw)
+    telethon.types = make("telethon.types", UpdateUserName=UpdateUserName)
+    telethon.tl = make("telethon.tl")
+    telethon.tl.types = make(
+        "telethon.tl.types",
+        Channel=Channel, Chat=Chat, User=User, InputPeerChannel=InputPeerChannel,
+        InputPeerChat=InputPeerChat, InputPeerSelf=InputPeerSelf, Message=Message,
+    )
+    telethon.tl.functions = make("telethon.tl.functions")
+    telethon.tl.functions.channels = make("telethon.tl.functions.channels", JoinChannelRequest=JoinChannelRequest)
+    telethon.tl.functions.messages = make("telethon.tl.functions.messages", ForwardMessagesRequest=ForwardMessagesRequest)
+    return module
@@ -0,0 +1,109 @@
+"""قياس أداء تصنيف الرسائل حسب الكلمات المفتاحية (ResponseService.determine_response_type).
+
+التشغيل من جذر المستودع:
+    python -m benchmarks.keyword_benchmark
+    python -m benchmarks.keyword_benchmark --messages 20000 --extra-keywords 0 50 500
+
+يقارن المسح القديم (any() على قائمة كل فئة) مع KeywordMatcher المبني مرة واحدة، على مجموعة
+رسائل عربية مولدة بشكل ثابت، مع كلمات مستخدم إضافية بأعداد مختلفة، ويطبع الزمن لكل رسالة."""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from services.keyword_matcher import KeywordMatcher  # noqa: E402
+
+# نفس فئات ResponseService (services/response_service.py) دون استيراد Telethon
+DEFAULT_KEYWORDS = [
+    ('greetings', ['مرحبا', 'اهلا', 'السلام', 'هاي', 'هلا', 'موجود']),
+    ('thanks', ['شكرا', 'مشكور', 'تسلم']),
+    ('help', ['?', 'كيف', 'ممكن', 'ساعدني', 'مساعدة', 'بوت']),
+    ('affirmative', ['نعم', 'اي', 'صح', 'تمام', 'اوك']),
+    ('negative', ['لا', 'مش', 'مو', 'غير']),
+    ('private', ['بكم', 'اسعار']),
+]
+
+_WORDS = [
+    'اليوم', 'الجو', 'حلو', 'الشباب', 'وين', 'الرابط', 'المجموعة', 'بكرة', 'الساعة', 'عندي', 'سؤال',
+    'المنتج', 'العرض', 'الحين', 'شوي', 'والله', 'ياخي', 'انا', 'انت', 'هذا', 'الموضوع', 'جديد',
+    'الطلب', 'التوصيل', 'متى', 'يوصل', 'الصورة', 'الفيديو', 'رسالة', 'خاص', 'قناة', 'اشتراك',
+]
+_KEYWORDS = [keyword for _, keywords in DEFAULT_KEYWORDS for keyword in keywords]
+
+
+def build_corpus(count, seed=42):
+    """رسائل عربية من 3 إلى 25 كلمة، نحو نصفها يحتوي كلمة مفتاحية"""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        words = [rng.choice(_WORDS) for _ in range(rng.randint(3, 25))]
+        if rng.random() < 0.5:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(_KEYWORDS))
+        corpus.append(' '.join(words))
+    return corpus
+
+
+def build_categories(extra_keywords, seed=7):
+    """الفئات الافتراضية مع كلمات مستخدم إضافية غير موجودة في المجموعة (أسوأ حالة للمسح)"""
+    rng = random.Random(seed)
+    letters = 'ابتثجحخدذرزسشصضطظعغفقكلمنهوي'
+    categories = [(category, list(keywords)) for category, keywords in DEFAULT_KEYWORDS]
+    for index in range(extra_keywords):
+        keyword = 'ؤ' + ''.join(rng.choice(letters) for _ in range(rng.randint(3, 7)))
+        categories[index % len(categories)][1].append(keyword)
+    return categories
+
+
+def scan_classify(categories, message_text):
+    """التصنيف القديم: مسح قائمة كلمات كل فئة بالترتيب"""
+    message_text = message_text.lower()
+    for category, keywords in categories:
+        if any(word in message_text for word in keywords):
+            return category
+    return 'greetings'
+
+
+def _time_per_message(classify, corpus, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for message in corpus:
+            classify(message)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(corpus) * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="قياس أداء تصنيف الرسائل حسب الكلمات المفتاحية")
+    parser.add_argument("--messages", type=int, default=10000, help="عدد الرسائل في المجموعة")
+    parser.add_argument("--extra-keywords", type=int, nargs="*", default=[0, 50, 500], help="عدد كلمات المستخدم الإضافية")
+    parser.add_argument("--repeat", type=int, default=5, help="عدد التكرارات (يُؤخذ أفضلها)")
+    args = parser.parse_args(argv)
+
+    corpus = build_corpus(args.messages)
+    print(f"{'keywords':>9}  {'scan us':>9}  {'matcher us':>10}  {'build ms':>9}  {'speedup':>8}")
+    for extra in args.extra_keywords:
+        categories = build_categories(extra)
+        started = time.perf_counter()
+        matcher = KeywordMatcher(categories, 'greetings')
+        build_ms = (time.perf_counter() - started) * 1000
+
+        mismatches = sum(1 for message in corpus if matcher.classify(message) != scan_classify(categories, message))
+        if mismatches:
+            print(f"تحذير: {mismatches} رسالة صُنفت بشكل مختلف", file=sys.stderr)
+
+        scan_us = _time_per_message(lambda message: scan_classify(categories, message), corpus, args.repeat)
+        matcher_us = _time_per_message(matcher.classify, corpus, args.repeat)
+        keyword_count = sum(len(keywords) for _, keywords in categories)
+        print(f"{keyword_count:>9}  {scan_us:>9.2f}  {matcher_us:>10.2f}  {build_ms:>9.2f}  {scan_us / matcher_us:>7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
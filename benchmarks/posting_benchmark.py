@@ -0,0 +1,222 @@
+"""قياس أداء محرك النشر باستخدام بديل Telethon الوهمي.
+
+التشغيل من جذر المستودع:
+    python -m benchmarks.posting_benchmark                    # 10 و100 و1000 مهمة
+    python -m benchmarks.posting_benchmark --tasks 100 --groups 10 --duration 20 --flood-rate 0.01
+    python -m benchmarks.posting_benchmark --tasks 1 --groups 300 --concurrency 1   # دورة كبيرة دون تزامن
+
+دون --rate/--burst/--concurrency يعمل القياس بإعدادات الإنتاج الافتراضية (config/config.py)
+حتى يقيس ما يحدث فعلاً، وليس محدد معدل مرفوعاً للقياس فقط.
+
+كل سيناريو يعمل في عملية فرعية مستقلة (PostingService كائن مفرد، وقياس RSS والخيوط يكون نظيفاً)،
+ويطبع: الرسائل في الثانية، p50/p99 لزمن الإرسال، عدد الخيوط وحلقات الأحداث، RSS، وزمن الإيقاف."""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _rss_mb():
+    """الذاكرة المقيمة الحالية بالميغابايت (من /proc، أو الحد الأقصى من resource كبديل)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_scenario(args):
+    """تشغيل سيناريو واحد داخل العملية الحالية وإرجاع النتائج كقاموس"""
+    from benchmarks import fake_telethon
+
+    fake_telethon.install()
+    fake_telethon.config.latency_ms = args.latency_ms
+    fake_telethon.config.jitter_ms = args.jitter_ms
+    fake_telethon.config.flood_rate = args.flood_rate
+    fake_telethon.config.flood_seconds = args.flood_seconds
+    fake_telethon.config.error_rate = args.error_rate
+
+    os.environ["POSTING_ENGINE_MODE"] = args.mode
+    # دون --rate/--burst/--concurrency تُستخدم القيم الافتراضية للإنتاج
+    for name, value in (("POSTING_RATE_LIMIT", args.rate), ("POSTING_RATE_BURST", args.burst),
+                        ("POSTING_TASK_CONCURRENCY", args.concurrency)):
+        if value is not None:
+            os.environ[name] = str(value)
+        else:
+            os.environ.pop(name, None)
+    # قاعدة بيانات في الذاكرة بدلاً من MongoDB
+    os.environ["DATABASE_BACKEND"] = "memory"
+
+    work_dir = tempfile.mkdtemp(prefix="posting-bench-")
+    os.chdir(work_dir)
+    sys.path.insert(0, REPO_ROOT)
+
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    from database import Database
+    from services.peer_cache import peer_cache
+    from services.posting_service import PostingService
+
+    # ذاكرة الكيانات في الذاكرة فقط، دون قاعدة بيانات
+    peer_cache._group_service_failed = True
+
+    rss_before = _rss_mb()
+    threads_before = threading.active_count()
+
+    # مستخدم بجلسة وهمية لكل مهمة
+    users = Database().get_collection("users")
+    users.insert_many([
+        {"user_id": user_id, "session_string": f"fake-session-{user_id}", "api_id": 1, "api_hash": "fake"}
+        for user_id in range(1, args.tasks + 1)
+    ])
+
+    service = PostingService(data_dir=os.path.join(work_dir, "data"), users_collection=users)
+    group_ids = [str(1000 + index) for index in range(args.groups)]
+
+    started = time.perf_counter()
+    task_ids = []
+    for user_id in range(1, args.tasks + 1):
+        task_id, _ = service.start_posting_task(
+            user_id, post_id="bench", message="رسالة قياس الأداء", group_ids=group_ids,
+            delay_seconds=args.delay, posting_mode=args.posting_mode
+        )
+        task_ids.append(task_id)
+    start_seconds = time.perf_counter() - started
+
+    peak_threads = threading.active_count()
+    peak_rss = _rss_mb()
+    deadline = time.perf_counter() + args.duration
+    while time.perf_counter() < deadline:
+        time.sleep(0.25)
+        peak_threads = max(peak_threads, threading.active_count())
+        peak_rss = max(peak_rss, _rss_mb())
+    elapsed = time.perf_counter() - started
+
+    engine_stats = service.get_engine_stats()
+    latencies = list(fake_telethon.stats.send_latencies)
+    counts = dict(fake_telethon.stats.counts)
+
+    stop_started = time.perf_counter()
+    for task_id in task_ids:
+        service.stop_posting_task(task_id)
+    while any(service._is_task_alive(task_id) for task_id in task_ids):
+        if time.perf_counter() - stop_started > 60:
+            break
+        time.sleep(0.005)
+    stop_latency = time.perf_counter() - stop_started
+
+    sends = counts.get("send_message", 0) + counts.get("forward_messages", 0)
+    return {
+        "tasks": args.tasks,
+        "groups": args.groups,
+        "mode": args.mode,
+        "posting_mode": args.posting_mode,
+        "sends": sends,
+        "sends_per_sec": round(sends / elapsed, 1) if elapsed else 0.0,
+        "send_p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+        "send_p99_ms": round(_percentile(latencies, 99) * 1000, 1),
+        "flood_waits": counts.get("flood_wait", 0),
+        "errors": counts.get("error", 0),
+        "connects": counts.get("connect", 0),
+        "get_entity": counts.get("get_entity", 0),
+        "threads": peak_threads - threads_before,
+        "loops": engine_stats.get("engine", {}).get("loops", engine_stats.get("task_threads", 0)),
+        "rss_mb": round(peak_rss, 1),
+        "rss_delta_mb": round(peak_rss - rss_before, 1),
+        "start_seconds": round(start_seconds, 3),
+        "stop_latency_ms": round(stop_latency * 1000, 1),
+    }
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(description="قياس أداء محرك النشر دون اتصال")
+    parser.add_argument("--tasks", type=int, nargs="*", default=[10, 100, 1000], help="عدد المهام المتزامنة لكل سيناريو")
+    parser.add_argument("--groups", type=int, default=5, help="عدد المجموعات لكل مهمة")
+    parser.add_argument("--duration", type=float, default=10.0, help="مدة كل سيناريو بالثواني")
+    parser.add_argument("--delay", type=int, default=2, help="التأخير بين الدورات بالثواني")
+    parser.add_argument("--mode", choices=["shared", "threaded"], default="shared", help="وضع محرك النشر")
+    parser.add_argument("--posting-mode", choices=["send", "forward"], default="send", help="وضع النشر")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="متوسط زمن الطلب الوهمي")
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="تذبذب زمن الطلب الوهمي")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="نسبة الطلبات التي تُرجع FloodWait")
+    parser.add_argument("--flood-seconds", type=int, default=1, help="مدة FloodWait المحقونة")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="نسبة الطلبات التي تُرجع خطأ")
+    parser.add_argument("--rate", type=float, default=None, help="معدل محدد الإرسال لكل حساب (رسالة/ث، الافتراضي: قيمة الإنتاج)")
+    parser.add_argument("--burst", type=int, default=None, help="حجم دفعة محدد الإرسال (الافتراضي: قيمة الإنتاج)")
+    parser.add_argument("--concurrency", type=int, default=None, help="الإرسالات المتزامنة لكل مهمة (الافتراضي: قيمة الإنتاج)")
+    parser.add_argument("--json", action="store_true", help="طباعة النتائج بتنسيق JSON")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    return parser
+
+
+def _print_table(results):
+    columns = [
+        ("tasks", "tasks"), ("sends/s", "sends_per_sec"), ("p50 ms", "send_p50_ms"), ("p99 ms", "send_p99_ms"),
+        ("threads", "threads"), ("loops", "loops"), ("rss MB", "rss_mb"), ("stop ms", "stop_latency_ms"),
+        ("floods", "flood_waits"), ("errors", "errors"),
+    ]
+    print("  ".join(f"{title:>9}" for title, _ in columns))
+    for result in results:
+        print("  ".join(f"{result.get(key, ''):>9}" for _, key in columns))
+
+
+def main(argv=None):
+    args = _build_parser().parse_args(argv)
+
+    if args.child:
+        args.tasks = args.tasks[0]
+        print(json.dumps(run_scenario(args)))
+        return 0
+
+    results = []
+    for task_count in args.tasks:
+        command = [
+            sys.executable, "-m", "benchmarks.posting_benchmark", "--child",
+            "--tasks", str(task_count),
+            "--groups", str(args.groups),
+            "--duration", str(args.duration),
+            "--delay", str(args.delay),
+            "--mode", args.mode,
+            "--posting-mode", args.posting_mode,
+            "--latency-ms", str(args.latency_ms),
+            "--jitter-ms", str(args.jitter_ms),
+            "--flood-rate", str(args.flood_rate),
+            "--flood-seconds", str(args.flood_seconds),
+            "--error-rate", str(args.error_rate),
+        ]
+        for flag, value in (("--rate", args.rate), ("--burst", args.burst), ("--concurrency", args.concurrency)):
+            if value is not None:
+                command += [flag, str(value)]
+        completed = subprocess.run(command, cwd=REPO_ROOT, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"فشل سيناريو {task_count} مهمة:\n{completed.stderr}", file=sys.stderr)
+            continue
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        _print_table(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
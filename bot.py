@@ -2,6 +2,7 @@ import os
 import sys
 import logging
 from config.config import BOT_TOKEN as TELEGRAM_BOT_TOKEN
+from telegram import Update
 from telegram.ext import ApplicationBuilder, MessageHandler, filters
 from handlers.start_help_handlers import StartHelpHandlers
 from handlers.auth_handlers import AuthHandlers
@@ -180,7 +181,8 @@ class Bot:
         try:
             logger.info("Starting bot polling...")
             self.is_running = True
-            self.application.run_polling(drop_pending_updates=True)
+            # ALL_TYPES includes chat_member, which keeps the channel membership cache fresh
+            self.application.run_polling(drop_pending_updates=True, allowed_updates=Update.ALL_TYPES)
         except Exception as e:
             logger.error(f"Error in bot polling: {str(e)}", exc_info=True)
             self.is_running = False
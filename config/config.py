@@ -28,3 +28,38 @@ API_HASH = os.getenv("API_HASH", "0123456789abcdef0123456789abcdef")
 # إضافة متغيرات بديلة للتوافق مع الكود القديم والبيئة في Glitch
 TELEGRAM_API_ID = API_ID
 TELEGRAM_API_HASH = API_HASH
+
+# إعدادات محرك النشر
+# shared: تشغيل جميع مهام النشر كروتينات على حلقات أحداث مشتركة يملكها PostingService
+# threaded: خيط وحلقة أحداث مستقلة لكل مهمة (السلوك القديم)
+POSTING_ENGINE_MODE = os.getenv("POSTING_ENGINE_MODE", "shared")
+# عدد حلقات الأحداث المشتركة في وضع shared
+POSTING_ENGINE_LOOPS = int(os.getenv("POSTING_ENGINE_LOOPS", "1"))
+
+# إعدادات تحديد معدل الإرسال لكل حساب (دلو رموز يتكيف مع FloodWait)
+# المعدل بالرسائل في الثانية وحجم الدفعة المسموح بها. القيم الافتراضية سقف أمان وليست تأخيراً:
+# دورة عادية لا تصل إليها (إرسال متتابع بزمن 50-150ms يعطي 7-20 رسالة/ث)، لذا لا تبطئ الدورات،
+# وتبقى الإرسالات المتزامنة (POSTING_TASK_CONCURRENCY) مفيدة حتى هذا السقف.
+# بعد كل FloodWait ينخفض المعدل إلى النصف ثم يعود تدريجياً حتى POSTING_RATE_LIMIT
+POSTING_RATE_LIMIT = float(os.getenv("POSTING_RATE_LIMIT", "20"))
+POSTING_RATE_BURST = int(os.getenv("POSTING_RATE_BURST", "20"))
+# الحد الأدنى للفاصل بين رسالتين إلى نفس المجموعة بالثواني (0 لتعطيله)
+POSTING_PER_CHAT_INTERVAL = float(os.getenv("POSTING_PER_CHAT_INTERVAL", "0"))
+# الحد الأقصى الافتراضي للإرسالات المتزامنة داخل مهمة نشر واحدة (يبقى خاضعاً لمحدد المعدل)
+POSTING_TASK_CONCURRENCY = int(os.getenv("POSTING_TASK_CONCURRENCY", "3"))
+
+# إعدادات الوصول غير المتزامن لقاعدة البيانات من معالجات البوت (database/async_db.py)
+# عدد خيوط تنفيذ الاستعلامات، والحد الأقصى للاستعلامات المنتظرة لكل حلقة أحداث
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "4"))
+DB_MAX_PENDING_QUERIES = int(os.getenv("DB_MAX_PENDING_QUERIES", "64"))
+
+# إعدادات جدولة الردود التلقائية المؤجلة لكل حساب (services/reply_scheduler.py)
+# الحد الأقصى للردود المنتظرة، ونافذة الرد الواحد لكل محادثة بالثواني
+AUTO_REPLY_MAX_PENDING = int(os.getenv("AUTO_REPLY_MAX_PENDING", "100"))
+AUTO_REPLY_CHAT_WINDOW = float(os.getenv("AUTO_REPLY_CHAT_WINDOW", "30"))
+
+# إعدادات سجل الردود التلقائية المجمّع (services/log_sink.py)
+# عدد السجلات في كل إدراج مجمّع، أقصى تأخير للكتابة بالمللي ثانية، والحد الأقصى للسجلات المنتظرة
+RESPONSE_LOG_BATCH_SIZE = int(os.getenv("RESPONSE_LOG_BATCH_SIZE", "100"))
+RESPONSE_LOG_FLUSH_MS = int(os.getenv("RESPONSE_LOG_FLUSH_MS", "1000"))
+RESPONSE_LOG_MAX_BUFFER = int(os.getenv("RESPONSE_LOG_MAX_BUFFER", "10000"))
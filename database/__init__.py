@@ -0,0 +1,35 @@
+"""Database backend selection.
+
+`from database import Database` resolves to the backend named by DATABASE_BACKEND:
+mongodb (default, database/db_mongodb.py), sqlite (database/db.py) or memory
+(database/db_memory.py, dict-backed, for tests and benchmarks). The backend module is
+imported on first access, so importing database.db or database.async_db never needs pymongo.
+"""
+
+import importlib
+import os
+
+BACKENDS = {
+    'mongodb': 'database.db_mongodb',
+    'sqlite': 'database.db',
+    'memory': 'database.db_memory',
+}
+
+
+def get_backend_name():
+    """Name of the configured backend (DATABASE_BACKEND, default mongodb)"""
+    name = os.getenv('DATABASE_BACKEND', 'mongodb').strip().lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown DATABASE_BACKEND '{name}', expected one of: {', '.join(BACKENDS)}")
+    return name
+
+
+def get_backend():
+    """The module of the configured backend"""
+    return importlib.import_module(BACKENDS[get_backend_name()])
+
+
+def __getattr__(name):
+    if name in ('Database', 'CollectionWrapper'):
+        return getattr(get_backend(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,123 @@
+"""Awaitable access to the synchronous database layer.
+
+Handlers run on the bot's event loop, so a direct find_one/update_one call (an SQLite commit
+or a MongoDB round trip) stalls every other update until it returns. AsyncDatabase runs those
+calls on a dedicated thread pool instead. The pool size bounds how many queries run at once,
+and a per-loop semaphore bounds how many can be queued, so a slow disk or a remote MongoDB
+only delays the handlers that wait on it.
+
+    from database.async_db import async_db
+    user = await async_db.run(subscription_service.get_user, user_id)
+    groups = await async_db.collection(groups_collection).find({'user_id': user_id})
+"""
+
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _load_async_db_settings():
+    """Read the executor settings from config with safe defaults"""
+    try:
+        from config.config import DB_EXECUTOR_WORKERS, DB_MAX_PENDING_QUERIES
+        return DB_EXECUTOR_WORKERS, DB_MAX_PENDING_QUERIES
+    except Exception:
+        return int(os.getenv("DB_EXECUTOR_WORKERS", "4")), int(os.getenv("DB_MAX_PENDING_QUERIES", "64"))
+
+
+class AsyncDatabase:
+    def __init__(self, max_workers=4, max_pending=64):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._lock = threading.Lock()
+        # One semaphore per event loop (asyncio primitives are bound to a single loop)
+        self._semaphores = {}
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Each worker thread gets its own SQLite connection (see database.db.Database.conn)
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="db")
+            return self._executor
+
+    def _get_semaphore(self, loop):
+        with self._lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                # Forget semaphores of loops that have been closed
+                self._semaphores = {other: value for other, value in self._semaphores.items() if not other.is_closed()}
+                semaphore = asyncio.Semaphore(self.max_pending)
+                self._semaphores[loop] = semaphore
+            return semaphore
+
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking database call on the executor and await its result"""
+        loop = asyncio.get_running_loop()
+        async with self._get_semaphore(loop):
+            return await loop.run_in_executor(self._get_executor(), functools.partial(func, *args, **kwargs))
+
+    def collection(self, collection):
+        """Awaitable view of a CollectionWrapper"""
+        return AsyncCollection(self, collection)
+
+    def get_stats(self):
+        executor = self._executor
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "queued": executor._work_queue.qsize() if executor is not None else 0,
+        }
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+class AsyncCollection:
+    """Same methods as CollectionWrapper, each awaited on the database executor"""
+
+    def __init__(self, async_database, collection):
+        self._async_database = async_database
+        self.collection = collection
+
+    async def find_one(self, query=None):
+        return await self._async_database.run(self.collection.find_one, query)
+
+    async def find(self, query=None, **kwargs):
+        # lazy=True is not supported here: the generator would be consumed on the event loop
+        kwargs.pop('lazy', None)
+        return await self._async_database.run(self.collection.find, query, **kwargs)
+
+    async def count_documents(self, query=None):
+        return await self._async_database.run(self.collection.count_documents, query)
+
+    async def insert_one(self, document):
+        return await self._async_database.run(self.collection.insert_one, document)
+
+    async def insert_many(self, documents):
+        return await self._async_database.run(self.collection.insert_many, documents)
+
+    async def update_one(self, query, update, upsert=False):
+        return await self._async_database.run(self.collection.update_one, query, update, upsert=upsert)
+
+    async def update_many(self, query, update):
+        return await self._async_database.run(self.collection.update_many, query, update)
+
+    async def delete_one(self, query):
+        return await self._async_database.run(self.collection.delete_one, query)
+
+    async def delete_many(self, query):
+        return await self._async_database.run(self.collection.delete_many, query)
+
+    async def bulk_write(self, operations):
+        return await self._async_database.run(self.collection.bulk_write, operations)
+
+
+# Shared instance used by the handlers and services
+async_db = AsyncDatabase(*_load_async_db_settings())
@@ -1,25 +1,99 @@
 import sqlite3
 import os
 import json
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 
+from database.indexes import ensure_sqlite_indexes
+
 class Database:
     _instance = None
     
+    # SQLite connection tuning (applied to every per-thread connection)
+    DB_PATH = 'data/telegram_bot.db'
+    BUSY_TIMEOUT_MS = 5000
+    SYNCHRONOUS = 'NORMAL' # Safe with WAL: a crash can lose the last transactions but never corrupts the file
+    STATEMENT_CACHE_SIZE = 256 # Prepared statements kept per connection (CollectionWrapper reuses identical SQL text)
+    
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(Database, cls).__new__(cls)
             # Create data directory if it doesn't exist
             os.makedirs('data', exist_ok=True)
-            # Connect to SQLite database (will be created if it doesn't exist)
-            # Use check_same_thread=False for multi-threaded access, but manage cursors carefully
-            cls._instance.conn = sqlite3.connect('data/telegram_bot.db', check_same_thread=False)
-            cls._instance.conn.row_factory = sqlite3.Row
-            # REMOVED: cls._instance.cursor = cls._instance.conn.cursor()
+            # One connection per thread instead of a single shared connection:
+            # with WAL, readers no longer block behind writers and each thread commits independently
+            cls._instance._local = threading.local()
+            cls._instance._connections = []
+            cls._instance._connections_lock = threading.Lock()
             # Initialize database tables
             cls._instance._init_tables()
         return cls._instance
     
+    @property
+    def conn(self):
+        """Connection owned by the calling thread (created on first use)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+    
+    def _connect(self):
+        # check_same_thread=False only so close() can close every thread's connection;
+        # each connection is otherwise used by its owning thread alone
+        conn = sqlite3.connect(
+            self.DB_PATH, timeout=self.BUSY_TIMEOUT_MS / 1000.0, check_same_thread=False,
+            cached_statements=self.STATEMENT_CACHE_SIZE
+        )
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.SYNCHRONOUS}")
+            conn.execute(f"PRAGMA busy_timeout={self.BUSY_TIMEOUT_MS}")
+        except sqlite3.Error as e:
+            print(f"Error configuring SQLite connection: {e}")
+        with self._connections_lock:
+            # Close connections left behind by threads that have exited (e.g. finished posting threads)
+            alive = []
+            for thread, other in self._connections:
+                if thread.is_alive():
+                    alive.append((thread, other))
+                else:
+                    try:
+                        other.close()
+                    except sqlite3.Error:
+                        pass
+            alive.append((threading.current_thread(), conn))
+            self._connections = alive
+        return conn
+    
+    def in_transaction(self):
+        """True while the calling thread is inside transaction()"""
+        return getattr(self._local, 'transaction_depth', 0) > 0
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Group CollectionWrapper writes on this thread into one SQLite transaction (one commit).
+        Nested calls join the outer transaction; an exception rolls everything back and is re-raised.
+        """
+        conn = self.conn
+        depth = getattr(self._local, 'transaction_depth', 0)
+        self._local.transaction_depth = depth + 1
+        try:
+            if depth == 0 and not conn.in_transaction:
+                conn.execute("BEGIN")
+            yield conn
+            if depth == 0:
+                conn.commit()
+        except BaseException:
+            if depth == 0:
+                conn.rollback()
+            raise
+        finally:
+            self._local.transaction_depth = depth
+    
     def _init_tables(self):
         cursor = self.conn.cursor() # Create a new cursor for this operation
         try:
@@ -62,6 +136,7 @@ class Database:
                 user_id INTEGER,
                 response_type TEXT,
                 response_text TEXT,
+                keywords TEXT, -- Comma-separated custom keywords for this response type
                 is_active INTEGER DEFAULT 1,
                 created_at TEXT,
                 updated_at TEXT,
@@ -79,6 +154,18 @@ class Database:
                     ('auto_response_active', 'INTEGER', 0),
                     ('state', 'TEXT', None),
                     ('trial_claimed', 'INTEGER', 0) # Ensure trial_claimed is checked
+                ],
+                'groups': [
+                    ('username', 'TEXT', None),
+                    ('description', 'TEXT', None),
+                    ('member_count', 'INTEGER', 0),
+                    # Cached InputPeer for the posting loop (filled by GroupService.fetch_user_groups)
+                    ('peer_type', 'TEXT', None),
+                    ('peer_id', 'INTEGER', None),
+                    ('access_hash', 'INTEGER', None)
+                ],
+                'responses': [
+                    ('keywords', 'TEXT', None)
                 ]
             }
             
@@ -94,6 +181,7 @@ class Database:
 
             for table, columns in columns_to_add.items():
                 if table not in existing_columns: continue # Skip if table info couldn't be fetched
+                if not existing_columns[table]: continue # Table doesn't exist yet, it is created below with the full schema
                 
                 for column, base_type, default_value in columns:
                     if column not in existing_columns[table]:
@@ -149,7 +237,13 @@ class Database:
                 user_id INTEGER,
                 group_id TEXT, -- Ensure TEXT type
                 title TEXT,
+                username TEXT,
+                description TEXT,
+                member_count INTEGER DEFAULT 0,
                 blacklisted INTEGER DEFAULT 0,
+                peer_type TEXT,
+                peer_id INTEGER,
+                access_hash INTEGER,
                 created_at TEXT,
                 updated_at TEXT,
                 FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
@@ -265,6 +359,19 @@ class Database:
             )
             ''')
             
+            # Create response_logs table (auto-reply log, written in batches by services/log_sink.py)
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS response_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER,
+                chat_id INTEGER,
+                message TEXT,
+                response TEXT,
+                is_private INTEGER DEFAULT 0,
+                timestamp TEXT
+            )
+            ''')
+            
             # Create settings table
             cursor.execute('''
             CREATE TABLE IF NOT EXISTS settings (
@@ -278,6 +385,9 @@ class Database:
             
             # Commit the changes
             self.conn.commit()
+            
+            # Secondary indexes for the hot lookup paths (idempotent)
+            ensure_sqlite_indexes(self.conn)
         except Exception as e:
             print(f"Error initializing tables: {e}")
             # Optionally rollback if commit hasn't happened
@@ -289,6 +399,10 @@ class Database:
         # It returns a CollectionWrapper that mimics MongoDB collection methods
         return CollectionWrapper(self, collection_name)
     
+    def get_sql_cache_stats(self):
+        """Distinct query shapes and hit/miss counters of the CollectionWrapper SQL cache"""
+        return CollectionWrapper.get_sql_cache_stats()
+    
     def get_next_id(self, collection_name):
         """
         الحصول على المعرف التالي للمجموعة المحددة (لا يضمن عدم التضارب في بيئة متعددة الخيوط)
@@ -335,72 +449,134 @@ class Database:
             cursor.close() # Close the cursor
     
     def close(self):
-        if hasattr(self, 'conn') and self.conn:
-            self.conn.close()
-            print("Database connection closed.")
+        with self._connections_lock:
+            connections = self._connections
+            self._connections = []
+        for _, conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                print(f"Error closing database connection: {e}")
+        # Threads that call conn again get a fresh connection
+        self._local = threading.local()
+        if connections:
+            print("Database connections closed.")
+
+# SQL comparison for each supported query operator
+_OPERATORS = {'$eq': '=', '$ne': '!=', '$gt': '>', '$lt': '<', '$gte': '>=', '$lte': '<='}
 
 class CollectionWrapper:
+    # Compiled SQL text per (table, statement kind, canonical query shape), shared by all wrappers.
+    # Identical SQL text lets sqlite3 reuse its prepared statement (see Database.STATEMENT_CACHE_SIZE).
+    MAX_SQL_CACHE = 1024
+    _sql_cache = {}
+    _sql_cache_lock = threading.Lock()
+    _sql_cache_hits = 0
+    _sql_cache_misses = 0
+
     def __init__(self, db, collection_name):
         self.db = db
         self.collection_name = collection_name
         # Simplified mapping, assuming table name matches collection name
         self.table_name = collection_name 
 
-    def _build_where_clause(self, query):
-        """Builds WHERE clause and parameters from a query dictionary."""
+    @staticmethod
+    def _query_shape(query):
+        """
+        Canonical shape of a query: sorted (field, operator[, $in arity]) tuples, plus the
+        parameters in the same order. {'b': 1, 'a': 2} and {'a': 5, 'b': 6} share one shape.
+        """
         if not query:
-            return "", []
-        
-        conditions = []
+            return (), []
+        shape = []
         params = []
-        for key, value in query.items():
+        for key in sorted(query):
+            value = query[key]
             if isinstance(value, dict): # Handle operators like $ne, $gt, etc.
-                op = list(value.keys())[0]
-                val = list(value.values())[0]
-                if op == '$ne':
-                    conditions.append(f"`{key}` != ?")
-                    params.append(val)
-                elif op == '$gt':
-                    conditions.append(f"`{key}` > ?")
-                    params.append(val)
-                elif op == '$lt':
-                    conditions.append(f"`{key}` < ?")
-                    params.append(val)
-                elif op == '$gte':
-                    conditions.append(f"`{key}` >= ?")
-                    params.append(val)
-                elif op == '$lte':
-                    conditions.append(f"`{key}` <= ?")
-                    params.append(val)
-                elif op == '$in':
+                op, val = next(iter(value.items()))
+                if op == '$in':
                     if not isinstance(val, (list, tuple)):
                         raise ValueError("$in requires a list or tuple")
-                    if not val:
-                         # Handle empty list for $in - always false
-                         conditions.append("0 = 1") 
-                    else:
-                        placeholders = ", ".join("?" * len(val))
-                        conditions.append(f"`{key}` IN ({placeholders})")
-                        params.extend(val)
-                # Add more operators as needed
+                    shape.append((key, '$in', len(val)))
+                    params.extend(val)
+                elif op in _OPERATORS:
+                    shape.append((key, op))
+                    params.append(val)
                 else:
                     print(f"Unsupported operator: {op}")
                     # Default to equality if operator is unknown or simple value
-                    conditions.append(f"`{key}` = ?")
+                    shape.append((key, '$eq'))
                     params.append(value) # Use the original dict value
             else:
-                conditions.append(f"`{key}` = ?")
+                shape.append((key, '$eq'))
                 params.append(value)
-                
+        return tuple(shape), params
+
+    @staticmethod
+    def _where_sql(shape):
+        """WHERE clause text for a canonical query shape"""
+        conditions = []
+        for condition in shape:
+            key, op = condition[0], condition[1]
+            if op == '$in':
+                if not condition[2]:
+                    # Handle empty list for $in - always false
+                    conditions.append("0 = 1")
+                else:
+                    placeholders = ", ".join("?" * condition[2])
+                    conditions.append(f"`{key}` IN ({placeholders})")
+            else:
+                conditions.append(f"`{key}` {_OPERATORS[op]} ?")
         where_clause = " AND ".join(conditions)
-        return f"WHERE {where_clause}" if where_clause else "", params
+        return f"WHERE {where_clause}" if where_clause else ""
+
+    def _cached_sql(self, key, build, *args):
+        """Return the SQL text cached under (table,) + key, building it once with build(*args)"""
+        cache_key = (self.table_name,) + key
+        sql = CollectionWrapper._sql_cache.get(cache_key)
+        if sql is not None:
+            # Lock-free hit path; the counter may undercount slightly under thread contention
+            CollectionWrapper._sql_cache_hits += 1
+            return sql
+        sql = build(*args)
+        with CollectionWrapper._sql_cache_lock:
+            CollectionWrapper._sql_cache_misses += 1
+            cache = CollectionWrapper._sql_cache
+            if len(cache) >= self.MAX_SQL_CACHE:
+                # Drop the oldest shape (e.g. one-off $in arities)
+                cache.pop(next(iter(cache)), None)
+            cache[cache_key] = sql
+        return sql
+
+    @classmethod
+    def get_sql_cache_stats(cls):
+        """Counters for the SQL text cache: distinct shapes (overall and per table), hits and misses"""
+        with cls._sql_cache_lock:
+            per_table = {}
+            for key in cls._sql_cache:
+                per_table[key[0]] = per_table.get(key[0], 0) + 1
+            return {
+                'shapes': len(cls._sql_cache),
+                'per_table': per_table,
+                'hits': cls._sql_cache_hits,
+                'misses': cls._sql_cache_misses,
+            }
+
+    def _select_sql(self, columns, shape, suffix):
+        return f"SELECT {columns} FROM {self.table_name} {self._where_sql(shape)}{suffix}"
+
+    def _build_where_clause(self, query):
+        """Builds WHERE clause and parameters from a query dictionary."""
+        shape, params = self._query_shape(query)
+        if not shape:
+            return "", []
+        return self._cached_sql(('where', shape), self._where_sql, shape), params
 
     def find_one(self, query):
         cursor = self.db.conn.cursor() # Create a new cursor
         try:
-            where_clause, params = self._build_where_clause(query)
-            sql = f"SELECT * FROM {self.table_name} {where_clause} LIMIT 1"
-            # print(f"Executing SQL: {sql} with params: {params}") # Debugging
+            shape, params = self._query_shape(query)
+            sql = self._cached_sql(('find_one', shape), self._select_sql, "*", shape, " LIMIT 1")
             cursor.execute(sql, params)
             result = cursor.fetchone()
             return dict(result) if result else None
@@ -410,88 +586,254 @@ class CollectionWrapper:
         finally:
             cursor.close() # Close the cursor
 
-    def find(self, query=None):
+    def _build_select_columns(self, projection):
+        """
+        Column list for a MongoDB-style projection ({'field': 1} / {'field': 0} or a list of fields).
+        Returns (columns_sql, excluded_fields); '_id' is ignored since SQLite tables have no such column.
+        """
+        if not projection:
+            return "*", ()
+        if isinstance(projection, (list, tuple)):
+            projection = {field: 1 for field in projection}
+        included = [field for field, value in projection.items() if value and field != '_id']
+        if included:
+            return ", ".join(f"`{field}`" for field in included), ()
+        # Exclusion-only projection: select everything and drop the excluded fields
+        return "*", tuple(field for field, value in projection.items() if not value and field != '_id')
+
+    def _build_order_clause(self, sort):
+        """ORDER BY clause for a field name or a list of (field, direction) pairs (1 / -1)"""
+        if not sort:
+            return ""
+        if isinstance(sort, str):
+            sort = [(sort, 1)]
+        parts = [f"`{field}` {'DESC' if direction == -1 else 'ASC'}" for field, direction in sort]
+        return "ORDER BY " + ", ".join(parts)
+
+    def _build_find_sql(self, query, projection, sort, limit, skip):
+        columns, excluded = self._build_select_columns(projection)
+        where_clause, params = self._build_where_clause(query)
+        sql = f"SELECT {columns} FROM {self.table_name} {where_clause} {self._build_order_clause(sort)}"
+        if limit or skip:
+            sql += " LIMIT ? OFFSET ?"
+            params = list(params) + [limit or -1, skip or 0] # LIMIT -1 means no limit
+        return sql, params, excluded
+
+    @staticmethod
+    def _row_to_dict(row, excluded):
+        document = dict(row)
+        for field in excluded:
+            document.pop(field, None)
+        return document
+
+    def find(self, query=None, limit=None, sort=None, projection=None, skip=None, batch_size=None, lazy=False):
+        """
+        Find matching rows.
+
+        projection: fields to return ({'field': 1} / {'field': 0} or a list); sort: field name or
+        [(field, 1 | -1)]; limit/skip: paging. With lazy=True a generator is returned that streams rows
+        batch_size at a time from one cursor, so whole-table scans run in constant memory
+        (consume it on the calling thread, which owns the connection).
+        """
+        if lazy:
+            return self._iter_find(query, limit, sort, projection, skip, batch_size or 500)
         cursor = self.db.conn.cursor() # Create a new cursor
         try:
-            where_clause, params = self._build_where_clause(query)
-            sql = f"SELECT * FROM {self.table_name} {where_clause}"
-            # print(f"Executing SQL: {sql} with params: {params}") # Debugging
+            sql, params, excluded = self._build_find_sql(query, projection, sort, limit, skip)
             cursor.execute(sql, params)
             results = cursor.fetchall()
-            return [dict(row) for row in results]
+            return [self._row_to_dict(row, excluded) for row in results]
         except sqlite3.Error as e:
             print(f"Error in find ({self.table_name}): {e}")
             return []
         finally:
             cursor.close() # Close the cursor
 
+    def _iter_find(self, query, limit, sort, projection, skip, batch_size):
+        cursor = self.db.conn.cursor() # Create a new cursor
+        try:
+            sql, params, excluded = self._build_find_sql(query, projection, sort, limit, skip)
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield self._row_to_dict(row, excluded)
+        except sqlite3.Error as e:
+            print(f"Error in find ({self.table_name}): {e}")
+        finally:
+            cursor.close() # Close the cursor
+
+    def _commit(self):
+        """Commit the statement unless the caller batches it inside db.transaction()"""
+        if not self.db.in_transaction():
+            self.db.conn.commit()
+
+    def _rollback(self, error):
+        """Roll back a failed statement; inside db.transaction() re-raise so the whole batch is rolled back"""
+        if self.db.in_transaction():
+            raise error
+        self.db.conn.rollback()
+
+    def _update_sql(self, set_keys, shape):
+        set_clause = ", ".join(f"`{key}` = ?" for key in set_keys)
+        return f"UPDATE {self.table_name} SET {set_clause} {self._where_sql(shape)}"
+
+    def _insert_sql(self, columns):
+        cols_str = ", ".join(f"`{key}`" for key in columns)
+        placeholders_str = ", ".join("?" * len(columns))
+        return f"INSERT INTO {self.table_name} ({cols_str}) VALUES ({placeholders_str})"
+
+    def _execute_update(self, cursor, query, update_data):
+        """Run one UPDATE for update_data ($set fields) and return the number of matched rows"""
+        set_keys = tuple(sorted(update_data))
+        shape, where_params = self._query_shape(query)
+        sql = self._cached_sql(('update', set_keys, shape), self._update_sql, set_keys, shape)
+        params = [update_data[key] for key in set_keys]
+        params.extend(where_params)
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+    def _execute_insert(self, cursor, document):
+        """Run one INSERT for document and return the new rowid"""
+        columns = tuple(sorted(document))
+        sql = self._cached_sql(('insert', columns), self._insert_sql, columns)
+        cursor.execute(sql, [document[key] for key in columns])
+        return cursor.lastrowid
+
     def update_one(self, query, update, upsert=False):
         cursor = self.db.conn.cursor() # Create a new cursor
         try:
-            set_clause_parts = []
-            params = []
             update_data = update.get('$set', update) # Handle $set operator or direct update
             
             if not update_data:
                  print(f"Warning: update_one called with empty update data for {self.table_name}")
                  return # Or raise an error
                  
-            for key, value in update_data.items():
-                set_clause_parts.append(f"`{key}` = ?")
-                params.append(value)
-            set_clause = ", ".join(set_clause_parts)
-            
-            where_clause, where_params = self._build_where_clause(query)
-            params.extend(where_params)
+            rowcount = self._execute_update(cursor, query, update_data)
+            self._commit() # Commit immediately after execute
             
-            sql = f"UPDATE {self.table_name} SET {set_clause} {where_clause}"
-            # print(f"Executing SQL: {sql} with params: {params}") # Debugging
-            cursor.execute(sql, params)
-            self.db.conn.commit() # Commit immediately after execute
-            
-            if upsert and cursor.rowcount == 0:
+            if upsert and rowcount == 0:
                 # If no rows were updated and upsert is True, insert the document
                 # Combine query and update data for insertion
                 insert_data = query.copy()
                 insert_data.update(update_data)
                 self.insert_one(insert_data) # Call insert_one to handle insertion
-            # else:
-                 # self.db.conn.commit() # Commit moved up
                  
-            return cursor.rowcount > 0 or (upsert and cursor.rowcount == 0) # Indicate success
+            return rowcount > 0 or (upsert and rowcount == 0) # Indicate success
         except sqlite3.Error as e:
             print(f"Error in update_one ({self.table_name}): {e}")
-            self.db.conn.rollback() # Rollback on error
+            self._rollback(e) # Rollback on error
             return False
         finally:
             cursor.close() # Close the cursor
 
-    def insert_one(self, document):
+    def update_many(self, query, update):
+        """Update every matching row with a single UPDATE; returns the number of matched rows"""
         cursor = self.db.conn.cursor() # Create a new cursor
         try:
-            columns = []
-            placeholders = []
-            params = []
-            for key, value in document.items():
-                columns.append(f"`{key}`")
-                placeholders.append("?")
-                params.append(value)
-            
-            cols_str = ", ".join(columns)
-            placeholders_str = ", ".join(placeholders)
+            update_data = update.get('$set', update) # Handle $set operator or direct update
             
-            sql = f"INSERT INTO {self.table_name} ({cols_str}) VALUES ({placeholders_str})"
-            # print(f"Executing SQL: {sql} with params: {params}") # Debugging
-            cursor.execute(sql, params)
-            self.db.conn.commit() # Commit after successful insert
-            return cursor.lastrowid # Return the ID of the inserted row
+            if not update_data:
+                 print(f"Warning: update_many called with empty update data for {self.table_name}")
+                 return 0
+                 
+            rowcount = self._execute_update(cursor, query, update_data)
+            self._commit()
+            return rowcount
+        except sqlite3.Error as e:
+            print(f"Error in update_many ({self.table_name}): {e}")
+            self._rollback(e) # Rollback on error
+            return 0
+        finally:
+            cursor.close() # Close the cursor
+
+    def insert_one(self, document):
+        cursor = self.db.conn.cursor() # Create a new cursor
+        try:
+            row_id = self._execute_insert(cursor, document)
+            self._commit() # Commit after successful insert
+            return row_id # Return the ID of the inserted row
         except sqlite3.Error as e:
             print(f"Error in insert_one ({self.table_name}): {e}")
-            self.db.conn.rollback() # Rollback on error
+            self._rollback(e) # Rollback on error
             return None
         finally:
             cursor.close() # Close the cursor
 
+    def insert_many(self, documents):
+        """Insert all documents in one transaction; returns the new row IDs ([] if the batch was rolled back)"""
+        if not documents:
+            return []
+        try:
+            with self.db.transaction():
+                cursor = self.db.conn.cursor()
+                try:
+                    return [self._execute_insert(cursor, document) for document in documents]
+                finally:
+                    cursor.close()
+        except sqlite3.Error as e:
+            print(f"Error in insert_many ({self.table_name}): {e}")
+            if self.db.in_transaction():
+                raise
+            return []
+
+    def bulk_write(self, operations):
+        """
+        Apply a list of writes in one transaction (one commit instead of one per row).
+
+        Operations use the MongoDB bulkWrite shape, shared with the MongoDB wrapper:
+            {'insert_one': {'document': {...}}}
+            {'update_one' | 'update_many': {'filter': {...}, 'update': {'$set': {...}}, 'upsert': False}}
+            {'delete_one' | 'delete_many': {'filter': {...}}}
+        Returns a dict of counts, or None if the batch failed and was rolled back.
+        """
+        result = {'inserted_count': 0, 'matched_count': 0, 'modified_count': 0, 'upserted_count': 0, 'deleted_count': 0}
+        if not operations:
+            return result
+        try:
+            with self.db.transaction():
+                cursor = self.db.conn.cursor()
+                try:
+                    for operation in operations:
+                        (name, args), = operation.items()
+                        if name == 'insert_one':
+                            self._execute_insert(cursor, args['document'])
+                            result['inserted_count'] += 1
+                        elif name in ('update_one', 'update_many'):
+                            update_data = args['update'].get('$set', args['update'])
+                            rowcount = self._execute_update(cursor, args['filter'], update_data)
+                            if rowcount == 0 and args.get('upsert'):
+                                insert_data = dict(args['filter'])
+                                insert_data.update(update_data)
+                                self._execute_insert(cursor, insert_data)
+                                result['upserted_count'] += 1
+                            else:
+                                result['matched_count'] += rowcount
+                                result['modified_count'] += rowcount
+                        elif name in ('delete_one', 'delete_many'):
+                            where_clause, params = self._build_where_clause(args['filter'])
+                            if not where_clause: # Never delete all rows from a bulk batch
+                                raise ValueError(f"{name} called with empty filter")
+                            if name == 'delete_one':
+                                sql = (f"DELETE FROM {self.table_name} WHERE rowid IN "
+                                       f"(SELECT rowid FROM {self.table_name} {where_clause} LIMIT 1)")
+                            else:
+                                sql = f"DELETE FROM {self.table_name} {where_clause}"
+                            cursor.execute(sql, params)
+                            result['deleted_count'] += cursor.rowcount
+                        else:
+                            raise ValueError(f"Unsupported bulk operation: {name}")
+                finally:
+                    cursor.close()
+            return result
+        except (sqlite3.Error, ValueError, KeyError) as e:
+            print(f"Error in bulk_write ({self.table_name}): {e}")
+            if self.db.in_transaction():
+                raise
+            return None
+
     def delete_one(self, query):
         cursor = self.db.conn.cursor() # Create a new cursor
         try:
@@ -503,11 +845,11 @@ class CollectionWrapper:
             sql = f"DELETE FROM {self.table_name} {where_clause} LIMIT 1" # LIMIT 1 for delete_one
             # print(f"Executing SQL: {sql} with params: {params}") # Debugging
             cursor.execute(sql, params)
-            self.db.conn.commit() # Commit after successful delete
+            self._commit() # Commit after successful delete
             return cursor.rowcount > 0 # Indicate success if a row was deleted
         except sqlite3.Error as e:
             print(f"Error in delete_one ({self.table_name}): {e}")
-            self.db.conn.rollback() # Rollback on error
+            self._rollback(e) # Rollback on error
             return False
         finally:
             cursor.close() # Close the cursor
@@ -524,21 +866,37 @@ class CollectionWrapper:
             # print(f"Executing SQL: {sql} with params: {params}") # Debugging
             cursor.execute(sql, params)
             deleted_count = cursor.rowcount
-            self.db.conn.commit() # Commit after successful delete
+            self._commit() # Commit after successful delete
             return deleted_count # Return the number of deleted rows
         except sqlite3.Error as e:
             print(f"Error in delete_many ({self.table_name}): {e}")
-            self.db.conn.rollback() # Rollback on error
+            self._rollback(e) # Rollback on error
             return 0
         finally:
             cursor.close() # Close the cursor
 
-    def count_documents(self, query):
+    def explain(self, query=None):
+        """Return the SQLite query plan for find(query) and whether it scans the whole table"""
         cursor = self.db.conn.cursor() # Create a new cursor
         try:
             where_clause, params = self._build_where_clause(query)
-            sql = f"SELECT COUNT(*) FROM {self.table_name} {where_clause}"
-            # print(f"Executing SQL: {sql} with params: {params}") # Debugging
+            cursor.execute(f"EXPLAIN QUERY PLAN SELECT * FROM {self.table_name} {where_clause}", params)
+            plan = [row[-1] for row in cursor.fetchall()]
+            # "SCAN <table>" without an index is a full scan; "SEARCH ... USING INDEX" is not
+            full_scan = any(detail.startswith('SCAN') and 'USING' not in detail for detail in plan)
+            return {'plan': plan, 'full_scan': full_scan}
+        except sqlite3.Error as e:
+            print(f"Error in explain ({self.table_name}): {e}")
+            # Unknown, not "uses an index": a broken query must not pass the index check
+            return {'plan': [], 'full_scan': None, 'error': str(e)}
+        finally:
+            cursor.close() # Close the cursor
+
+    def count_documents(self, query):
+        cursor = self.db.conn.cursor() # Create a new cursor
+        try:
+            shape, params = self._query_shape(query)
+            sql = self._cached_sql(('count', shape), self._select_sql, "COUNT(*)", shape, "")
             cursor.execute(sql, params)
             result = cursor.fetchone()
             return result[0] if result else 0
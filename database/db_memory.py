@@ -0,0 +1,474 @@
+import copy
+import itertools
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from database.indexes import INDEXES
+
+# Comparison used by each supported query operator
+_COMPARISONS = {
+    '$gt': lambda field_value, value: field_value > value,
+    '$lt': lambda field_value, value: field_value < value,
+    '$gte': lambda field_value, value: field_value >= value,
+    '$lte': lambda field_value, value: field_value <= value,
+}
+
+class Database:
+    """
+    Dict-backed backend with the same Database/CollectionWrapper interface as database/db.py
+    and database/db_mongodb.py, for tests and benchmarks that need no disk or MongoDB.
+    Select it with DATABASE_BACKEND=memory (see database/__init__.py). Data lives only in this process.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(Database, cls).__new__(cls)
+            cls._instance._stores = {}
+            cls._instance._stores_lock = threading.Lock()
+            cls._instance._local = threading.local()
+        return cls._instance
+
+    def _get_store(self, collection_name):
+        with self._stores_lock:
+            store = self._stores.get(collection_name)
+            if store is None:
+                # Hash indexes on every field the declared indexes use
+                fields = []
+                for index in INDEXES.get(collection_name, []):
+                    for field in index['fields']:
+                        if field not in fields:
+                            fields.append(field)
+                store = MemoryStore(collection_name, fields)
+                self._stores[collection_name] = store
+            return store
+
+    def get_collection(self, collection_name):
+        return CollectionWrapper(self, self._get_store(collection_name))
+
+    def get_next_id(self, collection_name):
+        """Next sequential ID for a collection (string IDs for active_tasks, like the other backends)"""
+        if collection_name == 'active_tasks':
+            return f"task_{int(datetime.now().timestamp())}_{next(self._get_store(collection_name).ids)}"
+        store = self._get_store(collection_name)
+        with store.lock:
+            ids = [doc.get('id') for doc in store.docs.values() if isinstance(doc.get('id'), int)]
+            return max(ids) + 1 if ids else 1
+
+    def in_transaction(self):
+        """True while the calling thread is inside transaction()"""
+        return getattr(self._local, 'transaction_depth', 0) > 0
+
+    def _undo_log(self):
+        """Undo log of the calling thread's transaction, or None outside transaction()"""
+        return getattr(self._local, 'undo', None) if self.in_transaction() else None
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run CollectionWrapper writes on this thread as one unit: every write is recorded in an
+        undo log, and an exception reverts them in reverse order and is re-raised.
+        Nested calls join the outer transaction.
+        """
+        depth = getattr(self._local, 'transaction_depth', 0)
+        if depth == 0:
+            self._local.undo = []
+        self._local.transaction_depth = depth + 1
+        try:
+            yield None
+        except BaseException:
+            if depth == 0:
+                for store, action, doc_id, doc in reversed(self._local.undo):
+                    store.revert(action, doc_id, doc)
+            raise
+        finally:
+            self._local.transaction_depth = depth
+            if depth == 0:
+                self._local.undo = None
+
+    def clear(self):
+        """Drop all collections (for test isolation)"""
+        with self._stores_lock:
+            self._stores = {}
+
+    def close(self):
+        pass
+
+class MemoryStore:
+    """Documents of one collection keyed by an internal _id, with hash indexes on selected fields"""
+
+    def __init__(self, name, indexed_fields):
+        self.name = name
+        self.lock = threading.RLock()
+        self.docs = {}
+        self.ids = itertools.count(1)
+        self.indexed_fields = list(indexed_fields)
+        self._rebuild_indexes()
+
+    def _rebuild_indexes(self):
+        # {field: {value: set(_id)}}; documents whose value is unhashable are kept in _unhashable[field]
+        self.indexes = {field: {} for field in self.indexed_fields}
+        self._unhashable = {field: set() for field in self.indexed_fields}
+        for doc_id, doc in self.docs.items():
+            self._index_add(doc_id, doc)
+
+    def _index_add(self, doc_id, doc):
+        for field, index in self.indexes.items():
+            value = doc.get(field)
+            try:
+                index.setdefault(value, set()).add(doc_id)
+            except TypeError:
+                self._unhashable[field].add(doc_id)
+
+    def _index_remove(self, doc_id, doc):
+        for field, index in self.indexes.items():
+            value = doc.get(field)
+            try:
+                ids = index.get(value)
+            except TypeError:
+                self._unhashable[field].discard(doc_id)
+                continue
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del index[value]
+
+    def insert(self, document, undo=None):
+        with self.lock:
+            doc = copy.deepcopy(document)
+            if '_id' not in doc:
+                doc['_id'] = next(self.ids)
+            elif doc['_id'] in self.docs:
+                raise ValueError(f"Duplicate _id {doc['_id']} in {self.name}")
+            self.docs[doc['_id']] = doc
+            self._index_add(doc['_id'], doc)
+            if undo is not None:
+                undo.append((self, 'insert', doc['_id'], None))
+            return doc['_id']
+
+    def replace(self, doc_id, new_doc, undo=None):
+        with self.lock:
+            old_doc = self.docs[doc_id]
+            self._index_remove(doc_id, old_doc)
+            self.docs[doc_id] = new_doc
+            self._index_add(doc_id, new_doc)
+            if undo is not None:
+                undo.append((self, 'replace', doc_id, old_doc))
+
+    def remove(self, doc_id, undo=None):
+        with self.lock:
+            old_doc = self.docs.pop(doc_id)
+            self._index_remove(doc_id, old_doc)
+            if undo is not None:
+                undo.append((self, 'remove', doc_id, old_doc))
+
+    def revert(self, action, doc_id, old_doc):
+        """Undo one logged write"""
+        with self.lock:
+            current = self.docs.pop(doc_id, None)
+            if current is not None:
+                self._index_remove(doc_id, current)
+            if action != 'insert':
+                self.docs[doc_id] = old_doc
+                self._index_add(doc_id, old_doc)
+
+    def candidates(self, query):
+        """IDs that may match query: narrowed by the equality/$in conditions on indexed fields"""
+        best = None
+        for field, condition in (query or {}).items():
+            index = self.indexes.get(field)
+            if index is None:
+                continue
+            if isinstance(condition, dict):
+                if '$in' not in condition or len(condition) != 1:
+                    continue
+                values = condition['$in']
+            else:
+                values = [condition]
+            ids = set(self._unhashable[field])
+            try:
+                for value in values:
+                    ids.update(index.get(value, ()))
+            except TypeError:
+                continue
+            if best is None or len(ids) < len(best):
+                best = ids
+        return best
+
+    def plan(self, query):
+        """Which index find(query) would use, mirroring explain() of the other backends"""
+        for field, condition in (query or {}).items():
+            if field in self.indexes and (not isinstance(condition, dict) or list(condition) == ['$in']):
+                return [f"HASH INDEX {self.name}.{field}"]
+        return [f"SCAN {self.name}"]
+
+def _matches_condition(doc, field, condition):
+    field_value = doc.get(field)
+    if isinstance(condition, dict):
+        for op, value in condition.items():
+            if op == '$ne':
+                if field_value == value:
+                    return False
+            elif op == '$in':
+                if not isinstance(value, (list, tuple)):
+                    raise ValueError("$in requires a list or tuple")
+                if field_value not in value:
+                    return False
+            elif op in _COMPARISONS:
+                if field_value is None:
+                    return False
+                try:
+                    if not _COMPARISONS[op](field_value, value):
+                        return False
+                except TypeError:
+                    return False
+            else:
+                print(f"Unsupported operator: {op}")
+                # Default to equality if operator is unknown, like the SQLite backend
+                return field_value == condition
+        return True
+    return field_value == condition
+
+def _matches(doc, query):
+    for field, condition in (query or {}).items():
+        if not _matches_condition(doc, field, condition):
+            return False
+    return True
+
+def _apply_update(doc, update):
+    """Apply a $set/$inc/$unset update (a plain dict is treated as $set) to a copy of doc"""
+    new_doc = dict(doc)
+    if not any(key.startswith('$') for key in update):
+        update = {'$set': update}
+    for op, fields in update.items():
+        if op == '$set':
+            for field, value in fields.items():
+                new_doc[field] = copy.deepcopy(value)
+        elif op == '$inc':
+            for field, value in fields.items():
+                new_doc[field] = (new_doc.get(field) or 0) + value
+        elif op == '$unset':
+            for field in fields:
+                new_doc.pop(field, None)
+        else:
+            raise ValueError(f"Unsupported update operator: {op}")
+    return new_doc
+
+def _sort_documents(docs, sort):
+    if isinstance(sort, str):
+        sort = [(sort, 1)]
+    # Stable sorts from the last key to the first; None sorts before any value (like SQLite)
+    for field, direction in reversed(list(sort)):
+        docs.sort(
+            key=lambda doc: (doc.get(field) is not None, doc.get(field) if doc.get(field) is not None else 0),
+            reverse=direction == -1
+        )
+    return docs
+
+def _project(doc, projection):
+    if not projection:
+        return doc
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    included = [field for field, value in projection.items() if value]
+    if included:
+        projected = {field: doc[field] for field in included if field in doc}
+        if projection.get('_id', 1) and '_id' in doc:
+            projected['_id'] = doc['_id']
+        return projected
+    return {field: value for field, value in doc.items() if field not in projection}
+
+class CollectionWrapper:
+    def __init__(self, db, store):
+        self.db = db
+        self.store = store
+        self.collection_name = store.name
+
+    def _matching_ids(self, query):
+        """IDs of matching documents in insertion order"""
+        candidates = self.store.candidates(query)
+        if candidates is None:
+            doc_ids = self.store.docs.keys()
+        else:
+            doc_ids = sorted(candidates, key=lambda doc_id: (str(type(doc_id)), doc_id))
+        return [doc_id for doc_id in doc_ids if _matches(self.store.docs[doc_id], query)]
+
+    def _raise_in_transaction(self, error):
+        """Inside db.transaction() a failed write must abort the whole batch"""
+        if self.db.in_transaction():
+            raise error
+
+    def find_one(self, query=None):
+        try:
+            with self.store.lock:
+                for doc_id in self._matching_ids(query):
+                    return copy.deepcopy(self.store.docs[doc_id])
+            return None
+        except ValueError as e:
+            print(f"Error in find_one ({self.collection_name}): {e}")
+            return None
+
+    def find(self, query=None, limit=None, sort=None, projection=None, skip=None, batch_size=None, lazy=False):
+        """
+        Find matching documents (same options as the other backends; batch_size is ignored).
+        With lazy=True a generator over a snapshot of the matching documents is returned.
+        """
+        try:
+            with self.store.lock:
+                docs = [copy.deepcopy(self.store.docs[doc_id]) for doc_id in self._matching_ids(query)]
+            if sort:
+                docs = _sort_documents(docs, sort)
+            if skip:
+                docs = docs[skip:]
+            if limit:
+                docs = docs[:limit]
+            docs = [_project(doc, projection) for doc in docs]
+            return iter(docs) if lazy else docs
+        except ValueError as e:
+            print(f"Error in find ({self.collection_name}): {e}")
+            return iter(()) if lazy else []
+
+    def insert_one(self, document):
+        try:
+            return self.store.insert(document, self.db._undo_log())
+        except ValueError as e:
+            print(f"Error in insert_one ({self.collection_name}): {e}")
+            self._raise_in_transaction(e)
+            return None
+
+    def insert_many(self, documents):
+        """Insert all documents as one unit; returns the new IDs ([] if the batch was rolled back)"""
+        if not documents:
+            return []
+        try:
+            with self.db.transaction():
+                undo = self.db._undo_log()
+                return [self.store.insert(document, undo) for document in documents]
+        except ValueError as e:
+            print(f"Error in insert_many ({self.collection_name}): {e}")
+            self._raise_in_transaction(e)
+            return []
+
+    def _update(self, query, update, upsert, many):
+        """Returns (matched, modified, upserted_id)"""
+        undo = self.db._undo_log()
+        with self.store.lock:
+            doc_ids = self._matching_ids(query)
+            if not many:
+                doc_ids = doc_ids[:1]
+            modified = 0
+            for doc_id in doc_ids:
+                old_doc = self.store.docs[doc_id]
+                new_doc = _apply_update(old_doc, update)
+                if new_doc != old_doc:
+                    self.store.replace(doc_id, new_doc, undo)
+                    modified += 1
+            if not doc_ids and upsert:
+                # Seed the new document from the equality conditions of the query
+                seed = {field: value for field, value in (query or {}).items() if not isinstance(value, dict)}
+                return 0, 0, self.store.insert(_apply_update(seed, update), undo)
+            return len(doc_ids), modified, None
+
+    def update_one(self, query, update, upsert=False):
+        try:
+            matched, modified, upserted_id = self._update(query, update, upsert, many=False)
+            return modified > 0 or (upsert and upserted_id is not None)
+        except ValueError as e:
+            print(f"Error in update_one ({self.collection_name}): {e}")
+            self._raise_in_transaction(e)
+            return False
+
+    def update_many(self, query, update):
+        try:
+            matched, modified, upserted_id = self._update(query, update, False, many=True)
+            return modified
+        except ValueError as e:
+            print(f"Error in update_many ({self.collection_name}): {e}")
+            self._raise_in_transaction(e)
+            return 0
+
+    def delete_one(self, query):
+        if not query:
+            print(f"Error: delete_one called with empty query for {self.collection_name}. Aborting.")
+            return False
+        try:
+            with self.store.lock:
+                for doc_id in self._matching_ids(query):
+                    self.store.remove(doc_id, self.db._undo_log())
+                    return True
+            return False
+        except ValueError as e:
+            print(f"Error in delete_one ({self.collection_name}): {e}")
+            self._raise_in_transaction(e)
+            return False
+
+    def delete_many(self, query):
+        if not query:
+            print(f"Error: delete_many called with empty query for {self.collection_name}. Aborting.")
+            return 0
+        try:
+            with self.store.lock:
+                doc_ids = self._matching_ids(query)
+                undo = self.db._undo_log()
+                for doc_id in doc_ids:
+                    self.store.remove(doc_id, undo)
+            return len(doc_ids)
+        except ValueError as e:
+            print(f"Error in delete_many ({self.collection_name}): {e}")
+            self._raise_in_transaction(e)
+            return 0
+
+    def bulk_write(self, operations):
+        """
+        Apply a list of writes as one unit (same operation dicts as the other backends).
+        Returns a dict of counts, or None if the batch failed and was rolled back.
+        """
+        result = {'inserted_count': 0, 'matched_count': 0, 'modified_count': 0, 'upserted_count': 0, 'deleted_count': 0}
+        if not operations:
+            return result
+        try:
+            with self.db.transaction():
+                for operation in operations:
+                    (name, args), = operation.items()
+                    if name == 'insert_one':
+                        self.store.insert(args['document'], self.db._undo_log())
+                        result['inserted_count'] += 1
+                    elif name in ('update_one', 'update_many'):
+                        matched, modified, upserted_id = self._update(
+                            args['filter'], args['update'], args.get('upsert', False), many=name == 'update_many'
+                        )
+                        result['matched_count'] += matched
+                        result['modified_count'] += modified
+                        if upserted_id is not None:
+                            result['upserted_count'] += 1
+                    elif name in ('delete_one', 'delete_many'):
+                        if not args['filter']:
+                            raise ValueError(f"{name} called with empty filter")
+                        with self.store.lock:
+                            doc_ids = self._matching_ids(args['filter'])
+                            if name == 'delete_one':
+                                doc_ids = doc_ids[:1]
+                            for doc_id in doc_ids:
+                                self.store.remove(doc_id, self.db._undo_log())
+                        result['deleted_count'] += len(doc_ids)
+                    else:
+                        raise ValueError(f"Unsupported bulk operation: {name}")
+            return result
+        except (ValueError, KeyError) as e:
+            print(f"Error in bulk_write ({self.collection_name}): {e}")
+            self._raise_in_transaction(e)
+            return None
+
+    def explain(self, query=None):
+        """Return which hash index find(query) uses and whether it scans the whole collection"""
+        plan = self.store.plan(query)
+        return {'plan': plan, 'full_scan': plan[0].startswith('SCAN')}
+
+    def count_documents(self, query=None):
+        try:
+            with self.store.lock:
+                return len(self._matching_ids(query))
+        except ValueError as e:
+            print(f"Error in count_documents ({self.collection_name}): {e}")
+            return 0
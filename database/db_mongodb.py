@@ -1,16 +1,22 @@
 import os
 import json
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from pymongo import MongoClient
+from pymongo import MongoClient, InsertOne, UpdateOne, UpdateMany, DeleteOne, DeleteMany
 from bson import ObjectId
 import logging
 
+from database.indexes import ensure_mongodb_indexes
+
 class Database:
     _instance = None
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(Database, cls).__new__(cls)
+            # Per-thread session of the active transaction() (see CollectionWrapper._session)
+            cls._instance._local = threading.local()
             # Get MongoDB connection string from environment variable
             mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
             database_name = os.getenv('MONGODB_DATABASE', 'telegram_bot')
@@ -24,13 +30,51 @@ class Database:
             except Exception as e:
                 print(f"Failed to connect to MongoDB: {e}")
                 raise
+            
+            # Secondary indexes for the hot lookup paths (idempotent)
+            try:
+                ensure_mongodb_indexes(cls._instance.db)
+            except Exception as e:
+                print(f"Failed to ensure MongoDB indexes: {e}")
         return cls._instance
     
     def get_collection(self, collection_name):
         """
         Get a MongoDB collection wrapper that mimics the SQLite interface
         """
-        return CollectionWrapper(self.db[collection_name])
+        return CollectionWrapper(self.db[collection_name], self)
+    
+    def in_transaction(self):
+        """True while the calling thread is inside transaction()"""
+        return getattr(self._local, 'transaction_depth', 0) > 0
+    
+    def supports_transactions(self):
+        """Multi-document transactions need a replica set or a sharded cluster"""
+        topology = self.client.topology_description.topology_type_name
+        return topology in ('ReplicaSetWithPrimary', 'Sharded', 'LoadBalanced')
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Run CollectionWrapper calls on this thread inside one MongoDB transaction.
+        Nested calls join the outer transaction; an exception aborts it and is re-raised.
+        On a standalone server the block runs without a transaction (bulk_write is still one round trip).
+        """
+        depth = getattr(self._local, 'transaction_depth', 0)
+        self._local.transaction_depth = depth + 1
+        try:
+            if depth > 0 or not self.supports_transactions():
+                yield None
+                return
+            with self.client.start_session() as session:
+                with session.start_transaction():
+                    self._local.session = session
+                    try:
+                        yield session
+                    finally:
+                        self._local.session = None
+        finally:
+            self._local.transaction_depth = depth
     
     def get_next_id(self, collection_name):
         """
@@ -60,15 +104,27 @@ class Database:
             print("MongoDB connection closed.")
 
 class CollectionWrapper:
-    def __init__(self, collection):
+    def __init__(self, collection, database=None):
         self.collection = collection
+        self.database = database
+    
+    def _session(self):
+        """Session of the calling thread's transaction(), or None"""
+        if self.database is None:
+            return None
+        return getattr(self.database._local, 'session', None)
+    
+    def _raise_in_transaction(self, error):
+        """Inside transaction() a failed write must abort the whole transaction"""
+        if self.database is not None and self.database.in_transaction():
+            raise error
     
     def find_one(self, query=None):
         """
         Find a single document
         """
         try:
-            result = self.collection.find_one(query or {})
+            result = self.collection.find_one(query or {}, session=self._session())
             if result:
                 # Convert ObjectId to string for compatibility
                 if '_id' in result and isinstance(result['_id'], ObjectId):
@@ -78,27 +134,51 @@ class CollectionWrapper:
             print(f"Error in find_one: {e}")
             return None
     
-    def find(self, query=None, limit=None, sort=None):
+    def find(self, query=None, limit=None, sort=None, projection=None, skip=None, batch_size=None, lazy=False):
         """
         Find multiple documents
+
+        projection: fields to return ({'field': 1} / {'field': 0} or a list); sort: field name or
+        [(field, 1 | -1)]; limit/skip: paging; batch_size: documents per getMore round trip.
+        With lazy=True a generator is returned that streams documents from the server cursor
+        instead of materializing the whole result, so whole-collection scans run in constant memory.
         """
         try:
-            cursor = self.collection.find(query or {})
-            if sort:
-                cursor = cursor.sort(sort)
-            if limit:
-                cursor = cursor.limit(limit)
-            
-            results = []
+            cursor = self._cursor(query, limit, sort, projection, skip, batch_size)
+            if lazy:
+                return self._iter_cursor(cursor)
+            return [self._normalize_id(doc) for doc in cursor]
+        except Exception as e:
+            print(f"Error in find: {e}")
+            return iter(()) if lazy else []
+    
+    def _cursor(self, query, limit, sort, projection, skip, batch_size):
+        cursor = self.collection.find(query or {}, projection, session=self._session())
+        if sort:
+            cursor = cursor.sort(sort)
+        if skip:
+            cursor = cursor.skip(skip)
+        if limit:
+            cursor = cursor.limit(limit)
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
+        return cursor
+    
+    @staticmethod
+    def _normalize_id(doc):
+        # Convert ObjectId to string for compatibility
+        if isinstance(doc.get('_id'), ObjectId):
+            doc['_id'] = str(doc['_id'])
+        return doc
+    
+    def _iter_cursor(self, cursor):
+        try:
             for doc in cursor:
-                # Convert ObjectId to string for compatibility
-                if '_id' in doc and isinstance(doc['_id'], ObjectId):
-                    doc['_id'] = str(doc['_id'])
-                results.append(doc)
-            return results
+                yield self._normalize_id(doc)
         except Exception as e:
             print(f"Error in find: {e}")
-            return []
+        finally:
+            cursor.close()
     
     def insert_one(self, document):
         """
@@ -110,10 +190,11 @@ class CollectionWrapper:
                 # Keep the integer _id as is
                 pass
             
-            result = self.collection.insert_one(document)
+            result = self.collection.insert_one(document, session=self._session())
             return result.inserted_id
         except Exception as e:
             print(f"Error in insert_one: {e}")
+            self._raise_in_transaction(e)
             return None
     
     def insert_many(self, documents):
@@ -121,10 +202,11 @@ class CollectionWrapper:
         Insert multiple documents
         """
         try:
-            result = self.collection.insert_many(documents)
+            result = self.collection.insert_many(documents, session=self._session())
             return result.inserted_ids
         except Exception as e:
             print(f"Error in insert_many: {e}")
+            self._raise_in_transaction(e)
             return []
     
     def update_one(self, query, update, upsert=False):
@@ -137,10 +219,11 @@ class CollectionWrapper:
                 # If no MongoDB operators, wrap in $set
                 update = {'$set': update}
             
-            result = self.collection.update_one(query, update, upsert=upsert)
+            result = self.collection.update_one(query, update, upsert=upsert, session=self._session())
             return result.modified_count > 0 or (upsert and result.upserted_id is not None)
         except Exception as e:
             print(f"Error in update_one: {e}")
+            self._raise_in_transaction(e)
             return False
     
     def update_many(self, query, update):
@@ -153,21 +236,69 @@ class CollectionWrapper:
                 # If no MongoDB operators, wrap in $set
                 update = {'$set': update}
             
-            result = self.collection.update_many(query, update)
+            result = self.collection.update_many(query, update, session=self._session())
             return result.modified_count
         except Exception as e:
             print(f"Error in update_many: {e}")
+            self._raise_in_transaction(e)
             return 0
     
+    def bulk_write(self, operations):
+        """
+        Apply a list of writes in one round trip (ordered; atomic inside transaction()).
+
+        Operations use the shape shared with the SQLite wrapper:
+            {'insert_one': {'document': {...}}}
+            {'update_one' | 'update_many': {'filter': {...}, 'update': {'$set': {...}}, 'upsert': False}}
+            {'delete_one' | 'delete_many': {'filter': {...}}}
+        Returns a dict of counts, or None on error.
+        """
+        result = {'inserted_count': 0, 'matched_count': 0, 'modified_count': 0, 'upserted_count': 0, 'deleted_count': 0}
+        if not operations:
+            return result
+        try:
+            requests = []
+            for operation in operations:
+                (name, args), = operation.items()
+                if name == 'insert_one':
+                    requests.append(InsertOne(args['document']))
+                elif name in ('update_one', 'update_many'):
+                    update = args['update']
+                    if not any(key.startswith('$') for key in update.keys()):
+                        # If no MongoDB operators, wrap in $set
+                        update = {'$set': update}
+                    request_class = UpdateOne if name == 'update_one' else UpdateMany
+                    requests.append(request_class(args['filter'], update, upsert=args.get('upsert', False)))
+                elif name in ('delete_one', 'delete_many'):
+                    if not args['filter']:
+                        raise ValueError(f"{name} called with empty filter")
+                    request_class = DeleteOne if name == 'delete_one' else DeleteMany
+                    requests.append(request_class(args['filter']))
+                else:
+                    raise ValueError(f"Unsupported bulk operation: {name}")
+            
+            bulk_result = self.collection.bulk_write(requests, ordered=True, session=self._session())
+            result['inserted_count'] = bulk_result.inserted_count
+            result['matched_count'] = bulk_result.matched_count
+            result['modified_count'] = bulk_result.modified_count
+            result['upserted_count'] = bulk_result.upserted_count
+            result['deleted_count'] = bulk_result.deleted_count
+            return result
+        except Exception as e:
+            print(f"Error in bulk_write: {e}")
+            self._raise_in_transaction(e)
+            return None
+    
     def delete_one(self, query):
         """
         Delete a single document
         """
         try:
-            result = self.collection.delete_one(query)
+            result = self.collection.delete_one(query, session=self._session())
             return result.deleted_count > 0
         except Exception as e:
             print(f"Error in delete_one: {e}")
+            self._raise_in_transaction(e)
             return False
     
     def delete_many(self, query):
@@ -179,18 +310,37 @@ class CollectionWrapper:
                 print("Error: delete_many called with empty query. Aborting.")
                 return 0
             
-            result = self.collection.delete_many(query)
+            result = self.collection.delete_many(query, session=self._session())
             return result.deleted_count
         except Exception as e:
             print(f"Error in delete_many: {e}")
+            self._raise_in_transaction(e)
             return 0
     
+    def explain(self, query=None):
+        """
+        Return the winning plan for find(query) and whether it is a collection scan
+        """
+        try:
+            explanation = self.collection.find(query or {}).explain()
+            plan = explanation.get('queryPlanner', {}).get('winningPlan', {})
+            stages = []
+            stage = plan
+            while stage:
+                stages.append(stage.get('stage'))
+                stage = stage.get('inputStage')
+            return {'plan': stages, 'full_scan': 'COLLSCAN' in stages}
+        except Exception as e:
+            print(f"Error in explain: {e}")
+            # Unknown, not "uses an index": a broken query must not pass the index check
+            return {'plan': [], 'full_scan': None, 'error': str(e)}
+    
     def count_documents(self, query=None):
         """
         Count documents matching the query
         """
         try:
-            return self.collection.count_documents(query or {})
+            return self.collection.count_documents(query or {}, session=self._session())
         except Exception as e:
             print(f"Error in count_documents: {e}")
             return 0
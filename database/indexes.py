@@ -0,0 +1,134 @@
+"""Declarative secondary indexes for the hot lookup paths.
+
+The same definitions are provisioned idempotently at startup by both persistent backends
+(database/db.py for SQLite and database/db_mongodb.py for MongoDB); database/db_memory.py
+keeps hash indexes on the same fields.
+Run `python -m database.indexes [mongodb|sqlite|memory]` to print which hot CollectionWrapper queries
+still need a full table/collection scan.
+"""
+
+# collection -> list of index definitions
+# fields: indexed fields in order; sqlite: False when SQLite already covers it (e.g. INTEGER PRIMARY KEY)
+INDEXES = {
+    'users': [
+        {'fields': ['user_id'], 'sqlite': False},  # rowid alias in SQLite
+        {'fields': ['is_admin']},
+    ],
+    'groups': [
+        # GroupService.add_group / toggle_group_blacklist / get_group
+        {'fields': ['user_id', 'group_id']},
+        # GroupService.get_user_active_groups / get_user_blacklisted_groups
+        {'fields': ['user_id', 'blacklisted']},
+    ],
+    'responses': [
+        # ResponseService.get_user_responses
+        {'fields': ['user_id', 'response_type']},
+    ],
+    'active_tasks': [
+        {'fields': ['status']},
+        {'fields': ['user_id']},
+    ],
+    'subscriptions': [
+        {'fields': ['user_id']},
+    ],
+    'post_groups': [
+        {'fields': ['post_id']},
+        {'fields': ['group_id']},
+    ],
+    'response_logs': [
+        {'fields': ['user_id']},
+    ],
+}
+
+# Representative queries issued by the services, used by the full-scan report
+HOT_QUERIES = [
+    ('users', {'user_id': 1}),
+    ('users', {'is_admin': True}),
+    ('groups', {'user_id': 1}),
+    ('groups', {'user_id': 1, 'group_id': '1'}),
+    ('groups', {'user_id': 1, 'blacklisted': False}),
+    ('responses', {'user_id': 1, 'response_type': 'greeting'}),
+    ('active_tasks', {'status': 'running'}),
+    ('subscriptions', {'user_id': 1}),
+    ('post_groups', {'post_id': 1}),
+]
+
+
+def index_name(collection_name, index):
+    """Stable index name shared by both backends"""
+    return f"idx_{collection_name}_{'_'.join(index['fields'])}"
+
+
+def ensure_sqlite_indexes(conn):
+    """Create the declared indexes on existing SQLite tables (CREATE INDEX IF NOT EXISTS)"""
+    cursor = conn.cursor()
+    created = 0
+    try:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        tables = {row[0] for row in cursor.fetchall()}
+        for collection_name, indexes in INDEXES.items():
+            if collection_name not in tables:
+                continue
+            for index in indexes:
+                if index.get('sqlite', True) is False:
+                    continue
+                columns = ", ".join(f"`{field}`" for field in index['fields'])
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {index_name(collection_name, index)} "
+                    f"ON {collection_name} ({columns})"
+                )
+                created += 1
+        conn.commit()
+    finally:
+        cursor.close()
+    return created
+
+
+def ensure_mongodb_indexes(db):
+    """Create the declared indexes on MongoDB collections (create_index is idempotent)"""
+    from pymongo import ASCENDING
+
+    created = 0
+    for collection_name, indexes in INDEXES.items():
+        for index in indexes:
+            db[collection_name].create_index(
+                [(field, ASCENDING) for field in index['fields']],
+                name=index_name(collection_name, index)
+            )
+            created += 1
+    return created
+
+
+def report_full_scans(database, queries=None):
+    """
+    Explain each hot query through its CollectionWrapper and return those that still do full scans
+    or could not be explained: (collection_name, query, plan, error) with error None for full scans
+    """
+    problems = []
+    for collection_name, query in queries or HOT_QUERIES:
+        plan = database.get_collection(collection_name).explain(query)
+        if plan.get('full_scan') is None:
+            problems.append((collection_name, query, plan.get('plan'), plan.get('error') or 'explain failed'))
+        elif plan.get('full_scan'):
+            problems.append((collection_name, query, plan.get('plan'), None))
+    return problems
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+
+    # python -m database.indexes [mongodb|sqlite|memory]  (default: DATABASE_BACKEND)
+    if len(sys.argv) > 1:
+        os.environ['DATABASE_BACKEND'] = sys.argv[1]
+    from database import Database
+
+    problems = report_full_scans(Database())
+    if not problems:
+        print("All hot queries use an index.")
+    for collection_name, query, plan, error in problems:
+        if error:
+            print(f"FAILED {collection_name} {query}: {error}")
+        else:
+            print(f"FULL SCAN {collection_name} {query}: {plan}")
+    sys.exit(1 if problems else 0)
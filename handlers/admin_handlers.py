@@ -280,10 +280,9 @@ class AdminHandlers:
             channel = subscription_info.get("channel", "لم يتم تعيين قناة")
             is_mandatory = subscription_info.get("is_mandatory", False)
             remaining_days = subscription_info.get("remaining_days", "غير محدد")
-            all_users_list = self.subscription_service.get_all_users()
-            total_users = len(all_users_list)
-            active_users = len(self.subscription_service.get_all_active_users())
-            admin_users = len([user for user in all_users_list if user.is_admin])
+            total_users = await self.subscription_service.count_users_async()
+            active_users = len(await self.subscription_service.get_all_active_users_async())
+            admin_users = await self.subscription_service.count_users_async({'is_admin': True})
             status_text = "✅ مفعل" if is_mandatory else "❌ غير مفعل"
             keyboard = [[InlineKeyboardButton("🔙 رجوع", callback_data="admin_back")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
@@ -456,7 +455,7 @@ class AdminHandlers:
             await context.bot.send_message(chat_id=chat_id, text="⚠️ معرف المستخدم وعدد الأيام يجب أن تكون أرقاماً.")
             return
 
-        success, admin_message_text, subscription_end_date = self.subscription_service.add_subscription(user_id, days, added_by=update.effective_user.id)
+        success, admin_message_text, subscription_end_date = await self.subscription_service.add_subscription_async(user_id, days, added_by=update.effective_user.id)
         
         if success:
             admin_final_message = f"{admin_message_text}\n"
@@ -524,7 +523,7 @@ class AdminHandlers:
                 await self._show_user_management_menu(update.message.reply_text)
                 return ConversationHandler.END
 
-            success, admin_message_text, subscription_end_date = self.subscription_service.add_subscription(user_id, days, added_by=update.effective_user.id)
+            success, admin_message_text, subscription_end_date = await self.subscription_service.add_subscription_async(user_id, days, added_by=update.effective_user.id)
 
             if success:
                 admin_final_message = f"{admin_message_text}\n"
@@ -577,7 +576,7 @@ class AdminHandlers:
         try:
             user_id_to_remove = int(update.message.text.strip())
             
-            success, message = self.subscription_service.remove_subscription(user_id_to_remove)
+            success, message = await self.subscription_service.remove_subscription_async(user_id_to_remove)
             await context.bot.send_message(chat_id=chat_id, text=message, parse_mode="Markdown")
 
             # Notify the user whose subscription was removed
@@ -623,7 +622,7 @@ class AdminHandlers:
             await context.bot.send_message(chat_id=chat_id, text="⚠️ معرف المستخدم يجب أن يكون رقماً.")
             return
 
-        success, message = self.subscription_service.remove_subscription(user_id)
+        success, message = await self.subscription_service.remove_subscription_async(user_id)
         # Notify the user whose subscription was removed
         if success and "✅ تم إلغاء اشتراك المستخدم" in message: # Check if removal was successful for a subscribed user
             try:
@@ -635,7 +634,7 @@ class AdminHandlers:
 
     async def _show_remove_user_list(self, reply_func):
         """Show a list of active subscribers (non-admins) to choose from for removal""" # Updated docstring
-        active_subscribers = self.subscription_service.get_all_active_users() # Use the corrected method
+        active_subscribers = await self.subscription_service.get_all_active_users_async() # Use the corrected method
         if not active_subscribers:
             keyboard = [[InlineKeyboardButton("🔙 رجوع", callback_data="admin_users")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
@@ -666,7 +665,7 @@ class AdminHandlers:
         try:
             user_id_to_remove = int(query.data.split("_")[-1])
             logger.info(f"[DEBUG] Attempting to remove user: {user_id_to_remove}")
-            success, message = self.subscription_service.remove_subscription(user_id_to_remove)
+            success, message = await self.subscription_service.remove_subscription_async(user_id_to_remove)
             await query.edit_message_text(message)
 
             # Notify the user whose subscription was removed
@@ -722,7 +721,7 @@ class AdminHandlers:
             await context.bot.send_message(chat_id=chat_id, text="⚠️ معرف المستخدم يجب أن يكون رقماً.")
             return
 
-        user_info = self.subscription_service.get_user(user_id)
+        user_info = await self.subscription_service.get_user_async(user_id)
         message = self._format_user_info(user_info, user_id)
         await context.bot.send_message(chat_id=chat_id, text=message, parse_mode="Markdown")
 
@@ -732,7 +731,7 @@ class AdminHandlers:
         chat_id = update.effective_chat.id
         try:
             user_id = int(update.message.text.strip())
-            user_info = self.subscription_service.get_user(user_id)
+            user_info = await self.subscription_service.get_user_async(user_id)
             message = self._format_user_info(user_info, user_id)
             await context.bot.send_message(chat_id=chat_id, text=message, parse_mode="Markdown")
             await asyncio.sleep(2)
@@ -825,7 +824,7 @@ class AdminHandlers:
 
     async def _show_list_users(self, reply_func):
         """Show a paginated list of all users"""
-        active_users = self.subscription_service.get_all_active_users()
+        active_users = await self.subscription_service.get_all_active_users_async()
         if not active_users:
             keyboard = [[InlineKeyboardButton("🔙 رجوع", callback_data="admin_users")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
@@ -903,16 +902,17 @@ class AdminHandlers:
 
     async def _broadcast_message_to_users(self, message_text, admin_chat_id, bot):
         """Helper function to broadcast message to all users"""
-        all_users = self.subscription_service.get_all_users()
-        if not all_users:
+        total_users = await self.subscription_service.count_users_async()
+        if not total_users:
             await bot.send_message(admin_chat_id, "📢 لا يوجد مستخدمين لإرسال الرسالة إليهم.")
             return
 
         sent_count = 0
         failed_count = 0
-        await bot.send_message(admin_chat_id, f"📢 جاري إرسال الرسالة إلى {len(all_users)} مستخدم... يرجى الانتظار.")
+        await bot.send_message(admin_chat_id, f"📢 جاري إرسال الرسالة إلى {total_users} مستخدم... يرجى الانتظار.")
 
-        for user in all_users:
+        # Stream users instead of loading the whole table
+        for user in self.subscription_service.iter_all_users():
             try:
                 await bot.send_message(user.user_id, message_text)
                 sent_count += 1
@@ -1015,10 +1015,9 @@ class AdminHandlers:
         channel = subscription_info.get("channel", "لم يتم تعيين قناة")
         is_mandatory = subscription_info.get("is_mandatory", False)
         remaining_days = subscription_info.get("remaining_days", "غير محدد")
-        all_users_list = self.subscription_service.get_all_users()
-        total_users = len(all_users_list)
-        active_users = len(self.subscription_service.get_all_active_users())
-        admin_users = len([user for user in all_users_list if user.is_admin])
+        total_users = await self.subscription_service.count_users_async()
+        active_users = len(await self.subscription_service.get_all_active_users_async())
+        admin_users = await self.subscription_service.count_users_async({'is_admin': True})
         status_text = "✅ مفعل" if is_mandatory else "❌ غير مفعل"
         
         stats_message = (
@@ -1062,7 +1061,7 @@ class AdminHandlers:
         """Show users with subscriptions active for more than 1 day."""
         query = update.callback_query
         reply_func = query.edit_message_text
-        active_users = self.subscription_service.get_all_active_users() # This already filters non-admins
+        active_users = await self.subscription_service.get_all_active_users_async() # This already filters non-admins
         
         users_gt_1_day = []
         now = datetime.utcnow()
@@ -19,6 +19,7 @@ except ImportError:
             pass
 
 from services.subscription_service import SubscriptionService
+from database.async_db import async_db
 from utils.decorators import subscription_required
 import re
 import logging
@@ -931,7 +932,7 @@ class AuthHandlers:
         user_id = update.effective_user.id
 
         # Check if user has API credentials
-        user = self.auth_service.users_collection.find_one({'user_id': user_id})
+        user = await async_db.collection(self.auth_service.users_collection).find_one({'user_id': user_id})
         if not user or 'api_id' not in user or 'api_hash' not in user:
             await context.bot.send_message(
                 chat_id=chat_id,
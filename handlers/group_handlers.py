@@ -45,7 +45,7 @@ class GroupHandlers:
         self.user_page_state[user_id] = 0
 
         # Get user groups from database
-        groups = self.group_service.get_user_groups(user_id)
+        groups = await self.group_service.get_user_groups_async(user_id)
 
         if not groups:
             # No groups found, offer to fetch them
@@ -92,7 +92,7 @@ class GroupHandlers:
 
             # Show groups keyboard - تأكد من إظهار المجموعات المحدثة مباشرة بعد التحديث
             # الحصول على المجموعات المحدثة من قاعدة البيانات بدلاً من استخدام المجموعات المعادة من API
-            updated_groups = self.group_service.get_user_groups(user_id)
+            updated_groups = await self.group_service.get_user_groups_async(user_id)
             
             if updated_groups:
                 # إظهار المجموعات المحدثة مباشرة
@@ -142,7 +142,7 @@ class GroupHandlers:
 
                 # Show groups keyboard - تأكد من إظهار المجموعات المحدثة مباشرة بعد التحديث
                 # الحصول على المجموعات المحدثة من قاعدة البيانات بدلاً من استخدام المجموعات المعادة من API
-                updated_groups = self.group_service.get_user_groups(user_id)
+                updated_groups = await self.group_service.get_user_groups_async(user_id)
                 
                 if updated_groups:
                     # إظهار المجموعات المحدثة مباشرة
@@ -180,11 +180,11 @@ class GroupHandlers:
                 return
 
             # Toggle blacklist status
-            success, is_blacklisted = self.group_service.toggle_group_blacklist(user_id, group_id)
+            success, is_blacklisted = await self.group_service.toggle_group_blacklist_async(user_id, group_id)
 
             if success:
                 # Get updated groups
-                groups = self.group_service.get_user_groups(user_id)
+                groups = await self.group_service.get_user_groups_async(user_id)
 
                 # Update keyboard
                 await self.update_groups_keyboard(query, groups, user_id)
@@ -195,7 +195,7 @@ class GroupHandlers:
 
         elif data == "group_done":
             # User is done with group selection
-            active_groups = self.group_service.get_user_active_groups(user_id)
+            active_groups = await self.group_service.get_user_active_groups_async(user_id)
 
             await query.edit_message_text(
                 text=f"✅ تم حفظ إعدادات المجموعات بنجاح.\n\n"
@@ -205,11 +205,11 @@ class GroupHandlers:
 
         elif data == "group_select_all":
             # Select all groups (remove from blacklist)
-            success = self.group_service.select_all_groups(user_id)
+            success = await self.group_service.select_all_groups_async(user_id)
 
             if success:
                 # Get updated groups
-                groups = self.group_service.get_user_groups(user_id)
+                groups = await self.group_service.get_user_groups_async(user_id)
 
                 # Update keyboard
                 await self.update_groups_keyboard(query, groups, user_id)
@@ -220,11 +220,11 @@ class GroupHandlers:
 
         elif data == "group_deselect_all":
             # Deselect all groups (add to blacklist)
-            success = self.group_service.deselect_all_groups(user_id)
+            success = await self.group_service.deselect_all_groups_async(user_id)
 
             if success:
                 # Get updated groups
-                groups = self.group_service.get_user_groups(user_id)
+                groups = await self.group_service.get_user_groups_async(user_id)
 
                 # Update keyboard
                 await self.update_groups_keyboard(query, groups, user_id)
@@ -240,14 +240,14 @@ class GroupHandlers:
                 self.user_page_state[user_id] -= 1
             
             # الحصول على المجموعات المحدثة من قاعدة البيانات
-            groups = self.group_service.get_user_groups(user_id)
+            groups = await self.group_service.get_user_groups_async(user_id)
             
             # تحديث لوحة المفاتيح
             await self.update_groups_keyboard(query, groups, user_id)
             
         elif data == "group_next_page":
             # الانتقال إلى الصفحة التالية
-            groups = self.group_service.get_user_groups(user_id)
+            groups = await self.group_service.get_user_groups_async(user_id)
             total_pages = (len(groups) + self.GROUPS_PER_PAGE - 1) // self.GROUPS_PER_PAGE
             
             if self.user_page_state[user_id] < total_pages - 1:
@@ -1,6 +1,7 @@
 from telegram import Update
 from telegram.ext import CallbackContext, CommandHandler, MessageHandler, filters
 from services.subscription_service import SubscriptionService
+from utils.request_context import get_request_context
 from config.config import ADMIN_USER_ID
 
 # Channel ID for message monitoring
@@ -38,9 +39,9 @@ class MonitoringHandlers:
             header += f"👤 Username: @{username}\n"
             
             # Get subscription status
-            db_user = self.subscription_service.get_user(user_id)
-            is_subscribed = db_user and db_user.has_active_subscription() if db_user else False
-            is_admin = db_user and db_user.is_admin if db_user else False
+            request_context = await get_request_context(update, context)
+            is_subscribed = request_context.has_active_subscription if request_context else False
+            is_admin = request_context.is_admin if request_context else False
             
             # Add subscription status to header
             if is_admin:
@@ -10,6 +10,7 @@ from telegram.ext import (
 )
 from services.posting_service import PostingService
 from services.group_service import GroupService
+from database.async_db import async_db
 from utils.keyboard_utils import create_keyboard
 
 class PostingHandlers:
@@ -85,6 +86,7 @@ class PostingHandlers:
                 self.CONFIRM_POSTING: [
                     # تصحيح: إضافة معالجات الأزرار داخل المحادثة لضمان عملها
                     CallbackQueryHandler(self.handle_confirm_posting, pattern=r'^confirm_posting$'),
+                    CallbackQueryHandler(self.handle_posting_mode, pattern=r'^posting_mode:'),
                     CallbackQueryHandler(self.handle_cancel, pattern=r'^cancel$'),
                 ],
             },
@@ -167,7 +169,7 @@ class PostingHandlers:
             user_id = update.effective_user.id
 
             # تصحيح: استخدام دالة get_user_active_groups من خدمة المجموعات
-            groups = self.get_active_user_groups(user_id)
+            groups = await self.get_active_user_groups(user_id)
 
             if not groups:
                 await update.message.reply_text("📱 *لم يتم العثور على أي مجموعات نشطة. يرجى إضافة مجموعات أولاً.*", parse_mode="Markdown")
@@ -196,6 +198,7 @@ class PostingHandlers:
             # Store groups in context
             context.user_data['available_groups'] = groups
             context.user_data['selected_groups'] = []
+            context.user_data['posting_mode'] = 'send'
 
             # Send message
             await update.message.reply_text(
@@ -210,17 +213,17 @@ class PostingHandlers:
             await update.message.reply_text("❌ *حدث خطأ أثناء بدء عملية النشر. يرجى المحاولة مرة أخرى.*", parse_mode="Markdown")
             return ConversationHandler.END
 
-    def get_active_user_groups(self, user_id):
+    async def get_active_user_groups(self, user_id):
         """
         الحصول على المجموعات النشطة للمستخدم
-        تصحيح: استخدام دالة get_user_active_groups من خدمة المجموعات
+        تصحيح: استخدام دالة get_user_active_groups من خدمة المجموعات (على منفذ قاعدة البيانات)
         """
         try:
-            return self.group_service.get_user_active_groups(user_id)
+            return await self.group_service.get_user_active_groups_async(user_id)
         except AttributeError:
             # إذا لم تكن الدالة موجودة، استخدم الطريقة البديلة
             try:
-                return self.posting_service.get_user_groups(user_id)
+                return await async_db.run(self.posting_service.get_user_groups, user_id)
             except Exception as e:
                 self.logger.error(f"Error getting user groups: {str(e)}")
                 return []
@@ -524,11 +527,7 @@ class PostingHandlers:
                 confirmation_text += "هل تريد المتابعة؟"
 
                 # Create keyboard
-                keyboard = [
-                    [InlineKeyboardButton("✅ تأكيد", callback_data="confirm_posting")],
-                    [InlineKeyboardButton("❌ إلغاء", callback_data="cancel")]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = self.build_confirmation_keyboard(context)
 
                 # Update message
                 await query.edit_message_text(
@@ -577,11 +576,7 @@ class PostingHandlers:
                 confirmation_text += "هل تريد المتابعة؟"
 
                 # Create keyboard
-                keyboard = [
-                    [InlineKeyboardButton("✅ تأكيد", callback_data="confirm_posting")],
-                    [InlineKeyboardButton("❌ إلغاء", callback_data="cancel")]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = self.build_confirmation_keyboard(context)
 
                 # Send message
                 await update.message.reply_text(
@@ -639,11 +634,7 @@ class PostingHandlers:
                 confirmation_text += "هل تريد المتابعة؟"
 
                 # Create keyboard
-                keyboard = [
-                    [InlineKeyboardButton("✅ تأكيد", callback_data="confirm_posting")],
-                    [InlineKeyboardButton("❌ إلغاء", callback_data="cancel")]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = self.build_confirmation_keyboard(context)
 
                 # Send message
                 await update.message.reply_text(
@@ -665,6 +656,38 @@ class PostingHandlers:
             await update.message.reply_text("❌ *حدث خطأ أثناء تعيين التأخير. يرجى المحاولة مرة أخرى.*", parse_mode="Markdown")
             return ConversationHandler.END
 
+    def build_confirmation_keyboard(self, context):
+        """Build the confirmation keyboard with the posting mode toggle"""
+        posting_mode = context.user_data.get('posting_mode', 'send')
+        if posting_mode == "forward":
+            mode_button = InlineKeyboardButton("🔁 الوضع: تحويل من الرسائل المحفوظة", callback_data="posting_mode:send")
+        else:
+            mode_button = InlineKeyboardButton("✉️ الوضع: إرسال مباشر", callback_data="posting_mode:forward")
+
+        keyboard = [
+            [mode_button],
+            [InlineKeyboardButton("✅ تأكيد", callback_data="confirm_posting")],
+            [InlineKeyboardButton("❌ إلغاء", callback_data="cancel")]
+        ]
+        return InlineKeyboardMarkup(keyboard)
+
+    async def handle_posting_mode(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle posting mode toggle on the confirmation message"""
+        try:
+            query = update.callback_query
+            await query.answer()
+
+            # Store posting mode in context
+            context.user_data['posting_mode'] = query.data.split(':')[1]
+
+            # Update keyboard only
+            await query.edit_message_reply_markup(reply_markup=self.build_confirmation_keyboard(context))
+
+            return self.CONFIRM_POSTING
+        except Exception as e:
+            self.logger.error(f"Error in handle_posting_mode: {str(e)}")
+            return self.CONFIRM_POSTING
+
     async def handle_confirm_posting(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle posting confirmation"""
         try:
@@ -680,6 +703,8 @@ class PostingHandlers:
             timing = context.user_data.get('timing', 'now')
             exact_time = context.user_data.get('exact_time', None)
             delay_seconds = context.user_data.get('delay_seconds', 0)
+            posting_mode = context.user_data.get('posting_mode', 'send')
+            exact_time_dt = datetime.strptime(exact_time, "%Y-%m-%d %H:%M") if timing == "exact" and exact_time else None
 
             # تصحيح: تحويل معرفات المجموعات إلى قائمة
             group_ids = [group.get('group_id') for group in selected_groups]
@@ -695,7 +720,8 @@ class PostingHandlers:
                 message=message,
                 exact_time=exact_time_dt if timing == "exact" else None, # Pass datetime object or None
                 delay_seconds=delay_seconds if timing == "delay" else None,
-                is_recurring=is_recurring
+                is_recurring=is_recurring,
+                posting_mode=posting_mode
             )
             result_message = "تم بدء النشر بنجاح." if success else "فشل بدء النشر."
             if success:
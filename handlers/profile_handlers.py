@@ -1,6 +1,7 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext, CommandHandler, CallbackQueryHandler
 from utils.decorators import subscription_required
+from utils.request_context import get_request_context
 from datetime import datetime
 
 class ProfileHandlers:
@@ -25,15 +26,9 @@ class ProfileHandlers:
         user_id = user.id
         chat_id = update.effective_chat.id
         
-        # Get user from database
-        db_user = self.subscription_service.get_user(user_id)
-        if not db_user:
-            db_user = self.subscription_service.create_user(
-                user_id,
-                user.username,
-                user.first_name,
-                user.last_name
-            )
+        # Get (or create) the user from the per-update request context
+        request_context = await get_request_context(update, context)
+        db_user = request_context.db_user if request_context else None
         
         # Check if admin
         is_admin = db_user and db_user.is_admin
@@ -97,7 +97,7 @@ class ReferralHandlers:
             created_at = referral.get('created_at', datetime.now()).strftime('%Y-%m-%d')
             
             # Get user info
-            user = self.subscription_service.get_user(referred_id)
+            user = await self.subscription_service.get_user_async(referred_id)
             username = f"@{user.username}" if user and user.username else "غير معروف"
             name = f"{user.first_name} {user.last_name or ''}" if user and user.first_name else "غير معروف"
             
@@ -222,7 +222,7 @@ class ReferralHandlers:
                 reward_given = referral.get('reward_given', False)
                 
                 # Get user info
-                user = self.subscription_service.get_user(referred_id)
+                user = await self.subscription_service.get_user_async(referred_id)
                 username = f"@{user.username}" if user and user.username else "غير معروف"
                 
                 status = "✅ مشترك" if is_subscribed else "⏳ غير مشترك"
@@ -264,7 +264,7 @@ class ReferralHandlers:
             user_id = user.id
 
             # Need SubscriptionService instance (already available as self.subscription_service)
-            db_user = self.subscription_service.get_user(user_id)
+            db_user = await self.subscription_service.get_user_async(user_id)
             if not db_user:
                  await query.edit_message_text("حدث خطأ. يرجى المحاولة مرة أخرى باستخدام /start")
                  return
@@ -7,7 +7,8 @@ from telethon import TelegramClient
 from telethon.sessions import StringSession
 from telethon.errors import SessionPasswordNeededError, PhoneCodeInvalidError
 from config.config import API_ID, API_HASH # Import global API_ID and API_HASH
-from database.db_mongodb import Database
+from database import Database
+from database.async_db import async_db
 from utils.channel_subscription import channel_subscription
 
 # Define conversation states
@@ -56,7 +57,7 @@ class SessionHandlers:
         # if not channel_subscription(user_id):
         from services.subscription_service import SubscriptionService # Import locally if needed
         sub_service = SubscriptionService()
-        db_user = sub_service.get_user(user_id)
+        db_user = await sub_service.get_user_async(user_id)
         if not db_user or not db_user.has_active_subscription():
             await update.message.reply_text(
                 "⚠️ ليس لديك اشتراك نشط. يرجى الاشتراك أولاً."
@@ -64,7 +65,7 @@ class SessionHandlers:
             return ConversationHandler.END
 
         # Check if user already has a session
-        user_doc = self.users_collection.find_one({"user_id": user_id})
+        user_doc = await async_db.collection(self.users_collection).find_one({"user_id": user_id})
         if user_doc and user_doc.get("session_string") and user_doc.get("api_id") and user_doc.get("api_hash"):
             # Create keyboard with confirmation buttons
             keyboard = [
@@ -208,7 +209,7 @@ class SessionHandlers:
             await client.disconnect()
 
             # FIX: Update user in database with session_string, api_id, and api_hash
-            self.users_collection.update_one(
+            await async_db.collection(self.users_collection).update_one(
                 {"user_id": user.id},
                 {"$set": {
                     "session_string": session_string,
@@ -293,7 +294,7 @@ class SessionHandlers:
             await client.disconnect()
 
             # FIX: Update user in database with session_string, api_id, and api_hash
-            self.users_collection.update_one(
+            await async_db.collection(self.users_collection).update_one(
                 {"user_id": user.id},
                 {"$set": {
                     "session_string": session_string,
@@ -5,6 +5,7 @@ import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext, CommandHandler, CallbackQueryHandler
 from services.subscription_service import SubscriptionService
+from utils.request_context import get_request_context
 from config.config import ADMIN_USER_ID # Import ADMIN_USER_ID
 
 # Optional imports (Keep original structure)
@@ -80,18 +81,18 @@ class StartHelpHandlers:
         user_id = user.id
 
         # Get or create user in database
-        db_user = self.subscription_service.get_user(user_id)
+        db_user = await self.subscription_service.get_user_async(user_id)
         is_new_user = False # Flag to check if user is new
         if not db_user:
             is_new_user = True # Mark as new user
-            db_user = self.subscription_service.create_user(
+            db_user = await self.subscription_service.create_user_async(
                 user_id,
                 user.username,
                 user.first_name,
                 user.last_name
             )
             # Refetch user data after creation
-            db_user = self.subscription_service.get_user(user_id)
+            db_user = await self.subscription_service.get_user_async(user_id)
         # Check if admin
         is_admin = db_user and db_user.is_admin
 
@@ -232,10 +233,11 @@ class StartHelpHandlers:
         user_id = update.effective_user.id
         data = query.data
 
-        # Get user from database
-        db_user = self.subscription_service.get_user(user_id)
-        is_admin = db_user and db_user.is_admin
-        has_subscription = db_user and db_user.has_active_subscription()
+        # Get user from the per-update request context
+        request_context = await get_request_context(update, context)
+        db_user = request_context.db_user if request_context else None
+        is_admin = request_context and request_context.is_admin
+        has_subscription = request_context and request_context.has_active_subscription
 
         # --- Helper function to display referral info (NEW) --- 
         async def display_referral_info(update: Update, context: CallbackContext, back_callback: str):
@@ -273,7 +275,6 @@ class StartHelpHandlers:
         if data == "start_trial":
             # Handle trial request
             user_id = update.effective_user.id
-            db_user = self.subscription_service.get_user(user_id)
             trial_claimed = db_user.trial_claimed if hasattr(db_user, 'trial_claimed') else False
             has_subscription = db_user.has_active_subscription()
 
@@ -286,13 +287,10 @@ class StartHelpHandlers:
             elif not trial_claimed:
                 # Grant 1-day free trial, attributed to admin
                 logger.info(f"Attempting to grant free trial via button for user: {user_id}, attributed to admin: {ADMIN_USER_ID}") # Use logger
-                trial_success = self.subscription_service.add_subscription(user_id, days=1, added_by=ADMIN_USER_ID) # Use ADMIN_USER_ID
+                trial_success = await self.subscription_service.add_subscription_async(user_id, days=1, added_by=ADMIN_USER_ID) # Use ADMIN_USER_ID
                 if trial_success:
                     # Mark trial as claimed
-                    update_result = self.subscription_service.users_collection.update_one(
-                        {"user_id": user_id},
-                        {"$set": {"trial_claimed": 1}}
-                    ) # <-- Added missing parenthesis
+                    update_result = self.subscription_service.mark_trial_claimed(user_id)
                     # Check the boolean result from the SQLite wrapper
                     if update_result: # <-- Correct placement and indentation
                         logger.info(f"Successfully granted and marked trial claimed via button for user: {user_id}") # <-- Correct indentation
@@ -590,7 +588,7 @@ class StartHelpHandlers:
             else:
                 # إذا لم يكن معالج المجموعات متاحاً، عرض قائمة المجموعات
                 user_id = update.effective_user.id
-                groups = self.group_service.get_user_groups(user_id)
+                groups = await self.group_service.get_user_groups_async(user_id)
 
                 if not groups:
                     keyboard = [[InlineKeyboardButton("🔄 تحديث المجموعات", callback_data="start_refresh_groups")],
@@ -842,9 +840,7 @@ class StartHelpHandlers:
             # Regenerate the main menu using query.edit_message_text
             user = update.effective_user
             user_id = user.id
-            db_user = self.subscription_service.get_user(user_id)
-            is_admin = db_user and db_user.is_admin
-            has_subscription = db_user and db_user.has_active_subscription()
+            # db_user, is_admin and has_subscription come from the request context read above
 
             # Welcome message
             welcome_text = f"👋 مرحباً {user.first_name}!\n\n"
@@ -1063,7 +1059,7 @@ class StartHelpHandlers:
             user_id = user.id
 
             # Get user data (reuse existing logic if possible, otherwise fetch again)
-            db_user = self.subscription_service.get_user(user_id)
+            db_user = await self.subscription_service.get_user_async(user_id)
             # Ensure db_user exists, handle potential None case if needed
             if not db_user:
                  # Handle case where user might not exist unexpectedly
@@ -5,6 +5,7 @@ from services.posting_service import PostingService
 from config.config import ADMIN_USER_ID
 from utils.decorators import admin_only
 from utils.channel_subscription import channel_subscription, auto_channel_subscription_required
+from utils.request_context import get_request_context
 import re
 import logging
 import sqlite3
@@ -262,12 +263,12 @@ class SubscriptionHandlers:
                 return
 
             # Get or create user
-            user = self.subscription_service.get_user(user_id)
+            user = await self.subscription_service.get_user_async(user_id)
             if not user:
-                user = self.subscription_service.create_user(user_id)
+                user = await self.subscription_service.create_user_async(user_id)
 
             # Add subscription
-            success = self.subscription_service.add_subscription(user_id, days, added_by=update.effective_user.id)
+            success = await self.subscription_service.add_subscription_async(user_id, days, added_by=update.effective_user.id)
 
             if success:
                 end_date = self.subscription_service.get_subscription_end_date(user_id)
@@ -537,7 +538,7 @@ class SubscriptionHandlers:
             user_id = int(context.args[0])
 
             # Get user
-            user = self.subscription_service.get_user(user_id)
+            user = await self.subscription_service.get_user_async(user_id)
             if not user:
                 await context.bot.send_message(
                     chat_id=chat_id,
@@ -547,7 +548,7 @@ class SubscriptionHandlers:
 
             # Remove subscription
             user.subscription_end = None
-            self.subscription_service.save_user(user)
+            await self.subscription_service.save_user_async(user)
 
             await context.bot.send_message(
                 chat_id=chat_id,
@@ -592,7 +593,7 @@ class SubscriptionHandlers:
             user_id = int(context.args[0])
 
             # Get user
-            user = self.subscription_service.get_user(user_id)
+            user = await self.subscription_service.get_user_async(user_id)
             if not user:
                 await context.bot.send_message(
                     chat_id=chat_id,
@@ -682,7 +683,7 @@ class SubscriptionHandlers:
 
         try:
             # Get all users with active subscriptions
-            users = self.subscription_service.get_all_active_users()
+            users = await self.subscription_service.get_all_active_users_async()
 
             if not users:
                 await context.bot.send_message(
@@ -719,15 +720,9 @@ class SubscriptionHandlers:
         user = update.effective_user
 
         try:
-            # Get user
-            db_user = self.subscription_service.get_user(user_id)
-            if not db_user:
-                db_user = self.subscription_service.create_user(
-                    user_id,
-                    user.username,
-                    user.first_name,
-                    user.last_name
-                )
+            # Get (or create) the user from the per-update request context
+            request_context = await get_request_context(update, context)
+            db_user = request_context.db_user if request_context else None
 
             # Check subscription
             has_subscription = db_user.has_active_subscription()
@@ -107,7 +107,19 @@ class PostingPersistenceManager:
                 # حفظ التغييرات
                 conn.commit()
                 conn.close()
-            
+
+            # تحديث سجل مهام النشر (posting_tasks.sqlite)
+            journal_path = os.path.join(self.data_dir, 'posting_tasks.sqlite')
+            if os.path.exists(journal_path):
+                try:
+                    from services.task_journal import TaskJournal
+                    journal = TaskJournal(journal_path)
+                    stopped_count = journal.stop_running_tasks()
+                    journal.close()
+                    logger.info(f"Stopped {stopped_count} active tasks in task journal")
+                except Exception as e:
+                    logger.error(f"Error updating task journal: {str(e)}")
+
             # تنظيف ملف النسخ الاحتياطي
             backup_file = os.path.join('services', 'active_tasks.json')
             if os.path.exists(backup_file):
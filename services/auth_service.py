@@ -7,8 +7,9 @@ from datetime import datetime, timedelta
 import socks
 import re
 import time
-from database.db_mongodb import Database
+from database import Database
 from config.config import API_ID, API_HASH # Import default API credentials
+from services.client_pool import client_pool
 
 class AuthService:
     def __init__(self):
@@ -378,6 +379,18 @@ class AuthService:
     async def check_session_validity(self, session_string, proxy=None):
         """Check if a session string is still valid"""
         client = None
+        if not proxy:
+            # Without a proxy, borrow the shared pooled client instead of a fresh handshake
+            async def get_me(pooled_client):
+                if pooled_client is None:
+                    return False, None
+                return True, await pooled_client.get_me()
+            
+            try:
+                return await client_pool.run(session_string, API_ID, API_HASH, get_me)
+            except Exception as e:
+                self.logger.error(f"Error checking session validity: {str(e)}")
+                return False, None
         try:
             # Use default API_ID and API_HASH as required by Telethon
             if proxy:
@@ -0,0 +1,348 @@
+import asyncio
+import hashlib
+import inspect
+import logging
+import threading
+import time
+
+# تكوين التسجيل
+logger = logging.getLogger(__name__)
+
+
+class _PooledClient:
+    """عميل Telethon مشترك مع عداد المراجع ووقت آخر استخدام وآخر فحص صحة"""
+
+    def __init__(self, key, loop):
+        self.key = key
+        # حلقة المالك: جميع استدعاءات العميل تتم عليها
+        self.loop = loop
+        self.client = None
+        self.refcount = 0
+        self.last_used = time.monotonic()
+        self.last_checked = 0.0
+        # True بعد فشل فحص الصحة: أُزيل من المجمع ويُقطع اتصاله عند إرجاع آخر مستعير
+        self.stale = False
+        # مستقبل يكتمل عند انتهاء الاتصال الأول (True إذا كانت الجلسة مصرحاً لها)
+        self.ready = loop.create_future()
+
+
+class TelegramClientPool:
+    """مجمع عملاء TelegramClient مفتاحه سلسلة الجلسة، يشارك اتصال MTProto واحداً لكل حساب
+    بين النشر والردود التلقائية وجلب المجموعات والتحقق من الجلسة.
+
+    عملاء Telethon مرتبطون بحلقة الأحداث التي أنشئوا عليها، لذلك لكل حساب حلقة مالك واحدة:
+    حلقة من محرك النشر يختارها loop_resolver (مثبتة حسب crc32 لمفتاح الجلسة)، أو حلقة خاصة بالمجمع.
+    الخدمات التي تعمل على حلقات أخرى تنفذ استدعاءاتها على حلقة المالك عبر run_coroutine_threadsafe:
+    run() لاستعارة العميل وتنفيذ روتين عليه، وcall() لاستدعاء دالة على عميل مستعار بـ acquire()."""
+
+    def __init__(self, idle_timeout=300, health_check_interval=60, sweep_interval=60):
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.sweep_interval = sweep_interval
+        self._entries = {}      # {session_key: _PooledClient}
+        self._by_client = {}    # {id(client): _PooledClient}
+        self._sweepers = {}     # {loop_id: asyncio.Task}
+        self._lock = threading.Lock()
+        # دالة (session_key) -> حلقة المالك؛ يضبطها PostingService على حلقات محرك النشر
+        self.loop_resolver = None
+        self._own_loop = None
+        # مصنع العملاء (يمكن استبداله في الاختبارات والقياسات)
+        self.client_factory = None
+
+    @staticmethod
+    def _make_key(session_string):
+        return hashlib.sha256(session_string.encode("utf-8")).hexdigest()
+
+    def _create_client(self, session_string, api_id, api_hash):
+        if self.client_factory is not None:
+            return self.client_factory(session_string, api_id, api_hash)
+
+        from telethon import TelegramClient
+        from telethon.sessions import StringSession
+
+        if not api_id or not api_hash:
+            from config.config import API_ID, API_HASH
+            api_id, api_hash = API_ID, API_HASH
+        return TelegramClient(StringSession(session_string), api_id, api_hash)
+
+    def _get_own_loop(self):
+        """حلقة المجمع الخاصة (تعمل في خيط daemon) للحسابات التي لا يحددها loop_resolver"""
+        with self._lock:
+            if self._own_loop is None or self._own_loop.is_closed():
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                threading.Thread(target=run, name="telegram-client-pool", daemon=True).start()
+                ready.wait()
+                self._own_loop = loop
+            return self._own_loop
+
+    def owner_loop(self, session_string):
+        """حلقة المالك لحساب: حلقة عميله الحالي، أو حلقة loop_resolver، أو حلقة المجمع الخاصة"""
+        key = self._make_key(session_string)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not entry.loop.is_closed():
+                return entry.loop
+        if self.loop_resolver is not None:
+            try:
+                loop = self.loop_resolver(key)
+            except Exception as e:
+                logger.error(f"خطأ في اختيار حلقة المالك من محرك النشر: {str(e)}")
+                loop = None
+            if loop is not None and not loop.is_closed():
+                return loop
+        return self._get_own_loop()
+
+    @staticmethod
+    async def _on_loop(loop, coro):
+        """تنفيذ روتين على حلقة أخرى وانتظار نتيجته من الحلقة الحالية"""
+        if loop is asyncio.get_running_loop():
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    async def run_on_owner(self, session_string, coro):
+        """تنفيذ روتين على حلقة المالك للحساب (مباشرة إذا كانت هي الحلقة الحالية)"""
+        return await self._on_loop(self.owner_loop(session_string), coro)
+
+    async def run(self, session_string, api_id, api_hash, func):
+        """استعارة عميل الحساب على حلقة المالك وتنفيذ func(client) عليها وإرجاع نتيجتها.
+        تُمرر None إلى func إذا كانت الجلسة غير مصرح لها."""
+        async def borrowed():
+            client = await self._acquire_local(session_string, api_id, api_hash)
+            try:
+                return await func(client)
+            finally:
+                if client is not None:
+                    await self._release_local(client)
+
+        return await self.run_on_owner(session_string, borrowed())
+
+    async def call(self, client, func, *args, **kwargs):
+        """استدعاء func(*args, **kwargs) على حلقة المالك لعميل مستعار (تُنتظر النتيجة إذا كانت قابلة للانتظار)"""
+        with self._lock:
+            entry = self._by_client.get(id(client))
+
+        async def invoke():
+            result = func(*args, **kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+
+        if entry is None:
+            return await invoke()
+        return await self._on_loop(entry.loop, invoke())
+
+    async def acquire(self, session_string, api_id=None, api_hash=None):
+        """استعارة عميل متصل ومصرح له للجلسة المحددة.
+        يُرجع None إذا كانت الجلسة غير مصرح لها. يجب استدعاء release بعد الانتهاء.
+        إذا لم تكن الحلقة الحالية حلقة المالك فيجب تنفيذ استدعاءات العميل عبر call()."""
+        return await self.run_on_owner(session_string, self._acquire_local(session_string, api_id, api_hash))
+
+    async def _acquire_local(self, session_string, api_id, api_hash):
+        loop = asyncio.get_running_loop()
+        key = self._make_key(session_string)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            redirect = None
+            if entry is not None and entry.loop is not loop:
+                if entry.loop.is_closed():
+                    # حلقة المالك أُغلقت (مثلاً بعد إيقاف المحرك)، إنشاء عميل جديد على هذه الحلقة
+                    del self._entries[key]
+                    entry = None
+                else:
+                    redirect = entry.loop
+            if redirect is None:
+                is_creator = entry is None
+                if is_creator:
+                    entry = _PooledClient(key, loop)
+                    self._entries[key] = entry
+                entry.refcount += 1
+                entry.last_used = time.monotonic()
+
+        if redirect is not None:
+            return await self._on_loop(redirect, self._acquire_local(session_string, api_id, api_hash))
+
+        self._ensure_sweeper(loop)
+
+        if is_creator:
+            try:
+                authorized = await self._open(entry, session_string, api_id, api_hash)
+            except BaseException as e:
+                self._remove(entry)
+                if not entry.ready.done():
+                    entry.ready.set_exception(e)
+                    # تجنب تحذير "Future exception was never retrieved" عند عدم وجود منتظرين
+                    entry.ready.exception()
+                raise
+            entry.ready.set_result(authorized)
+        else:
+            try:
+                authorized = await asyncio.shield(entry.ready)
+            except BaseException:
+                await self._decref(entry)
+                raise
+            if authorized:
+                authorized = await self._check_health(entry)
+
+        if not authorized:
+            await self._decref(entry)
+            return None
+        return entry.client
+
+    async def _open(self, entry, session_string, api_id, api_hash):
+        """إنشاء العميل والاتصال والتحقق من التصريح (مرة واحدة لكل إدخال)"""
+        client = self._create_client(session_string, api_id, api_hash)
+        entry.client = client
+        try:
+            await client.connect()
+            authorized = await client.is_user_authorized()
+        except BaseException:
+            # إغلاق أي اتصال جزئي قبل نشر الخطأ
+            await self._disconnect(client)
+            raise
+        entry.last_checked = time.monotonic()
+
+        if not authorized:
+            logger.warning("جلسة غير مصرح لها في مجمع العملاء، سيتم قطع الاتصال")
+            self._remove(entry)
+            await self._disconnect(client)
+            return False
+
+        with self._lock:
+            self._by_client[id(client)] = entry
+        logger.info("تم فتح اتصال جديد في مجمع عملاء تيليجرام")
+        return True
+
+    async def _check_health(self, entry):
+        """فحص صحة العميل المشترك وإعادة الاتصال في مكانه عند الحاجة.
+        عند الفشل يُعلَّم الإدخال كقديم ويُزال من المجمع دون قطع اتصال المستعيرين الحاليين."""
+        client = entry.client
+        now = time.monotonic()
+        if entry.stale:
+            return False
+        if client.is_connected() and now - entry.last_checked < self.health_check_interval:
+            return True
+
+        try:
+            if not client.is_connected():
+                logger.info("إعادة اتصال عميل مشترك في المجمع")
+                await client.connect()
+            authorized = await client.is_user_authorized()
+        except Exception as e:
+            logger.error(f"فشل فحص صحة عميل مشترك: {str(e)}")
+            authorized = False
+
+        entry.last_checked = time.monotonic()
+        if not authorized:
+            # المستعير التالي ينشئ عميلاً جديداً؛ القديم يُقطع عند إرجاع آخر مستعير له
+            entry.stale = True
+            with self._lock:
+                if self._entries.get(entry.key) is entry:
+                    del self._entries[entry.key]
+        return authorized
+
+    async def release(self, client):
+        """إرجاع عميل مستعار إلى المجمع (لا يتم قطع الاتصال حتى انتهاء مهلة الخمول)"""
+        if client is None:
+            return
+        with self._lock:
+            entry = self._by_client.get(id(client))
+        if entry is None:
+            logger.warning("محاولة إرجاع عميل غير موجود في المجمع")
+            return
+        await self._on_loop(entry.loop, self._release_local(client))
+
+    async def _release_local(self, client):
+        with self._lock:
+            entry = self._by_client.get(id(client))
+        if entry is not None:
+            await self._decref(entry)
+
+    async def _decref(self, entry):
+        with self._lock:
+            entry.refcount = max(0, entry.refcount - 1)
+            entry.last_used = time.monotonic()
+            close = entry.stale and entry.refcount == 0
+            if close and entry.client is not None:
+                self._by_client.pop(id(entry.client), None)
+        if close and entry.client is not None:
+            await self._disconnect(entry.client)
+
+    def _remove(self, entry):
+        """إزالة الإدخال من المجمع (المتصل مسؤول عن قطع الاتصال)"""
+        with self._lock:
+            if self._entries.get(entry.key) is entry:
+                del self._entries[entry.key]
+            if entry.client is not None:
+                self._by_client.pop(id(entry.client), None)
+
+    async def _disconnect(self, client):
+        try:
+            await client.disconnect()
+        except Exception as e:
+            logger.error(f"خطأ أثناء قطع اتصال عميل من المجمع: {str(e)}")
+
+    def _ensure_sweeper(self, loop):
+        """تشغيل مهمة إخلاء العملاء الخاملين لحلقة الأحداث الحالية (مرة واحدة لكل حلقة)"""
+        loop_id = id(loop)
+        with self._lock:
+            sweeper = self._sweepers.get(loop_id)
+            if sweeper is not None and not sweeper.done():
+                return
+            self._sweepers[loop_id] = loop.create_task(self._sweep_loop(loop))
+
+    async def _sweep_loop(self, loop):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            await self.evict_idle(loop)
+
+    async def evict_idle(self, loop=None):
+        """قطع اتصال العملاء غير المستخدمين الذين تجاوزوا مهلة الخمول على حلقة الأحداث المحددة"""
+        loop = loop or asyncio.get_running_loop()
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                entry for entry in self._entries.values()
+                if entry.loop is loop and entry.refcount == 0
+                and entry.ready.done() and now - entry.last_used >= self.idle_timeout
+            ]
+        for entry in idle:
+            self._remove(entry)
+            await self._disconnect(entry.client)
+        if idle:
+            logger.info(f"تم إخلاء {len(idle)} عميل خامل من مجمع العملاء")
+        return len(idle)
+
+    async def close_loop_clients(self):
+        """قطع اتصال جميع عملاء حلقة الأحداث الحالية (قبل إغلاق الحلقة)"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entries = [entry for entry in self._entries.values() if entry.loop is loop]
+            sweeper = self._sweepers.pop(id(loop), None)
+        if sweeper is not None:
+            sweeper.cancel()
+        for entry in entries:
+            self._remove(entry)
+            if entry.client is not None:
+                await self._disconnect(entry.client)
+
+    def get_stats(self):
+        """إحصائيات المجمع للمراقبة"""
+        with self._lock:
+            entries = list(self._entries.values())
+        return {
+            "clients": len(entries),
+            "in_use": sum(1 for entry in entries if entry.refcount > 0),
+            "references": sum(entry.refcount for entry in entries),
+        }
+
+
+# مجمع واحد مشترك بين جميع الخدمات
+client_pool = TelegramClientPool()
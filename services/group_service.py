@@ -5,8 +5,11 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import logging
-from database.db_mongodb import Database
+from database import Database
+from database.async_db import async_db
 from config.config import API_ID, API_HASH # Import default API credentials
+from services.client_pool import client_pool
+from services.peer_cache import peer_cache, peer_from_entity
 import datetime
 
 # Configure logging
@@ -33,6 +36,22 @@ class GroupService:
         """Alias for get_active_groups to maintain compatibility"""
         return self.get_active_groups(user_id)
 
+    # Awaitable variants for handlers on the bot's event loop (run on the database executor)
+    async def get_user_groups_async(self, user_id):
+        return await async_db.run(self.get_user_groups, user_id)
+
+    async def get_user_active_groups_async(self, user_id):
+        return await async_db.run(self.get_active_groups, user_id)
+
+    async def toggle_group_blacklist_async(self, user_id, group_id):
+        return await async_db.run(self.toggle_group_blacklist, user_id, group_id)
+
+    async def select_all_groups_async(self, user_id):
+        return await async_db.run(self.select_all_groups, user_id)
+
+    async def deselect_all_groups_async(self, user_id):
+        return await async_db.run(self.deselect_all_groups, user_id)
+
     def get_blacklisted_groups(self, user_id):
         """Get blacklisted groups for a user"""
         return list(self.groups_collection.find({
@@ -40,18 +59,22 @@ class GroupService:
             'blacklisted': True
         }))
 
-    def add_group(self, user_id, group_id, title, username=None, description=None, member_count=0):
-        """Add or update a group"""
+    def add_group(self, user_id, group_id, title, username=None, description=None, member_count=0, peer=None):
+        """Add or update a group (peer: optional cached InputPeer record, see services.peer_cache)"""
         try:
+            group_fields = {
+                'title': title,
+                'username': username,
+                'description': description,
+                'member_count': member_count
+            }
+            if peer:
+                group_fields.update(peer)
+
             # تحديث أو إضافة المجموعة - بدون استخدام refresh_timestamp
             result = self.groups_collection.update_one(
                 {'user_id': user_id, 'group_id': group_id},
-                {'$set': {
-                    'title': title,
-                    'username': username,
-                    'description': description,
-                    'member_count': member_count
-                }},
+                {'$set': group_fields},
                 upsert=True
             )
             return True
@@ -59,6 +82,75 @@ class GroupService:
             logger.error(f"Error adding group: {str(e)}")
             return False
 
+    def add_groups(self, user_id, groups):
+        """
+        Add or update many groups in one bulk write (one commit instead of one per group)
+
+        Args:
+            user_id: The user ID
+            groups: List of dicts with group_id, title and optional username, description, member_count, peer
+
+        Returns:
+            True if the batch was written, False otherwise
+        """
+        try:
+            operations = []
+            for group in groups:
+                group_fields = {
+                    'title': group['title'],
+                    'username': group.get('username'),
+                    'description': group.get('description'),
+                    'member_count': group.get('member_count', 0)
+                }
+                if group.get('peer'):
+                    group_fields.update(group['peer'])
+                operations.append({'update_one': {
+                    'filter': {'user_id': user_id, 'group_id': group['group_id']},
+                    'update': {'$set': group_fields},
+                    'upsert': True
+                }})
+
+            return self.groups_collection.bulk_write(operations) is not None
+        except Exception as e:
+            logger.error(f"Error adding groups: {str(e)}")
+            return False
+
+    def get_group_peers(self, user_id):
+        """Get cached InputPeer records for a user's groups as {group_id: record}"""
+        peers = {}
+        for group in self.groups_collection.find({'user_id': user_id}):
+            if group.get('peer_type') and group.get('peer_id') is not None:
+                peers[str(group['group_id'])] = {
+                    'peer_type': group['peer_type'],
+                    'peer_id': group['peer_id'],
+                    'access_hash': group.get('access_hash')
+                }
+        return peers
+
+    def save_group_peer(self, user_id, group_id, peer):
+        """Store a resolved InputPeer record alongside an existing group row"""
+        try:
+            self.groups_collection.update_one(
+                {'user_id': user_id, 'group_id': group_id},
+                {'$set': peer}
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Error saving group peer: {str(e)}")
+            return False
+
+    def invalidate_group_peer(self, user_id, group_id):
+        """Clear a group's cached InputPeer record so it is resolved again"""
+        try:
+            self.groups_collection.update_one(
+                {'user_id': user_id, 'group_id': group_id},
+                {'$set': {'peer_type': None, 'peer_id': None, 'access_hash': None}}
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Error invalidating group peer: {str(e)}")
+            return False
+
     def blacklist_group(self, user_id, group_id):
         """Add a group to blacklist"""
         try:
@@ -129,13 +221,11 @@ class GroupService:
     def select_all_groups(self, user_id):
         """Select all groups (remove from blacklist)"""
         try:
-            # Fix: Since CollectionWrapper doesn't have update_many, we need to update each group individually
-            groups = self.groups_collection.find({'user_id': user_id})
-            for group in groups:
-                self.groups_collection.update_one(
-                    {'_id': group['_id']},  # استخدام _id بدلاً من id
-                    {'$set': {'blacklisted': False}}
-                )
+            # One UPDATE for all of the user's groups instead of one statement + commit per group
+            self.groups_collection.update_many(
+                {'user_id': user_id},
+                {'$set': {'blacklisted': False}}
+            )
             return True
         except Exception as e:
             logger.error(f"Error in select_all_groups: {str(e)}")
@@ -144,13 +234,11 @@ class GroupService:
     def deselect_all_groups(self, user_id):
         """Deselect all groups (add to blacklist)"""
         try:
-            # Fix: Since CollectionWrapper doesn't have update_many, we need to update each group individually
-            groups = self.groups_collection.find({'user_id': user_id})
-            for group in groups:
-                self.groups_collection.update_one(
-                    {'_id': group['_id']},  # استخدام _id بدلاً من id
-                    {'$set': {'blacklisted': True}}
-                )
+            # One UPDATE for all of the user's groups instead of one statement + commit per group
+            self.groups_collection.update_many(
+                {'user_id': user_id},
+                {'$set': {'blacklisted': True}}
+            )
             return True
         except Exception as e:
             logger.error(f"Error in deselect_all_groups: {str(e)}")
@@ -215,7 +303,7 @@ class GroupService:
         """
         try:
             # Get the user's session from the database
-            from database.db_mongodb import Database
+            from database import Database
             db = Database()
 
             # Fix: Consistently use the 'users' collection for session data
@@ -229,9 +317,7 @@ class GroupService:
                 logger.error(f"Session data not found for user_id={user_id} in users collection.")
                 return False, "لم يتم العثور على جلسة للمستخدم. يرجى تسجيل الدخول أولاً.", None
 
-            # Import Telegram client
-            from telethon.sync import TelegramClient
-            from telethon.sessions import StringSession
+            # Import Telegram types
             from telethon.tl.types import Channel, Chat
 
             # Get API credentials and session string from user_data
@@ -245,25 +331,25 @@ class GroupService:
             if not session_string:
                 return False, "لم يتم العثور على جلسة للمستخدم. يرجى تسجيل الدخول أولاً.", None
 
-            # Use default API_ID and API_HASH as required by Telethon
-            client = TelegramClient(StringSession(session_string), API_ID, API_HASH)
+            # Get dialogs (chats and groups) with the account's shared client, on the pool loop that owns it
+            # (default API_ID and API_HASH as required by Telethon)
+            async def get_dialogs(client):
+                if client is None:
+                    return None
+                return await client.get_dialogs()
 
-            # Connect to Telegram
-            await client.connect()
+            dialogs = await client_pool.run(session_string, API_ID, API_HASH, get_dialogs)
 
-            if not await client.is_user_authorized():
-                await client.disconnect()
+            if dialogs is None:
                 return False, "انتهت صلاحية الجلسة. يرجى تسجيل الدخول مرة أخرى.", None
 
             # حذف جميع المجموعات القديمة للمستخدم قبل إضافة المجموعات الجديدة
             # استخدام الحذف المباشر من قاعدة البيانات
             self.clean_database_groups(user_id)
-            
-            # Get dialogs (chats and groups)
-            dialogs = await client.get_dialogs()
 
             # Filter for groups only (not channels)
             groups = []
+            group_rows = []
             for dialog in dialogs:
                 # Check if it's a group (not a channel)
                 # In Telethon, Chat is a group, Channel can be either a channel or a supergroup
@@ -285,15 +371,19 @@ class GroupService:
                     }
                     groups.append(group_data)
 
-                    # Save to database without refresh timestamp
-                    self.add_group(
-                        user_id=user_id,
-                        group_id=group_data['id'],
-                        title=group_data['title']
-                    )
+                    # Saved below in one batch, with the peer for the posting loop
+                    group_rows.append({
+                        'group_id': group_data['id'],
+                        'title': group_data['title'],
+                        'peer': peer_from_entity(entity)
+                    })
+
+            # Save all groups to database in one bulk write (without refresh timestamp)
+            if group_rows and not self.add_groups(user_id, group_rows):
+                return False, "حدث خطأ أثناء حفظ المجموعات", None
 
-            # Disconnect
-            await client.disconnect()
+            # Reload the posting loop's in-memory peers from the refreshed rows
+            peer_cache.forget_user(user_id)
 
             if groups:
                 return True, f"تم جلب {len(groups)} مجموعة بنجاح", groups
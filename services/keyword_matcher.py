@@ -0,0 +1,77 @@
+import re
+
+
+def _trie_pattern(node):
+    """Regex for the keywords of a trie node; each branch starts with a distinct character, longer matches first"""
+    branches = []
+    for char in sorted(node):
+        if char == '':
+            continue
+        child = node[char]
+        rest = _trie_pattern(child)
+        if rest is None:
+            branches.append(re.escape(char))
+        elif '' in child:
+            branches.append(re.escape(char) + '(?:' + rest + ')?')
+        else:
+            branches.append(re.escape(char) + rest)
+    if not branches:
+        return None
+    return branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+
+
+class KeywordMatcher:
+    """
+    Classifies a message by keyword categories in one regex pass.
+
+    categories is an ordered list of (category, keywords); a message belongs to the first
+    category that has any of its keywords as a substring (case-insensitive), or to default.
+    The keywords are compiled into one trie-shaped pattern, so the cost per character
+    does not grow with the number of keywords.
+    """
+
+    def __init__(self, categories, default):
+        self.categories = [(category, list(keywords)) for category, keywords in categories]
+        self.default = default
+        self._priority = {}  # keyword -> index of its category
+        trie = {}
+        for priority, (_, keywords) in enumerate(self.categories):
+            for keyword in keywords:
+                keyword = keyword.lower()
+                if not keyword or keyword in self._priority:
+                    continue
+                self._priority[keyword] = priority
+                node = trie
+                for char in keyword:
+                    node = node.setdefault(char, {})
+                node[''] = True
+
+        # The pattern returns the longest keyword at each position; the shorter keywords
+        # that also match there are its prefixes, so resolve each keyword to the best of them
+        self._best = {}
+        for keyword in self._priority:
+            self._best[keyword] = min(
+                self._priority[keyword[:length]]
+                for length in range(1, len(keyword) + 1)
+                if keyword[:length] in self._priority
+            )
+
+        body = _trie_pattern(trie)
+        self._pattern = re.compile(body) if body else None
+
+    def classify(self, message_text):
+        if not self._pattern or not message_text:
+            return self.default
+        message_text = message_text.lower()
+        search = self._pattern.search
+        best = len(self.categories)
+        match = search(message_text)
+        while match is not None:
+            priority = self._best[match.group()]
+            if priority < best:
+                best = priority
+                if best == 0:
+                    break
+            # Resume one character later so overlapping keywords are also seen
+            match = search(message_text, match.start() + 1)
+        return self.categories[best][0] if best < len(self.categories) else self.default
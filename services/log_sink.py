@@ -0,0 +1,131 @@
+"""Buffered writes of append-only log records.
+
+The auto-reply handler logs every reply it sends. Writing each record with insert_one on the
+client's event loop blocks it on SQLite or a MongoDB round trip. BufferedLogSink.write() only
+appends to an in-memory buffer; a background thread writes the buffer with insert_many every
+batch_size records or flush_interval seconds. The buffer is bounded: when it is full, new
+records are dropped and counted instead of growing memory. A batch the database rejects is
+logged and its records are counted as dropped too (stats["failed"] counts the failed flushes).
+
+    from services.log_sink import response_log_sink
+    response_log_sink.write({'user_id': user_id, 'response': response, ...})
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _load_log_sink_settings():
+    """Read the response log settings from config with safe defaults"""
+    try:
+        from config.config import RESPONSE_LOG_BATCH_SIZE, RESPONSE_LOG_FLUSH_MS, RESPONSE_LOG_MAX_BUFFER
+        return RESPONSE_LOG_BATCH_SIZE, RESPONSE_LOG_FLUSH_MS / 1000.0, RESPONSE_LOG_MAX_BUFFER
+    except Exception:
+        return (
+            int(os.getenv("RESPONSE_LOG_BATCH_SIZE", "100")),
+            int(os.getenv("RESPONSE_LOG_FLUSH_MS", "1000")) / 1000.0,
+            int(os.getenv("RESPONSE_LOG_MAX_BUFFER", "10000")),
+        )
+
+
+class BufferedLogSink:
+    def __init__(self, collection_name, batch_size=100, flush_interval=1.0, max_buffer=10000):
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._collection = None
+        self._buffer = []
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.stats = {"written": 0, "dropped": 0, "failed": 0, "flushes": 0}
+
+    def _get_collection(self):
+        # Resolved on the flush thread so the first connection is not made on an event loop
+        if self._collection is None:
+            from database import Database
+            self._collection = Database().get_collection(self.collection_name)
+        return self._collection
+
+    def write(self, record):
+        """Queue a record without waiting for the database; returns False if it was dropped"""
+        with self._condition:
+            if self._closed or len(self._buffer) >= self.max_buffer:
+                self.stats["dropped"] += 1
+                return False
+            self._buffer.append(record)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"log-sink-{self.collection_name}", daemon=True)
+                self._thread.start()
+            if len(self._buffer) == 1 or len(self._buffer) >= self.batch_size:
+                self._condition.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed and not self._buffer:
+                    self._condition.wait()
+                # Wait for a full batch or for the oldest record to reach flush_interval
+                deadline = time.monotonic() + self.flush_interval
+                while not self._closed and len(self._buffer) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def flush(self):
+        """Write everything buffered so far in batches of batch_size"""
+        with self._flush_lock:
+            while True:
+                with self._condition:
+                    batch = self._buffer[:self.batch_size]
+                    del self._buffer[:self.batch_size]
+                if not batch:
+                    return
+                try:
+                    inserted = self._get_collection().insert_many(batch)
+                except Exception as e:
+                    inserted = None
+                    logger.error(f"Error writing {self.collection_name} batch: {str(e)}")
+                with self._condition:
+                    if inserted:
+                        self.stats["written"] += len(batch)
+                    else:
+                        self.stats["dropped"] += len(batch)
+                        self.stats["failed"] += 1
+                    self.stats["flushes"] += 1
+                if not inserted:
+                    logger.error(f"Dropped {len(batch)} {self.collection_name} records: batch write failed "
+                                 f"({self.stats['dropped']} dropped so far)")
+
+    def get_stats(self):
+        with self._condition:
+            return dict(self.stats, buffered=len(self._buffer))
+
+    def close(self, timeout=5.0):
+        """Flush the remaining records and stop the background thread"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        else:
+            self.flush()
+
+
+# Shared sink for the auto-reply logs written by ResponseService
+response_log_sink = BufferedLogSink('response_logs', *_load_log_sink_settings())
+atexit.register(response_log_sink.close)
@@ -0,0 +1,103 @@
+import logging
+import threading
+
+# تكوين التسجيل
+logger = logging.getLogger(__name__)
+
+
+def peer_from_entity(entity):
+    """استخراج سجل قابل للتخزين (النوع، المعرف، access_hash) من كيان Telethon"""
+    from telethon.tl.types import Channel, Chat
+
+    if isinstance(entity, Channel):
+        return {'peer_type': 'channel', 'peer_id': entity.id, 'access_hash': entity.access_hash}
+    if isinstance(entity, Chat):
+        return {'peer_type': 'chat', 'peer_id': entity.id, 'access_hash': None}
+    return None
+
+
+def input_peer_from_record(record):
+    """بناء InputPeer مباشرة من السجل المخزن دون أي طلب RPC"""
+    from telethon.tl.types import InputPeerChannel, InputPeerChat
+
+    peer_type = record.get('peer_type')
+    peer_id = record.get('peer_id')
+    if peer_id is None:
+        return None
+    if peer_type == 'channel' and record.get('access_hash') is not None:
+        return InputPeerChannel(int(peer_id), int(record['access_hash']))
+    if peer_type == 'chat':
+        return InputPeerChat(int(peer_id))
+    return None
+
+
+class PeerCache:
+    """ذاكرة مؤقتة لكل مستخدم تربط group_id بسجل InputPeer.
+    تُحمّل مرة واحدة من صفوف groups (التي يملؤها GroupService.fetch_user_groups)
+    ولا تُبطل إلا عند أخطاء ChannelPrivate/PeerIdInvalid وما شابهها."""
+
+    def __init__(self):
+        self._peers = {}  # {user_id: {group_id: record}}
+        self._lock = threading.Lock()
+        self._group_service = None
+        self._group_service_failed = False
+
+    def _get_group_service(self):
+        if self._group_service is None and not self._group_service_failed:
+            try:
+                from services.group_service import GroupService
+                self._group_service = GroupService()
+            except Exception as e:
+                # العمل بالذاكرة فقط دون تخزين دائم
+                self._group_service_failed = True
+                logger.error(f"تعذر تهيئة GroupService لذاكرة الكيانات: {str(e)}")
+        return self._group_service
+
+    def get_user_peers(self, user_id):
+        """تحميل سجلات المستخدم من قاعدة البيانات عند أول طلب فقط (دالة متزامنة)"""
+        with self._lock:
+            peers = self._peers.get(user_id)
+        if peers is not None:
+            return peers
+
+        loaded = {}
+        group_service = self._get_group_service()
+        if group_service is not None:
+            try:
+                loaded = group_service.get_group_peers(user_id)
+            except Exception as e:
+                logger.error(f"خطأ في تحميل ذاكرة الكيانات للمستخدم {user_id}: {str(e)}")
+
+        with self._lock:
+            return self._peers.setdefault(user_id, loaded)
+
+    def get(self, user_id, group_id):
+        """الحصول على سجل مجموعة من الذاكرة فقط"""
+        with self._lock:
+            return self._peers.get(user_id, {}).get(str(group_id))
+
+    def store(self, user_id, group_id, peer):
+        """حفظ سجل مجموعة في الذاكرة وفي صف groups"""
+        with self._lock:
+            self._peers.setdefault(user_id, {})[str(group_id)] = peer
+        group_service = self._get_group_service()
+        if group_service is not None:
+            group_service.save_group_peer(user_id, str(group_id), peer)
+
+    def invalidate(self, user_id, group_id):
+        """إبطال سجل مجموعة بعد خطأ يدل على أن الكيان لم يعد صالحاً"""
+        with self._lock:
+            self._peers.get(user_id, {}).pop(str(group_id), None)
+        group_service = self._get_group_service()
+        if group_service is not None:
+            group_service.invalidate_group_peer(user_id, str(group_id))
+        logger.info(f"تم إبطال الكيان المخزن للمجموعة {group_id} للمستخدم {user_id}")
+
+    def forget_user(self, user_id):
+        """إسقاط نسخة الذاكرة للمستخدم ليُعاد تحميلها من قاعدة البيانات"""
+        with self._lock:
+            self._peers.pop(user_id, None)
+
+
+# ذاكرة مشتركة بين خدمة النشر وخدمة المجموعات
+peer_cache = PeerCache()
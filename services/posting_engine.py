@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import threading
+import zlib
+
+# تكوين التسجيل
+logger = logging.getLogger(__name__)
+
+
+class PostingEngine:
+    """محرك نشر مشترك: عدد ثابت من حلقات الأحداث تعمل عليها جميع مهام النشر كروتينات مشتركة
+    بدلاً من خيط وحلقة أحداث مستقلة لكل مهمة"""
+
+    def __init__(self, loop_count=1, name="posting-engine"):
+        """تهيئة المحرك دون تشغيل الحلقات (يتم التشغيل عند أول استخدام)"""
+        self.loop_count = max(1, int(loop_count or 1))
+        self.name = name
+        self._loops = []
+        self._threads = []
+        self._lock = threading.Lock()
+        self._started = False
+        # عدد الروتينات المشتركة قيد التشغيل على المحرك
+        self._running_count = 0
+
+    def start(self):
+        """تشغيل حلقات الأحداث في خيوط daemon (مرة واحدة فقط)"""
+        with self._lock:
+            if self._started:
+                return
+
+            for index in range(self.loop_count):
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+                thread = threading.Thread(
+                    target=self._run_loop,
+                    args=(loop, ready),
+                    name=f"{self.name}-{index}",
+                    daemon=True
+                )
+                thread.start()
+                ready.wait()
+                self._loops.append(loop)
+                self._threads.append(thread)
+
+            self._started = True
+            logger.info(f"تم تشغيل محرك النشر المشترك بعدد {self.loop_count} حلقة أحداث")
+
+    def _run_loop(self, loop, ready):
+        """تشغيل حلقة أحداث واحدة حتى يتم إيقافها"""
+        asyncio.set_event_loop(loop)
+        loop.call_soon(ready.set)
+        try:
+            loop.run_forever()
+        finally:
+            try:
+                loop.run_until_complete(loop.shutdown_asyncgens())
+            except Exception as e:
+                logger.error(f"خطأ أثناء إغلاق المولدات غير المتزامنة لحلقة المحرك: {str(e)}")
+            loop.close()
+
+    def loop_for(self, key=None):
+        """اختيار حلقة الأحداث المخصصة لمفتاح (عادةً معرف المستخدم) بشكل ثابت"""
+        self.start()
+        if key is None or len(self._loops) == 1:
+            return self._loops[0]
+        index = zlib.crc32(str(key).encode("utf-8")) % len(self._loops)
+        return self._loops[index]
+
+    def submit(self, coro, key=None):
+        """جدولة روتين مشترك على حلقة المحرك وإرجاع concurrent.futures.Future"""
+        loop = self.loop_for(key)
+        with self._lock:
+            self._running_count += 1
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def call_soon(self, callback, *args, key=None):
+        """تنفيذ دالة عادية داخل حلقة المحرك بشكل آمن من أي خيط"""
+        loop = self.loop_for(key)
+        loop.call_soon_threadsafe(callback, *args)
+
+    def _on_done(self, future):
+        with self._lock:
+            self._running_count = max(0, self._running_count - 1)
+
+    def get_stats(self):
+        """إحصائيات المحرك للمراقبة"""
+        with self._lock:
+            return {
+                "loops": len(self._loops),
+                "threads_alive": sum(1 for thread in self._threads if thread.is_alive()),
+                "running_coroutines": self._running_count,
+            }
+
+    def shutdown(self, timeout=5):
+        """إيقاف جميع حلقات المحرك"""
+        with self._lock:
+            if not self._started:
+                return
+            loops = list(self._loops)
+            threads = list(self._threads)
+            self._loops = []
+            self._threads = []
+            self._started = False
+
+        for loop in loops:
+            try:
+                loop.call_soon_threadsafe(loop.stop)
+            except RuntimeError:
+                # الحلقة مغلقة بالفعل
+                pass
+        for thread in threads:
+            thread.join(timeout)
+        logger.info("تم إيقاف محرك النشر المشترك")
@@ -1,5 +1,4 @@
 import os
-import json
 import time
 import logging
 import threading
@@ -8,18 +7,59 @@ import atexit
 import sqlite3
 from datetime import datetime
 
+from services.client_pool import client_pool
+from services.peer_cache import peer_cache, peer_from_entity, input_peer_from_record
+from services.posting_engine import PostingEngine
+from services.rate_limiter import AccountRateLimiter
+from services.stop_signal import StopSignal
+from services.task_journal import TaskJournal
+from services.task_scheduler import TaskScheduler
+
 # تكوين التسجيل
 logger = logging.getLogger(__name__)
 
 # متغير عام للتحقق من تهيئة الخدمة
 _posting_service_initialized = False
 
+def _load_engine_settings():
+    """قراءة إعدادات محرك النشر من التكوين مع قيم افتراضية آمنة"""
+    try:
+        from config.config import POSTING_ENGINE_MODE, POSTING_ENGINE_LOOPS
+        mode, loops = POSTING_ENGINE_MODE, POSTING_ENGINE_LOOPS
+    except Exception:
+        mode = os.getenv("POSTING_ENGINE_MODE", "shared")
+        loops = int(os.getenv("POSTING_ENGINE_LOOPS", "1"))
+    
+    mode = (mode or "shared").lower()
+    if mode not in ("shared", "threaded"):
+        logger.warning(f"وضع محرك النشر غير معروف '{mode}'، استخدام shared")
+        mode = "shared"
+    return mode, loops
+
+def _load_rate_limit_settings():
+    """قراءة إعدادات تحديد معدل الإرسال من التكوين مع قيم افتراضية آمنة"""
+    try:
+        from config.config import (
+            POSTING_RATE_LIMIT, POSTING_RATE_BURST, POSTING_PER_CHAT_INTERVAL, POSTING_TASK_CONCURRENCY
+        )
+        rate, burst, per_chat_interval = POSTING_RATE_LIMIT, POSTING_RATE_BURST, POSTING_PER_CHAT_INTERVAL
+        concurrency = POSTING_TASK_CONCURRENCY
+    except Exception:
+        rate = float(os.getenv("POSTING_RATE_LIMIT", "20"))
+        burst = int(os.getenv("POSTING_RATE_BURST", "20"))
+        per_chat_interval = float(os.getenv("POSTING_PER_CHAT_INTERVAL", "0"))
+        concurrency = int(os.getenv("POSTING_TASK_CONCURRENCY", "3"))
+    return {"rate": rate, "burst": burst, "per_chat_interval": per_chat_interval, "concurrency": concurrency}
+
 class PostingService:
     """خدمة النشر المحسنة مع حفظ تلقائي عند كل عملية إيقاف نشر أو نشر تلقائي"""
     
     # كائن مفرد (singleton) للخدمة
     _instance = None
     
+    # أوضاع النشر المدعومة
+    POSTING_MODES = ("send", "forward")
+    
     def __new__(cls, *args, **kwargs):
         """تنفيذ نمط Singleton لضمان وجود نسخة واحدة فقط من الخدمة"""
         global _posting_service_initialized
@@ -59,9 +99,15 @@ class PostingService:
         # تعيين ملف حفظ المهام النشطة
         self.active_tasks_json_file = os.path.join(self.data_dir, 'active_posting.json')
         
-        # تعيين ملف posting_active.json كملف رئيسي جديد
+        # تعيين ملف posting_active.json (ملف JSON قديم، يُستورد إلى سجل المهام مرة واحدة)
         self.posting_active_json_file = os.path.join(self.data_dir, 'posting_active.json')
         
+        # سجل المهام: جدول SQLite بوضع WAL مع حفظ مؤجل ومجمّع
+        self.task_journal = TaskJournal(
+            os.path.join(self.data_dir, 'posting_tasks.sqlite'),
+            snapshot_provider=self._snapshot_active_tasks
+        )
+        
         # قاموس للمهام النشطة في الذاكرة
         self.active_tasks = {}
         
@@ -75,12 +121,29 @@ class PostingService:
         # إضافة قاموس لتتبع خيوط المستخدمين - تحسين جديد
         self.user_threads = {}  # {user_id: task_id}
         
+        # تهيئة محرك النشر (shared: حلقات أحداث مشتركة، threaded: خيط لكل مهمة)
+        self.engine_mode, engine_loops = _load_engine_settings()
+        self.engine = PostingEngine(loop_count=engine_loops) if self.engine_mode == "shared" else None
+        if self.engine is not None:
+            # عميل كل حساب في المجمع تملكه حلقة محرك واحدة (مثبتة حسب crc32 لمفتاح الجلسة)
+            client_pool.loop_resolver = self.engine.loop_for
+        # مستقبلات الروتينات المشتركة للمهام في وضع shared {task_id: Future}
+        self.task_futures = {}
+        # المجدول المركزي لمواعيد دورات النشر في وضع shared (بدلاً من مؤقت خامل لكل مهمة)
+        self.scheduler = TaskScheduler(self._dispatch_due_tasks) if self.engine is not None else None
+        logger.info(f"وضع محرك النشر: {self.engine_mode}")
+        
+        # محدد معدل الإرسال لكل حساب (مفتاحه معرف المستخدم صاحب الجلسة)
+        rate_settings = _load_rate_limit_settings()
+        self.default_concurrency = rate_settings.pop("concurrency")
+        self.rate_limiter = AccountRateLimiter(**rate_settings)
+        
         # تهيئة اتصال قاعدة البيانات إذا لم يتم توفيره
         if users_collection is None:
             try:
                 # محاولة استيراد Database من وحدة database.db
                 try:
-                    from database.db_mongodb import Database
+                    from database import Database
                     self.db = Database()
                     self.users_collection = self.db.get_collection("users")
                     logger.info("تم تهيئة اتصال قاعدة البيانات في PostingService باستخدام database.db")
@@ -88,7 +151,7 @@ class PostingService:
                     # إذا فشل الاستيراد، حاول استيراد من المسار المطلق
                     import sys
                     sys.path.append('/app')
-                    from database.db_mongodb import Database
+                    from database import Database
                     self.db = Database()
                     self.users_collection = self.db.get_collection("users")
                     logger.info("تم تهيئة اتصال قاعدة البيانات في PostingService باستخدام المسار المطلق")
@@ -119,65 +182,41 @@ class PostingService:
         self._resume_active_tasks()
         
         # تسجيل دالة الحفظ لتنفيذها عند الخروج
-        atexit.register(self.save_active_tasks)
-        logger.info("تم تسجيل save_active_tasks للتنفيذ عند الخروج.")
+        atexit.register(self.flush_active_tasks)
+        logger.info("تم تسجيل flush_active_tasks للتنفيذ عند الخروج.")
     
     def _load_active_tasks(self):
-        """تحميل المهام النشطة من ملف JSON"""
+        """تحميل المهام النشطة من سجل المهام (مع استيراد ملفات JSON القديمة مرة واحدة)"""
         try:
-            # قائمة بجميع ملفات JSON المحتملة للمهام، بترتيب الأولوية
-            json_files_to_check = [
-                self.posting_active_json_file,  # posting_active.json (الملف الرئيسي الجديد)
-                self.active_tasks_json_file,    # active_posting.json (الملف القديم)
+            # ملفات JSON القديمة بترتيب الأولوية، تُستورد إلى السجل عند أول تشغيل فقط
+            legacy_json_files = [
+                self.posting_active_json_file,  # posting_active.json
+                self.active_tasks_json_file,    # active_posting.json
                 os.path.join('services', 'active_tasks.json')  # الملف الاحتياطي القديم
             ]
+            self.task_journal.import_legacy_files(legacy_json_files)
             
-            # مجموعة لتتبع المهام المستعادة لمنع التكرار
-            restored_task_ids = set()
+            loaded_tasks = self.task_journal.load()
             
-            # محاولة تحميل المهام من جميع الملفات المحتملة
-            for json_file in json_files_to_check:
-                if os.path.exists(json_file):
-                    logger.info(f"محاولة تحميل المهام من {json_file}")
-                    with open(json_file, 'r', encoding='utf-8') as f:
-                        loaded_tasks = json.load(f)
-                    
-                    # تحويل التواريخ من سلاسل ISO إلى كائنات datetime
-                    for task_id, task_data in loaded_tasks.items():
-                        # تجاهل المهام التي تم تحميلها بالفعل
-                        if task_id in restored_task_ids:
-                            continue
-                        
-                        restored_task_ids.add(task_id)
-                        
-                        if "start_time" in task_data and isinstance(task_data["start_time"], str):
-                            try:
-                                task_data["start_time"] = datetime.fromisoformat(task_data["start_time"])
-                            except ValueError:
-                                task_data["start_time"] = datetime.now()
-                        
-                        if "last_activity" in task_data and isinstance(task_data["last_activity"], str):
-                            try:
-                                task_data["last_activity"] = datetime.fromisoformat(task_data["last_activity"])
-                            except ValueError:
-                                task_data["last_activity"] = datetime.now()
-                        
-                        # إضافة المهمة إلى الذاكرة
-                        self.active_tasks[task_id] = task_data
-                    
-                    logger.info(f"تم تحميل {len(loaded_tasks)} مهمة من {json_file}")
-                    
-                    # طباعة معلومات المهام المحملة للتصحيح
-                    for task_id, task_data in loaded_tasks.items():
-                        logger.info(f"تم تحميل المهمة {task_id} بحالة {task_data.get('status')} للمستخدم {task_data.get('user_id')}")
-                        # طباعة معرفات المجموعات للتصحيح
-                        group_ids = task_data.get('group_ids', [])
-                        logger.info(f"معرفات المجموعات للمهمة {task_id}: {group_ids}")
-            
-            logger.info(f"تم تحميل {len(self.active_tasks)} مهمة نشطة في المجموع")
+            # تحويل التواريخ من سلاسل ISO إلى كائنات datetime
+            for task_id, task_data in loaded_tasks.items():
+                if "start_time" in task_data and isinstance(task_data["start_time"], str):
+                    try:
+                        task_data["start_time"] = datetime.fromisoformat(task_data["start_time"])
+                    except ValueError:
+                        task_data["start_time"] = datetime.now()
+                
+                if "last_activity" in task_data and isinstance(task_data["last_activity"], str):
+                    try:
+                        task_data["last_activity"] = datetime.fromisoformat(task_data["last_activity"])
+                    except ValueError:
+                        task_data["last_activity"] = datetime.now()
+                
+                # إضافة المهمة إلى الذاكرة
+                self.active_tasks[task_id] = task_data
+                logger.info(f"تم تحميل المهمة {task_id} بحالة {task_data.get('status')} للمستخدم {task_data.get('user_id')}")
             
-            # حفظ جميع المهام المحملة إلى الملف الرئيسي الجديد
-            self.save_active_tasks()
+            logger.info(f"تم تحميل {len(self.active_tasks)} مهمة نشطة في المجموع من سجل المهام")
         except Exception as e:
             logger.error(f"خطأ في تحميل المهام النشطة: {str(e)}")
             self.active_tasks = {}
@@ -198,8 +237,8 @@ class PostingService:
                         logger.warning(f"المهمة {task_id} لا تحتوي على معرف مستخدم صالح، تخطي")
                         continue
                     
-                    # التحقق مما إذا كان الخيط موجوداً بالفعل
-                    if task_id in self.task_threads and self.task_threads[task_id].is_alive():
+                    # التحقق مما إذا كان الخيط أو الروتين المشترك موجوداً بالفعل
+                    if self._is_task_alive(task_id):
                         logger.warning(f"المهمة {task_id} قيد التشغيل بالفعل، تخطي")
                         continue
                     
@@ -210,17 +249,14 @@ class PostingService:
                         self._stop_task_internal(existing_task_id)
                     
                     # إنشاء حدث توقف جديد لكل مهمة
-                    self.task_events[task_id] = threading.Event()
-                    
-                    # بدء تنفيذ المهمة في خيط جديد
-                    thread = threading.Thread(target=self._execute_task, args=(task_id, user_id))
-                    thread.daemon = True
-                    self.task_threads[task_id] = thread
-                    thread.start()
+                    self.task_events[task_id] = StopSignal()
                     
-                    # تسجيل المهمة النشطة للمستخدم - تحسين جديد
+                    # تسجيل المهمة النشطة للمستخدم قبل التشغيل (قد تنتهي المهمة فوراً فتزيل التسجيل)
                     self.user_threads[user_id] = task_id
                     
+                    # بدء تنفيذ المهمة على محرك النشر
+                    self._launch_task(task_id, user_id)
+                    
                     resumed_count += 1
                     logger.info(f"تم استئناف المهمة {task_id} للمستخدم {user_id}")
                 except Exception as e:
@@ -229,54 +265,33 @@ class PostingService:
         logger.info(f"تم استئناف {resumed_count} مهمة نشطة بنجاح")
     
     def save_active_tasks(self):
-        """حفظ المهام النشطة إلى ملف JSON مع تسجيل محسن"""
-        logger.debug(f"[save_active_tasks] بدء عملية الحفظ إلى {self.posting_active_json_file}...")
-        tasks_to_save_json = {}
-        
+        """طلب حفظ المهام النشطة؛ الحفظ مؤجل ومجمّع في سجل المهام (يكتب المهام المتغيرة فقط)"""
+        self.task_journal.request_flush()
+        return True
+    
+    def flush_active_tasks(self):
+        """حفظ المهام النشطة فوراً في سجل المهام (يُستخدم عند الخروج)"""
+        return self.task_journal.flush()
+    
+    def _snapshot_active_tasks(self):
+        """نسخة من المهام الحالية قابلة للتسلسل، يستدعيها سجل المهام عند وقت الحفظ"""
         with self.tasks_lock:
-            logger.debug(f"[save_active_tasks] الحصول على القفل. المهام الحالية في الذاكرة: {len(self.active_tasks)}")
-            
+            snapshot = {}
             for task_id, task_data in self.active_tasks.items():
-                # حفظ جميع المهام النشطة
                 task_copy = task_data.copy()
-                
-                # التأكد من تحويل كائنات datetime إلى سلاسل بتنسيق ISO للتسلسل JSON
-                if isinstance(task_copy.get("start_time"), datetime):
-                    task_copy["start_time"] = task_copy["start_time"].isoformat()
-                
-                if isinstance(task_copy.get("last_activity"), datetime):
-                    task_copy["last_activity"] = task_copy["last_activity"].isoformat()
-                
-                # يجب أن تكون group_ids قائمة بالفعل في الذاكرة، سيتعامل JSON مع تسلسل القائمة
-                tasks_to_save_json[task_id] = task_copy
-            
-            logger.debug(f"[save_active_tasks] تحرير القفل. تم تجهيز {len(tasks_to_save_json)} مهمة للحفظ بتنسيق JSON.")
-        
-        try:
-            # حفظ إلى الملف الرئيسي الجديد (posting_active.json)
-            os.makedirs(os.path.dirname(self.posting_active_json_file), exist_ok=True)
-            with open(self.posting_active_json_file, 'w', encoding='utf-8') as f:
-                json.dump(tasks_to_save_json, f, indent=4, ensure_ascii=False)
-            
-            # للتوافق، حفظ نسخة في الملف القديم أيضاً (active_posting.json)
-            os.makedirs(os.path.dirname(self.active_tasks_json_file), exist_ok=True)
-            with open(self.active_tasks_json_file, 'w', encoding='utf-8') as f:
-                json.dump(tasks_to_save_json, f, indent=4, ensure_ascii=False)
-            
-            # للتوافق مع الكود القديم، حفظ نسخة في الملف الاحتياطي القديم
-            old_backup_file = os.path.join('services', 'active_tasks.json')
-            os.makedirs(os.path.dirname(old_backup_file), exist_ok=True)
-            with open(old_backup_file, 'w', encoding='utf-8') as f:
-                json.dump(tasks_to_save_json, f, indent=4, ensure_ascii=False)
-            
-            logger.info(f"تم حفظ {len(tasks_to_save_json)} مهمة نشطة بنجاح إلى جميع ملفات JSON")
-            return True
-        except Exception as e:
-            logger.error(f"خطأ في حفظ المهام النشطة إلى ملفات JSON: {str(e)}")
-            return False
+                if isinstance(task_copy.get("group_ids"), list):
+                    task_copy["group_ids"] = list(task_copy["group_ids"])
+                snapshot[task_id] = task_copy
+            return snapshot
     
-    def start_posting_task(self, user_id, post_id, message, group_ids, delay_seconds=None, exact_time=None, is_recurring=True):
-        """بدء مهمة نشر جديدة (متكررة افتراضياً)"""
+    def start_posting_task(self, user_id, post_id, message, group_ids, delay_seconds=None, exact_time=None, is_recurring=True, concurrency=None, posting_mode="send"):
+        """بدء مهمة نشر جديدة (متكررة افتراضياً)
+        concurrency: الحد الأقصى للإرسالات المتزامنة إلى مجموعات المهمة (الافتراضي من التكوين)
+        posting_mode: send للإرسال المباشر لكل مجموعة، أو forward للنشر مرة واحدة في الرسائل المحفوظة ثم التحويل"""
+        if posting_mode not in self.POSTING_MODES:
+            logger.warning(f"وضع النشر غير معروف '{posting_mode}'، استخدام send")
+            posting_mode = "send"
+        
         task_id = str(user_id) + "_" + str(time.time())  # معرف مهمة بسيط
         start_time = datetime.now()
         
@@ -310,13 +325,15 @@ class PostingService:
             "last_activity": start_time,  # تخزين كـ datetime في الذاكرة
             "message_count": 0,
             "message_id": None,  # لتخزين معرف رسالة الحالة
-            "is_recurring": is_recurring
+            "is_recurring": is_recurring,
+            "concurrency": max(1, int(concurrency or self.default_concurrency)),
+            "posting_mode": posting_mode
         }
         
         with self.tasks_lock:
             self.active_tasks[task_id] = task_data
             # إنشاء حدث توقف جديد - مهم للتأكد من أنه غير معين
-            self.task_events[task_id] = threading.Event()
+            self.task_events[task_id] = StopSignal()
         
         # حفظ المهمة الجديدة فوراً
         save_result = self.save_active_tasks()
@@ -325,35 +342,286 @@ class PostingService:
         else:
             logger.warning(f"فشل حفظ حالة المهام فوراً بعد إنشاء المهمة {task_id}")
         
-        # بدء تنفيذ المهمة في خيط جديد
-        thread = threading.Thread(target=self._execute_task, args=(task_id, user_id))
-        thread.daemon = True  # جعل الخيط daemon لضمان إنهائه عند إنهاء البرنامج الرئيسي
-        self.task_threads[task_id] = thread
-        thread.start()
-        
-        # تسجيل المهمة النشطة للمستخدم - تحسين جديد
+        # تسجيل المهمة النشطة للمستخدم قبل التشغيل (قد تنتهي المهمة فوراً فتزيل التسجيل)
         with self.tasks_lock:
             self.user_threads[user_id] = task_id
         
+        # بدء تنفيذ المهمة على محرك النشر
+        self._launch_task(task_id, user_id)
+        
         logger.info(f"تم بدء مهمة النشر {task_id} للمستخدم {user_id}")
         
         return task_id, True
     
-    def _execute_task(self, task_id, user_id):
-        """تنفيذ مهمة نشر (تعمل في خيط)"""
-        # التحقق من حالة المهمة قبل البدء
+    def _is_task_alive(self, task_id):
+        """التحقق مما إذا كانت المهمة قيد التنفيذ فعلياً (خيط أو روتين مشترك)"""
+        thread = self.task_threads.get(task_id)
+        if thread is not None and thread.is_alive():
+            return True
+        if self.scheduler is not None and self.scheduler.is_scheduled(task_id):
+            return True
+        future = self.task_futures.get(task_id)
+        return future is not None and not future.done()
+    
+    def _launch_task(self, task_id, user_id):
+        """بدء تنفيذ المهمة حسب وضع محرك النشر"""
+        if self.engine is not None:
+            # وضع shared: إضافة أول موعد للمهمة إلى المجدول المركزي
+            fire_at = self._initial_fire_time(task_id)
+            if fire_at is not None:
+                self._schedule_task(task_id, fire_at)
+        else:
+            # وضع threaded: خيط جديد مع حلقة أحداث خاصة بالمهمة
+            thread = threading.Thread(target=self._execute_task, args=(task_id, user_id))
+            thread.daemon = True  # جعل الخيط daemon لضمان إنهائه عند إنهاء البرنامج الرئيسي
+            self.task_threads[task_id] = thread
+            thread.start()
+    
+    def _initial_fire_time(self, task_id):
+        """حساب أول موعد للمهمة: الموعد المحفوظ، أو الوقت المحدد، أو الآن.
+        إذا انقطعت دورة في منتصفها (إعادة تشغيل أثناء الإرسال) لا تُعاد الدورة لتجنب تكرار الرسائل"""
+        now = datetime.now()
+        with self.tasks_lock:
+            task_data = self.active_tasks.get(task_id)
+            if not task_data:
+                return None
+            
+            next_run_at = self._parse_task_time(task_data.get("next_run_at"))
+            if next_run_at is not None:
+                return next_run_at
+            
+            if task_data.get("cycle_started_at"):
+                task_data.pop("cycle_started_at", None)
+                if not task_data.get("is_recurring", True):
+                    logger.warning(f"المهمة غير المتكررة {task_id} انقطعت أثناء الإرسال، لن يتم إعادة إرسالها")
+                    task_data["status"] = "stopped"
+                    task_data["last_activity"] = now
+                    user_id = task_data.get("user_id")
+                else:
+                    delay_seconds = task_data.get("delay_seconds")
+                    wait_time = delay_seconds if delay_seconds and delay_seconds > 0 else 3600
+                    logger.warning(f"المهمة {task_id} انقطعت أثناء الإرسال، الدورة التالية بعد {wait_time}ث")
+                    return datetime.fromtimestamp(now.timestamp() + wait_time)
+            else:
+                exact_time = self._parse_task_time(task_data.get("exact_time"))
+                return exact_time if exact_time and exact_time > now else now
+        
+        self._finalize_task(task_id, user_id)
+        return None
+    
+    def _schedule_task(self, task_id, fire_at):
+        """حفظ موعد الدورة التالية في بيانات المهمة وإضافته إلى المجدول"""
         with self.tasks_lock:
-            if task_id not in self.active_tasks or self.active_tasks[task_id].get("status") != "running":
-                logger.warning(f"المهمة {task_id} ليست في حالة تشغيل، إلغاء التنفيذ.")
+            if task_id not in self.active_tasks:
                 return
+            self.active_tasks[task_id]["next_run_at"] = fire_at.isoformat()
+        self.scheduler.schedule(task_id, fire_at.timestamp())
+        self.save_active_tasks()
+        logger.info(f"تمت جدولة الدورة التالية للمهمة {task_id} في {fire_at}")
+    
+    def _dispatch_due_tasks(self, task_ids):
+        """تسليم دورات المهام المستحقة إلى محرك النشر (يُستدعى من خيط المجدول)"""
+        dispatched = []
+        finished = []
+        with self.tasks_lock:
+            for task_id in task_ids:
+                task_data = self.active_tasks.get(task_id)
+                if not task_data:
+                    continue
+                stop_event = self.task_events.get(task_id)
+                if task_data.get("status") != "running" or stop_event is None or stop_event.is_set():
+                    finished.append((task_id, task_data.get("user_id")))
+                    continue
+                # تعليم الدورة كجارية قبل الإرسال حتى لا تتكرر بعد إعادة التشغيل
+                task_data["next_run_at"] = None
+                task_data["cycle_started_at"] = datetime.now().isoformat()
+                dispatched.append((task_id, task_data.get("user_id")))
+        
+        # حفظ فوري ودائم لعلامات الدورات الجارية قبل بدء الإرسال
+        if dispatched:
+            self.flush_active_tasks()
         
+        for task_id, user_id in finished:
+            self._finalize_stopped_task(task_id, user_id)
+        
+        for task_id, user_id in dispatched:
+            future = self.engine.submit(self._run_cycle(task_id, user_id), key=user_id)
+            with self.tasks_lock:
+                self.task_futures[task_id] = future
+            future.add_done_callback(lambda f, tid=task_id: self._on_task_future_done(tid, f))
+    
+    async def _run_cycle(self, task_id, user_id):
+        """تنفيذ دورة نشر واحدة لمهمة على حلقة المحرك ثم جدولة الدورة التالية أو إنهاء المهمة"""
+        next_fire = None
+        stop_event = self.task_events.get(task_id)
+        
+        try:
+            with self.tasks_lock:
+                task_data = self.active_tasks.get(task_id)
+                if not task_data or task_data.get("status") != "running" or stop_event is None:
+                    logger.warning(f"المهمة {task_id} ليست في حالة تشغيل، إلغاء الدورة.")
+                    return
+                message = task_data.get("message", "")
+                group_ids = list(task_data.get("group_ids", []))
+                delay_seconds = task_data.get("delay_seconds")
+                is_recurring = task_data.get("is_recurring", True)
+                concurrency = max(1, int(task_data.get("concurrency") or self.default_concurrency))
+                posting_mode = task_data.get("posting_mode", "send")
+            
+            # استرجاع بيانات الاعتماد في منفذ منفصل حتى لا يتم حجز حلقة الأحداث المشتركة
+            loop = asyncio.get_running_loop()
+            credentials = await loop.run_in_executor(None, self._prepare_task, task_id, user_id)
+            if credentials is None:
+                return
+            
+            session_string, api_id, api_hash = credentials
+            
+            async def send_cycle(client):
+                if client is None:
+                    return None
+                return await self._send_cycle(
+                    client, task_id, user_id, group_ids, message, concurrency, stop_event, posting_mode
+                )
+            
+            # الدورة تعمل على حلقة المالك لعميل الحساب حتى يشارك النشر والردود التلقائية نفس الاتصال
+            results = await client_pool.run(session_string, api_id, api_hash, send_cycle)
+            if results is None:
+                logger.error(f"المستخدم {user_id} غير مصرح له للمهمة {task_id}.")
+                self._mark_task_failed(task_id, "بسبب عدم التصريح")
+                return
+            self._record_cycle_results(task_id, group_ids, results)
+            
+            if stop_event.is_set():
+                return
+            
+            if not is_recurring:
+                logger.info(f"المهمة {task_id} غير متكررة، الانتهاء بعد دورة واحدة.")
+                with self.tasks_lock:
+                    if task_id in self.active_tasks:
+                        self.active_tasks[task_id]["status"] = "completed"
+                        self.active_tasks[task_id]["last_activity"] = datetime.now()
+                return
+            
+            wait_time = delay_seconds if delay_seconds and delay_seconds > 0 else 3600  # افتراضي 1 ساعة
+            next_fire = datetime.fromtimestamp(time.time() + wait_time)
+        except Exception as cycle_error:
+            logger.error(f"خطأ في دورة النشر للمهمة {task_id}: {str(cycle_error)}")
+            # إعادة المحاولة بعد دقيقة واحدة
+            next_fire = datetime.fromtimestamp(time.time() + 60)
+        finally:
+            with self.tasks_lock:
+                if task_id in self.active_tasks:
+                    self.active_tasks[task_id].pop("cycle_started_at", None)
+                    still_running = self.active_tasks[task_id].get("status") == "running"
+                else:
+                    still_running = False
+            
+            if stop_event is not None and stop_event.is_set():
+                self._finalize_stopped_task(task_id, user_id)
+            elif next_fire is not None and still_running:
+                self._schedule_task(task_id, next_fire)
+            else:
+                self._finalize_task(task_id, user_id)
+    
+    def _finalize_stopped_task(self, task_id, user_id):
+        """تعيين حالة المهمة الموقوفة إلى stopped وتنظيف مواردها"""
+        with self.tasks_lock:
+            if task_id in self.active_tasks:
+                self.active_tasks[task_id]["status"] = "stopped"
+                self.active_tasks[task_id]["next_run_at"] = None
+                self.active_tasks[task_id]["last_activity"] = datetime.now()
+        logger.info(f"تم إيقاف المهمة {task_id}")
+        self._finalize_task(task_id, user_id)
+    
+    def _on_task_future_done(self, task_id, future):
+        """تنظيف مستقبل المهمة بعد انتهاء الروتين المشترك"""
+        with self.tasks_lock:
+            if self.task_futures.get(task_id) is future:
+                del self.task_futures[task_id]
+        
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"انتهى الروتين المشترك للمهمة {task_id} بخطأ: {str(future.exception())}")
+    
+    def _mark_task_failed(self, task_id, reason=""):
+        """تعيين حالة المهمة إلى فاشلة وحفظ الحالة"""
+        with self.tasks_lock:
+            if task_id in self.active_tasks:
+                self.active_tasks[task_id]["status"] = "failed"
+                self.active_tasks[task_id]["last_activity"] = datetime.now()
+        
+        # حفظ الحالة بعد فشل المهمة
+        save_result = self.save_active_tasks()
+        if save_result:
+            logger.info(f"تم حفظ حالة المهام بعد فشل المهمة {task_id} {reason}".strip())
+        else:
+            logger.warning(f"فشل حفظ حالة المهام بعد فشل المهمة {task_id} {reason}".strip())
+    
+    def _execute_task(self, task_id, user_id):
+        """تنفيذ مهمة نشر في خيط مستقل مع حلقة أحداث خاصة (وضع threaded)"""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        
+        try:
+            # تنفيذ الروتين المشترك
+            loop.run_until_complete(self._run_task(task_id, user_id))
+        except Exception as e:
+            logger.error(f"خطأ في تنفيذ الروتين المشترك للمهمة {task_id}: {str(e)}")
+            self._mark_task_failed(task_id, "بسبب خطأ في تنفيذ الروتين المشترك")
+        finally:
+            # قطع اتصال عملاء المجمع المرتبطين بهذه الحلقة قبل إغلاقها
+            try:
+                loop.run_until_complete(client_pool.close_loop_clients())
+            except Exception as pool_error:
+                logger.error(f"خطأ أثناء إغلاق عملاء المجمع للمهمة {task_id}: {str(pool_error)}")
+            
+            # إغلاق الحلقة
+            try:
+                loop.close()
+                logger.info(f"تم إغلاق حلقة الأحداث للمهمة {task_id}")
+            except Exception as loop_error:
+                logger.error(f"خطأ أثناء إغلاق حلقة الأحداث للمهمة {task_id}: {str(loop_error)}")
+            
+            # إزالة الخيط من قاموس الخيوط
+            with self.tasks_lock:
+                if task_id in self.task_threads:
+                    del self.task_threads[task_id]
+    
+    async def _run_task(self, task_id, user_id):
+        """الروتين المشترك لمهمة نشر في وضع threaded (حلقة نشر كاملة على حلقة خيط المهمة)"""
+        try:
+            # التحقق من حالة المهمة قبل البدء
+            with self.tasks_lock:
+                if task_id not in self.active_tasks or self.active_tasks[task_id].get("status") != "running":
+                    logger.warning(f"المهمة {task_id} ليست في حالة تشغيل، إلغاء التنفيذ.")
+                    return
+            
+            # استرجاع بيانات الاعتماد في منفذ منفصل حتى لا يتم حجز حلقة الأحداث المشتركة
+            loop = asyncio.get_running_loop()
+            credentials = await loop.run_in_executor(None, self._prepare_task, task_id, user_id)
+            if credentials is None:
+                return
+            
+            session_string, api_id, api_hash = credentials
+            # حلقة النشر تعمل على حلقة المالك لعميل الحساب في المجمع (عملاء Telethon مرتبطون بحلقتهم)
+            await client_pool.run_on_owner(
+                session_string, self._posting_loop(task_id, user_id, session_string, api_id, api_hash)
+            )
+        except Exception as e:
+            logger.error(f"خطأ غير متوقع في الروتين المشترك للمهمة {task_id}: {str(e)}")
+            self._mark_task_failed(task_id, "بسبب خطأ غير متوقع")
+        finally:
+            self._finalize_task(task_id, user_id)
+    
+    def _prepare_task(self, task_id, user_id):
+        """استرجاع بيانات الاعتماد للمهمة والتحقق من توفر Telethon
+        يُرجع (session_string, api_id, api_hash) أو None بعد تعيين المهمة كفاشلة"""
         # التحقق من وجود users_collection قبل استخدامه
         if self.users_collection is None:
             logger.error(f"users_collection غير متاح للمهمة {task_id}. محاولة إعادة التهيئة...")
             try:
                 # محاولة إعادة تهيئة اتصال قاعدة البيانات
                 try:
-                    from database.db_mongodb import Database
+                    from database import Database
                     self.db = Database()
                     self.users_collection = self.db.get_collection("users")
                     logger.info(f"تم إعادة تهيئة اتصال قاعدة البيانات للمهمة {task_id}")
@@ -361,26 +629,14 @@ class PostingService:
                     # إذا فشل الاستيراد، حاول استيراد من المسار المطلق
                     import sys
                     sys.path.append('/app')
-                    from database.db_mongodb import Database
+                    from database import Database
                     self.db = Database()
                     self.users_collection = self.db.get_collection("users")
                     logger.info(f"تم إعادة تهيئة اتصال قاعدة البيانات للمهمة {task_id} باستخدام المسار المطلق")
             except Exception as e:
                 logger.error(f"فشل إعادة تهيئة اتصال قاعدة البيانات للمهمة {task_id}: {str(e)}")
-                
-                with self.tasks_lock:
-                    if task_id in self.active_tasks:
-                        self.active_tasks[task_id]["status"] = "failed"
-                        self.active_tasks[task_id]["last_activity"] = datetime.now()
-                
-                # حفظ الحالة بعد فشل المهمة
-                save_result = self.save_active_tasks()
-                if save_result:
-                    logger.info(f"تم حفظ حالة المهام بعد فشل المهمة {task_id}")
-                else:
-                    logger.warning(f"فشل حفظ حالة المهام بعد فشل المهمة {task_id}")
-                
-                return
+                self._mark_task_failed(task_id)
+                return None
         
         # استرجاع سلسلة جلسة المستخدم من قاعدة البيانات
         try:
@@ -389,20 +645,8 @@ class PostingService:
             
             if not user_data or "session_string" not in user_data:
                 logger.error(f"لم يتم العثور على سلسلة الجلسة للمستخدم {user_id} للمهمة {task_id}")
-                
-                with self.tasks_lock:
-                    if task_id in self.active_tasks:
-                        self.active_tasks[task_id]["status"] = "failed"
-                        self.active_tasks[task_id]["last_activity"] = datetime.now()
-                
-                # حفظ الحالة بعد فشل المهمة
-                save_result = self.save_active_tasks()
-                if save_result:
-                    logger.info(f"تم حفظ حالة المهام بعد فشل المهمة {task_id} بسبب عدم وجود سلسلة الجلسة")
-                else:
-                    logger.warning(f"فشل حفظ حالة المهام بعد فشل المهمة {task_id} بسبب عدم وجود سلسلة الجلسة")
-                
-                return
+                self._mark_task_failed(task_id, "بسبب عدم وجود سلسلة الجلسة")
+                return None
             
             session_string = user_data["session_string"]
             
@@ -411,20 +655,8 @@ class PostingService:
             api_hash = user_data.get("api_hash")
         except Exception as e:
             logger.error(f"خطأ في استرجاع بيانات المستخدم للمهمة {task_id}: {str(e)}")
-            
-            with self.tasks_lock:
-                if task_id in self.active_tasks:
-                    self.active_tasks[task_id]["status"] = "failed"
-                    self.active_tasks[task_id]["last_activity"] = datetime.now()
-            
-            # حفظ الحالة بعد فشل المهمة
-            save_result = self.save_active_tasks()
-            if save_result:
-                logger.info(f"تم حفظ حالة المهام بعد فشل المهمة {task_id} بسبب خطأ في استرجاع بيانات المستخدم")
-            else:
-                logger.warning(f"فشل حفظ حالة المهام بعد فشل المهمة {task_id} بسبب خطأ في استرجاع بيانات المستخدم")
-            
-            return
+            self._mark_task_failed(task_id, "بسبب خطأ في استرجاع بيانات المستخدم")
+            return None
         
         if not api_id or not api_hash:
             logger.warning(f"لم يتم العثور على API ID/Hash في user_data للمستخدم {user_id}. الرجوع إلى التكوين العام.")
@@ -444,403 +676,195 @@ class PostingService:
         
         if not api_id or not api_hash:
             logger.error(f"خطأ حرج: API ID/Hash مفقود للمستخدم {user_id} ومفقود أيضًا في التكوين العام. ستفشل المهمة {task_id}.")
-            
-            with self.tasks_lock:
-                if task_id in self.active_tasks:
-                    self.active_tasks[task_id]["status"] = "failed"
-                    self.active_tasks[task_id]["last_activity"] = datetime.now()
-            
-            # حفظ الحالة بعد فشل المهمة
-            save_result = self.save_active_tasks()
-            if save_result:
-                logger.info(f"تم حفظ حالة المهام بعد فشل المهمة {task_id} بسبب نقص API ID/Hash")
-            else:
-                logger.warning(f"فشل حفظ حالة المهام بعد فشل المهمة {task_id} بسبب نقص API ID/Hash")
-            
-            return
+            self._mark_task_failed(task_id, "بسبب نقص API ID/Hash")
+            return None
         
-        # استيراد TelegramClient هنا لتجنب مشاكل الاستيراد المبكر
+        # التحقق من توفر Telethon هنا لتجنب مشاكل الاستيراد المبكر
         try:
-            from telethon.sync import TelegramClient
-            from telethon.sessions import StringSession
-            from telethon.tl.types import InputPeerChannel, InputPeerChat, InputPeerUser
-            from telethon.tl.functions.channels import JoinChannelRequest
-            from telethon.errors import FloodWaitError, ChannelPrivateError, ChatAdminRequiredError
+            import telethon  # noqa: F401
         except ImportError:
             try:
                 import sys
                 sys.path.append('/app')
-                from telethon.sync import TelegramClient
-                from telethon.sessions import StringSession
-                from telethon.tl.types import InputPeerChannel, InputPeerChat, InputPeerUser
-                from telethon.tl.functions.channels import JoinChannelRequest
-                from telethon.errors import FloodWaitError, ChannelPrivateError, ChatAdminRequiredError
+                import telethon  # noqa: F401
             except Exception as e:
                 logger.error(f"فشل استيراد Telethon: {str(e)}")
+                self._mark_task_failed(task_id, "بسبب فشل استيراد Telethon")
+                return None
+        
+        return session_string, api_id, api_hash
+    
+    async def _posting_loop(self, task_id, user_id, session_string, api_id, api_hash):
+        """حلقة النشر الرئيسية للمهمة باستخدام عميل Telethon"""
+        # استعارة عميل الحساب من المجمع المشترك بدلاً من فتح اتصال جديد لكل مهمة
+        client = None
+        
+        try:
+            client = await client_pool.acquire(session_string, api_id, api_hash)
+            
+            if client is None:
+                logger.error(f"المستخدم {user_id} غير مصرح له للمهمة {task_id}.")
                 
                 with self.tasks_lock:
                     if task_id in self.active_tasks:
                         self.active_tasks[task_id]["status"] = "failed"
                         self.active_tasks[task_id]["last_activity"] = datetime.now()
                 
-                # حفظ الحالة بعد فشل المهمة
+                # حفظ الحالة بعد فشل المهمة بسبب عدم التصريح
                 save_result = self.save_active_tasks()
                 if save_result:
-                    logger.info(f"تم حفظ حالة المهام بعد فشل المهمة {task_id} بسبب فشل استيراد Telethon")
+                    logger.info(f"تم حفظ حالة المهام بعد فشل المهمة {task_id} بسبب عدم التصريح")
                 else:
-                    logger.warning(f"فشل حفظ حالة المهام بعد فشل المهمة {task_id} بسبب فشل استيراد Telethon")
+                    logger.warning(f"فشل حفظ حالة المهام بعد فشل المهمة {task_id} بسبب عدم التصريح")
                 
+                return  # الخروج من الروتين المشترك، سيتم تنفيذ finally
+            
+            # التحقق من حالة المهمة مرة أخرى قبل بدء الإرسال
+            with self.tasks_lock:
+                if task_id not in self.active_tasks or self.active_tasks[task_id].get("status") != "running":
+                    logger.warning(f"المهمة {task_id} لم تعد في حالة تشغيل، إلغاء التنفيذ.")
+                    return
+            
+            stop_event = self.task_events.get(task_id)  # التأكد من تعريف stop_event قبل الحلقة
+            
+            if not stop_event:
+                logger.error(f"لم يتم العثور على حدث التوقف للمهمة {task_id}. إنهاء المهمة.")
                 return
-        
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        async def task_coroutine():
-            # نقل تهيئة العميل داخل الروتين المشترك
-            client = TelegramClient(StringSession(session_string), api_id, api_hash, loop=loop)
             
-            try:
-                await client.connect()
+            # التحقق من حدث التوقف قبل بدء الإرسال
+            if stop_event.is_set():
+                logger.info(f"تم تعيين حدث التوقف للمهمة {task_id} قبل بدء الإرسال. إلغاء المهمة.")
+                return
+            
+            # استرجاع بيانات المهمة
+            with self.tasks_lock:
+                if task_id not in self.active_tasks:
+                    logger.error(f"لم يتم العثور على بيانات المهمة للمهمة {task_id}. إنهاء المهمة.")
+                    return
                 
-                if not await client.is_user_authorized():
-                    logger.error(f"المستخدم {user_id} غير مصرح له للمهمة {task_id}.")
+                task_data = self.active_tasks[task_id]
+                message = task_data.get("message", "")
+                group_ids = task_data.get("group_ids", [])
+                delay_seconds = task_data.get("delay_seconds")
+                exact_time = task_data.get("exact_time")
+                concurrency = max(1, int(task_data.get("concurrency") or self.default_concurrency))
+                posting_mode = task_data.get("posting_mode", "send")
+            
+            # التعامل مع الوقت المحدد إذا تم تحديده
+            if exact_time:
+                try:
+                    # تحويل الوقت المحدد من النص إلى كائن datetime
+                    exact_time = self._parse_task_time(exact_time)
                     
+                    if exact_time:
+                        now = datetime.now()
+                        
+                        # التحقق مما إذا كان الوقت المحدد في المستقبل
+                        if exact_time > now:
+                            wait_seconds = (exact_time - now).total_seconds()
+                            logger.info(f"المهمة {task_id} ستنتظر حتى {exact_time} ({wait_seconds} ثانية)")
+                            
+                            # انتظار حتى الوقت المحدد أو حتى يتم تعيين حدث التوقف
+                            if await self._wait_or_stop(stop_event, wait_seconds):
+                                logger.info(f"تم إيقاف المهمة {task_id} أثناء الانتظار حتى الوقت المحدد")
+                                return
+                        else:
+                            # إذا كان الوقت المحدد في الماضي، قم بالنشر فوراً
+                            logger.info(f"الوقت المحدد للمهمة {task_id} ({exact_time}) في الماضي، النشر فوراً")
+                except Exception as e:
+                    logger.error(f"خطأ في معالجة الوقت المحدد للمهمة {task_id}: {str(e)}")
+            
+            # حلقة النشر الرئيسية
+            while not stop_event.is_set():
+                try:
+                    # التحقق من حالة المهمة قبل كل دورة
                     with self.tasks_lock:
-                        if task_id in self.active_tasks:
-                            self.active_tasks[task_id]["status"] = "failed"
-                            self.active_tasks[task_id]["last_activity"] = datetime.now()
+                        if task_id not in self.active_tasks or self.active_tasks[task_id].get("status") != "running":
+                            logger.warning(f"المهمة {task_id} لم تعد في حالة تشغيل، الخروج من الحلقة.")
+                            break
                     
-                    # حفظ الحالة بعد فشل المهمة بسبب عدم التصريح
+                    # التحقق من حدث التوقف قبل كل دورة
+                    if stop_event.is_set():
+                        logger.info(f"تم تعيين حدث التوقف للمهمة {task_id}، الخروج من الحلقة.")
+                        break
+                    
+                    # إرسال الرسالة إلى جميع المجموعات بعدد محدود من الإرسالات المتزامنة
+                    results = await self._send_cycle(
+                        client, task_id, user_id, group_ids, message, concurrency, stop_event, posting_mode
+                    )
+                    
+                    # حساب نتائج الدورة بترتيب المجموعات
+                    self._record_cycle_results(task_id, group_ids, results)
+                    
+                    if stop_event.is_set():
+                        logger.info(f"تم إيقاف المهمة {task_id} أثناء دورة الإرسال")
+                        break
+                    
+                    # حفظ الحالة بعد كل دورة إرسال ناجحة
                     save_result = self.save_active_tasks()
                     if save_result:
-                        logger.info(f"تم حفظ حالة المهام بعد فشل المهمة {task_id} بسبب عدم التصريح")
+                        logger.info(f"تم حفظ حالة المهام بعد دورة إرسال ناجحة للمهمة {task_id}")
                     else:
-                        logger.warning(f"فشل حفظ حالة المهام بعد فشل المهمة {task_id} بسبب عدم التصريح")
-                    
-                    return  # الخروج من الروتين المشترك، سيتم تنفيذ finally
-                
-                # التحقق من حالة المهمة مرة أخرى قبل بدء الإرسال
-                with self.tasks_lock:
-                    if task_id not in self.active_tasks or self.active_tasks[task_id].get("status") != "running":
-                        logger.warning(f"المهمة {task_id} لم تعد في حالة تشغيل، إلغاء التنفيذ.")
-                        return
-                
-                stop_event = self.task_events.get(task_id)  # التأكد من تعريف stop_event قبل الحلقة
-                
-                if not stop_event:
-                    logger.error(f"لم يتم العثور على حدث التوقف للمهمة {task_id}. إنهاء المهمة.")
-                    return
-                
-                # التحقق من حدث التوقف قبل بدء الإرسال
-                if stop_event.is_set():
-                    logger.info(f"تم تعيين حدث التوقف للمهمة {task_id} قبل بدء الإرسال. إلغاء المهمة.")
-                    return
-                
-                # استرجاع بيانات المهمة
-                with self.tasks_lock:
-                    if task_id not in self.active_tasks:
-                        logger.error(f"لم يتم العثور على بيانات المهمة للمهمة {task_id}. إنهاء المهمة.")
-                        return
+                        logger.warning(f"فشل حفظ حالة المهام بعد دورة إرسال ناجحة للمهمة {task_id}")
                     
-                    task_data = self.active_tasks[task_id]
-                    message = task_data.get("message", "")
-                    group_ids = task_data.get("group_ids", [])
-                    delay_seconds = task_data.get("delay_seconds")
-                    exact_time = task_data.get("exact_time")
-                
-                # التعامل مع الوقت المحدد إذا تم تحديده
-                if exact_time:
-                    try:
-                        # تحويل الوقت المحدد من النص إلى كائن datetime
-                        if isinstance(exact_time, str):
-                            try:
-                                exact_time = datetime.fromisoformat(exact_time)
-                            except ValueError:
-                                # محاولة تحليل التنسيقات الشائعة إذا فشل التحويل المباشر
-                                try:
-                                    exact_time = datetime.strptime(exact_time, "%Y-%m-%d %H:%M:%S")
-                                except ValueError:
-                                    try:
-                                        exact_time = datetime.strptime(exact_time, "%Y-%m-%dT%H:%M:%S")
-                                    except ValueError:
-                                        logger.error(f"تعذر تحويل الوقت المحدد: {exact_time}")
-                                        exact_time = None
-                        
-                        if exact_time:
-                            now = datetime.now()
-                            
-                            # التحقق مما إذا كان الوقت المحدد في المستقبل
-                            if exact_time > now:
-                                wait_seconds = (exact_time - now).total_seconds()
-                                logger.info(f"المهمة {task_id} ستنتظر حتى {exact_time} ({wait_seconds} ثانية)")
-                                
-                                # انتظار حتى الوقت المحدد أو حتى يتم تعيين حدث التوقف
-                                try:
-                                    # استخدام asyncio.sleep بدلاً من asyncio.to_thread للتوافق مع Python 3.7
-                                    wait_task = asyncio.create_task(asyncio.sleep(wait_seconds))
-                                    
-                                    # إنشاء مهمة للتحقق من حدث التوقف
-                                    async def check_stop_event():
-                                        while not stop_event.is_set():
-                                            await asyncio.sleep(0.5)  # التحقق كل نصف ثانية
-                                            if stop_event.is_set():
-                                                return True
-                                        return True
-                                    
-                                    stop_check_task = asyncio.create_task(check_stop_event())
-                                    
-                                    # انتظار أي من المهمتين
-                                    done, pending = await asyncio.wait(
-                                        [wait_task, stop_check_task],
-                                        return_when=asyncio.FIRST_COMPLETED
-                                    )
-                                    
-                                    # إلغاء المهام المعلقة
-                                    for task in pending:
-                                        task.cancel()
-                                    
-                                    if stop_event.is_set():
-                                        logger.info(f"تم إيقاف المهمة {task_id} أثناء الانتظار حتى الوقت المحدد")
-                                        return
-                                except asyncio.CancelledError:
-                                    # تم إلغاء المهمة
-                                    logger.info(f"تم إلغاء مهمة الانتظار للمهمة {task_id}")
-                                    if stop_event.is_set():
-                                        return
-                            else:
-                                # إذا كان الوقت المحدد في الماضي، قم بالنشر فوراً
-                                logger.info(f"الوقت المحدد للمهمة {task_id} ({exact_time}) في الماضي، النشر فوراً")
-                    except Exception as e:
-                        logger.error(f"خطأ في معالجة الوقت المحدد للمهمة {task_id}: {str(e)}")
-                
-                # حلقة النشر الرئيسية
-                while not stop_event.is_set():
-                    try:
-                        # التحقق من حالة المهمة قبل كل دورة
-                        with self.tasks_lock:
-                            if task_id not in self.active_tasks or self.active_tasks[task_id].get("status") != "running":
-                                logger.warning(f"المهمة {task_id} لم تعد في حالة تشغيل، الخروج من الحلقة.")
-                                break
-                        
-                        # التحقق من حدث التوقف قبل كل دورة
-                        if stop_event.is_set():
-                            logger.info(f"تم تعيين حدث التوقف للمهمة {task_id}، الخروج من الحلقة.")
-                            break
-                        
-                        # إرسال الرسالة إلى جميع المجموعات
-                        for group_id in group_ids:
-                            try:
-                                # محاولة الحصول على الكيان
-                                try:
-                                    # محاولة التعامل مع المعرف كرقم
-                                    try:
-                                        numeric_group_id = int(group_id)
-                                        entity = await client.get_entity(numeric_group_id)
-                                    except ValueError:
-                                        # ربما اسم مستخدم مثل @channelname
-                                        entity = await client.get_entity(group_id)
-                                except ValueError as e:
-                                    logger.error(f"معرف المجموعة غير صالح للمهمة {task_id}: {group_id} - {str(e)}")
-                                    continue
-                                except Exception as e:
-                                    logger.error(f"خطأ في الحصول على كيان المجموعة للمهمة {task_id}: {group_id} - {str(e)}")
-                                    
-                                    # محاولة الانضمام إذا كانت قناة عامة
-                                    if isinstance(group_id, str) and group_id.startswith('@'):
-                                        try:
-                                            logger.info(f"محاولة الانضمام إلى القناة العامة للمهمة {task_id}: {group_id}")
-                                            await client(JoinChannelRequest(group_id))
-                                            entity = await client.get_entity(group_id)
-                                            logger.info(f"تم الانضمام بنجاح إلى القناة للمهمة {task_id}: {group_id}")
-                                        except Exception as join_error:
-                                            logger.error(f"فشل الانضمام إلى القناة للمهمة {task_id}: {group_id} - {str(join_error)}")
-                                            continue
-                                    else:
-                                        continue
-                                
-                                # إرسال الرسالة
-                                await client.send_message(entity, message)
-                                logger.info(f"تم إرسال الرسالة بنجاح للمهمة {task_id} إلى المجموعة: {group_id}")
+                    # التحقق مما إذا كانت المهمة متكررة
+                    with self.tasks_lock:
+                        if task_id in self.active_tasks:
+                            is_recurring = self.active_tasks[task_id].get("is_recurring", True)
+                            if not is_recurring:
+                                logger.info(f"المهمة {task_id} غير متكررة، الانتهاء بعد دورة واحدة.")
+                                self.active_tasks[task_id]["status"] = "completed"
+                                self.active_tasks[task_id]["last_activity"] = datetime.now()
                                 
-                                # تحديث عداد الرسائل
-                                with self.tasks_lock:
-                                    if task_id in self.active_tasks:
-                                        current_count = self.active_tasks[task_id].get("message_count", 0)
-                                        self.active_tasks[task_id]["message_count"] = current_count + 1
-                                        self.active_tasks[task_id]["last_activity"] = datetime.now()
-                            except FloodWaitError as flood_error:
-                                wait_time = flood_error.seconds
-                                logger.warning(f"انتظار فيضان للمهمة {task_id} عند الإرسال إلى {group_id}. الانتظار {wait_time}ث.")
+                                # حفظ الحالة بعد إكمال المهمة غير المتكررة
+                                save_result = self.save_active_tasks()
+                                if save_result:
+                                    logger.info(f"تم حفظ حالة المهام بعد إكمال المهمة غير المتكررة {task_id}")
+                                else:
+                                    logger.warning(f"فشل حفظ حالة المهام بعد إكمال المهمة غير المتكررة {task_id}")
                                 
-                                # انتظار حتى انتهاء وقت الانتظار أو حتى يتم تعيين حدث التوقف
-                                try:
-                                    wait_task = asyncio.create_task(asyncio.sleep(wait_time))
-                                    
-                                    async def check_stop_event_flood():
-                                        while not stop_event.is_set():
-                                            await asyncio.sleep(0.5)
-                                            if stop_event.is_set():
-                                                return True
-                                        return True
-                                    
-                                    stop_check_task = asyncio.create_task(check_stop_event_flood())
-                                    
-                                    done, pending = await asyncio.wait(
-                                        [wait_task, stop_check_task],
-                                        return_when=asyncio.FIRST_COMPLETED
-                                    )
-                                    
-                                    for task in pending:
-                                        task.cancel()
-                                    
-                                    if stop_event.is_set():
-                                        logger.info(f"تم إيقاف المهمة {task_id} أثناء انتظار الفيضان")
-                                        return
-                                except Exception as wait_error:
-                                    logger.error(f"خطأ أثناء انتظار الفيضان للمهمة {task_id}: {str(wait_error)}")
-                            except (ChannelPrivateError, ChatAdminRequiredError) as perm_error:
-                                logger.error(f"خطأ في الصلاحيات للمهمة {task_id} عند الإرسال إلى {group_id}: {str(perm_error)}")
-                                continue
-                            except Exception as e:
-                                logger.error(f"خطأ غير متوقع للمهمة {task_id} عند الإرسال إلى {group_id}: {str(e)}")
-                                continue
-                        
-                        # حفظ الحالة بعد كل دورة إرسال ناجحة
-                        save_result = self.save_active_tasks()
-                        if save_result:
-                            logger.info(f"تم حفظ حالة المهام بعد دورة إرسال ناجحة للمهمة {task_id}")
-                        else:
-                            logger.warning(f"فشل حفظ حالة المهام بعد دورة إرسال ناجحة للمهمة {task_id}")
-                        
-                        # التحقق مما إذا كانت المهمة متكررة
-                        with self.tasks_lock:
-                            if task_id in self.active_tasks:
-                                is_recurring = self.active_tasks[task_id].get("is_recurring", True)
-                                if not is_recurring:
-                                    logger.info(f"المهمة {task_id} غير متكررة، الانتهاء بعد دورة واحدة.")
-                                    self.active_tasks[task_id]["status"] = "completed"
-                                    self.active_tasks[task_id]["last_activity"] = datetime.now()
-                                    
-                                    # حفظ الحالة بعد إكمال المهمة غير المتكررة
-                                    save_result = self.save_active_tasks()
-                                    if save_result:
-                                        logger.info(f"تم حفظ حالة المهام بعد إكمال المهمة غير المتكررة {task_id}")
-                                    else:
-                                        logger.warning(f"فشل حفظ حالة المهام بعد إكمال المهمة غير المتكررة {task_id}")
-                                    
-                                    break  # الخروج من الحلقة
-                        
-                        # الانتظار قبل الدورة التالية
-                        wait_time = delay_seconds if delay_seconds and delay_seconds > 0 else 3600  # افتراضي 1 ساعة
-                        logger.info(f"المهمة {task_id} ستنتظر {wait_time}ث قبل الدورة التالية.")
-                        
-                        # انتظار حتى انتهاء وقت الانتظار أو حتى يتم تعيين حدث التوقف
-                        try:
-                            wait_task = asyncio.create_task(asyncio.sleep(wait_time))
-                            
-                            async def check_stop_event_delay():
-                                while not stop_event.is_set():
-                                    await asyncio.sleep(0.5)
-                                    if stop_event.is_set():
-                                        return True
-                                return True
-                            
-                            stop_check_task = asyncio.create_task(check_stop_event_delay())
-                            
-                            done, pending = await asyncio.wait(
-                                [wait_task, stop_check_task],
-                                return_when=asyncio.FIRST_COMPLETED
-                            )
-                            
-                            for task in pending:
-                                task.cancel()
-                            
-                            if stop_event.is_set():
-                                logger.info(f"تم إيقاف المهمة {task_id} أثناء الانتظار بين الدورات")
-                                break
-                        except Exception as wait_error:
-                            logger.error(f"خطأ أثناء الانتظار بين الدورات للمهمة {task_id}: {str(wait_error)}")
-                    except Exception as cycle_error:
-                        logger.error(f"خطأ في دورة النشر للمهمة {task_id}: {str(cycle_error)}")
-                        
-                        # تحديث وقت النشاط الأخير
-                        with self.tasks_lock:
-                            if task_id in self.active_tasks:
-                                self.active_tasks[task_id]["last_activity"] = datetime.now()
-                        
-                        # الانتظار قبل المحاولة مرة أخرى
-                        try:
-                            logger.info(f"المهمة {task_id} ستنتظر 60ث قبل المحاولة مرة أخرى بعد الخطأ.")
-                            
-                            wait_task = asyncio.create_task(asyncio.sleep(60))  # انتظار 1 دقيقة قبل المحاولة مرة أخرى
-                            
-                            async def check_stop_event_error():
-                                while not stop_event.is_set():
-                                    await asyncio.sleep(0.5)
-                                    if stop_event.is_set():
-                                        return True
-                                return True
-                            
-                            stop_check_task = asyncio.create_task(check_stop_event_error())
-                            
-                            done, pending = await asyncio.wait(
-                                [wait_task, stop_check_task],
-                                return_when=asyncio.FIRST_COMPLETED
-                            )
-                            
-                            for task in pending:
-                                task.cancel()
-                            
-                            if stop_event.is_set():
-                                logger.info(f"تم إيقاف المهمة {task_id} أثناء الانتظار بعد الخطأ")
-                                break
-                        except Exception as wait_error:
-                            logger.error(f"خطأ أثناء الانتظار بعد الخطأ للمهمة {task_id}: {str(wait_error)}")
-                
-                # نهاية الحلقة while
-                logger.info(f"تم الخروج من حلقة النشر للمهمة {task_id}")
-                
-                # تحديث حالة المهمة إذا تم تعيين حدث التوقف
-                if stop_event.is_set():
+                                break  # الخروج من الحلقة
+                    
+                    # الانتظار قبل الدورة التالية
+                    wait_time = delay_seconds if delay_seconds and delay_seconds > 0 else 3600  # افتراضي 1 ساعة
+                    logger.info(f"المهمة {task_id} ستنتظر {wait_time}ث قبل الدورة التالية.")
+                    
+                    # انتظار حتى انتهاء وقت الانتظار أو حتى يتم تعيين حدث التوقف
+                    if await self._wait_or_stop(stop_event, wait_time):
+                        logger.info(f"تم إيقاف المهمة {task_id} أثناء الانتظار بين الدورات")
+                        break
+                except Exception as cycle_error:
+                    logger.error(f"خطأ في دورة النشر للمهمة {task_id}: {str(cycle_error)}")
+                    
+                    # تحديث وقت النشاط الأخير
                     with self.tasks_lock:
                         if task_id in self.active_tasks:
-                            self.active_tasks[task_id]["status"] = "stopped"
                             self.active_tasks[task_id]["last_activity"] = datetime.now()
                     
-                    # حفظ الحالة بعد إيقاف المهمة
-                    save_result = self.save_active_tasks()
-                    if save_result:
-                        logger.info(f"تم حفظ حالة المهام بعد إيقاف المهمة {task_id}")
-                    else:
-                        logger.warning(f"فشل حفظ حالة المهام بعد إيقاف المهمة {task_id}")
-            except Exception as e:
-                logger.error(f"خطأ غير متوقع في الروتين المشترك للمهمة {task_id}: {str(e)}")
-                
+                    # الانتظار دقيقة واحدة قبل المحاولة مرة أخرى
+                    logger.info(f"المهمة {task_id} ستنتظر 60ث قبل المحاولة مرة أخرى بعد الخطأ.")
+                    if await self._wait_or_stop(stop_event, 60):
+                        logger.info(f"تم إيقاف المهمة {task_id} أثناء الانتظار بعد الخطأ")
+                        break
+            
+            # نهاية الحلقة while
+            logger.info(f"تم الخروج من حلقة النشر للمهمة {task_id}")
+            
+            # تحديث حالة المهمة إذا تم تعيين حدث التوقف
+            if stop_event.is_set():
                 with self.tasks_lock:
                     if task_id in self.active_tasks:
-                        self.active_tasks[task_id]["status"] = "failed"
+                        self.active_tasks[task_id]["status"] = "stopped"
                         self.active_tasks[task_id]["last_activity"] = datetime.now()
                 
-                # حفظ الحالة بعد فشل المهمة
+                # حفظ الحالة بعد إيقاف المهمة
                 save_result = self.save_active_tasks()
                 if save_result:
-                    logger.info(f"تم حفظ حالة المهام بعد فشل المهمة {task_id} بسبب خطأ غير متوقع")
+                    logger.info(f"تم حفظ حالة المهام بعد إيقاف المهمة {task_id}")
                 else:
-                    logger.warning(f"فشل حفظ حالة المهام بعد فشل المهمة {task_id} بسبب خطأ غير متوقع")
-            finally:
-                # التأكد من إغلاق العميل
-                if client.is_connected():
-                    try:
-                        await client.disconnect()
-                        logger.info(f"تم قطع اتصال العميل للمهمة {task_id}")
-                    except Exception as disconnect_error:
-                        logger.error(f"خطأ أثناء قطع اتصال العميل للمهمة {task_id}: {str(disconnect_error)}")
-        
-        try:
-            # تنفيذ الروتين المشترك
-            loop.run_until_complete(task_coroutine())
+                    logger.warning(f"فشل حفظ حالة المهام بعد إيقاف المهمة {task_id}")
         except Exception as e:
-            logger.error(f"خطأ في تنفيذ الروتين المشترك للمهمة {task_id}: {str(e)}")
+            logger.error(f"خطأ غير متوقع في الروتين المشترك للمهمة {task_id}: {str(e)}")
             
             with self.tasks_lock:
                 if task_id in self.active_tasks:
@@ -850,38 +874,238 @@ class PostingService:
             # حفظ الحالة بعد فشل المهمة
             save_result = self.save_active_tasks()
             if save_result:
-                logger.info(f"تم حفظ حالة المهام بعد فشل المهمة {task_id} بسبب خطأ في تنفيذ الروتين المشترك")
+                logger.info(f"تم حفظ حالة المهام بعد فشل المهمة {task_id} بسبب خطأ غير متوقع")
             else:
-                logger.warning(f"فشل حفظ حالة المهام بعد فشل المهمة {task_id} بسبب خطأ في تنفيذ الروتين المشترك")
+                logger.warning(f"فشل حفظ حالة المهام بعد فشل المهمة {task_id} بسبب خطأ غير متوقع")
         finally:
-            # إغلاق الحلقة
+            # إرجاع العميل إلى المجمع (يتم قطع الاتصال لاحقاً عند الخمول)
+            if client is not None:
+                try:
+                    await client_pool.release(client)
+                    logger.info(f"تم إرجاع عميل المهمة {task_id} إلى المجمع")
+                except Exception as release_error:
+                    logger.error(f"خطأ أثناء إرجاع عميل المهمة {task_id} إلى المجمع: {str(release_error)}")
+    
+    @staticmethod
+    def _parse_task_time(value):
+        """تحويل وقت مخزن (datetime أو نص ISO أو تنسيقات شائعة) إلى datetime، أو None إذا تعذر"""
+        if value is None or isinstance(value, datetime):
+            return value
+        for parse in (
+            datetime.fromisoformat,
+            lambda text: datetime.strptime(text, "%Y-%m-%d %H:%M:%S"),
+            lambda text: datetime.strptime(text, "%Y-%m-%dT%H:%M:%S"),
+        ):
             try:
-                loop.close()
-                logger.info(f"تم إغلاق حلقة الأحداث للمهمة {task_id}")
-            except Exception as loop_error:
-                logger.error(f"خطأ أثناء إغلاق حلقة الأحداث للمهمة {task_id}: {str(loop_error)}")
+                return parse(value)
+            except (TypeError, ValueError):
+                continue
+        logger.error(f"تعذر تحويل الوقت المحدد: {value}")
+        return None
+    
+    def _record_cycle_results(self, task_id, group_ids, results):
+        """حفظ ملخص نتائج الدورة (بترتيب المجموعات) في بيانات المهمة"""
+        cycle_summary = {"sent": 0, "skipped": 0, "failed": 0, "pending": 0}
+        for result in results:
+            cycle_summary[result if result in cycle_summary else "pending"] += 1
+        cycle_summary["failed_groups"] = [
+            group_ids[index] for index, result in enumerate(results) if result == "failed"
+        ]
+        with self.tasks_lock:
+            if task_id in self.active_tasks:
+                self.active_tasks[task_id]["last_cycle"] = cycle_summary
+        logger.info(f"نتائج دورة المهمة {task_id}: {cycle_summary}")
+        return cycle_summary
+    
+    async def _send_cycle(self, client, task_id, user_id, group_ids, message, concurrency, stop_event, posting_mode="send"):
+        """إرسال الرسالة إلى جميع مجموعات المهمة بعدد عمال لا يتجاوز concurrency.
+        في وضع forward تُنشر الرسالة مرة واحدة في الرسائل المحفوظة ثم تُحوَّل نسخها إلى المجموعات.
+        تُرجع قائمة نتائج بنفس ترتيب group_ids (sent/skipped/failed، أو None لما لم يُرسل بسبب التوقف)"""
+        results = [None] * len(group_ids)
+        positions = iter(range(len(group_ids)))
+        
+        # تحميل ذاكرة كيانات المستخدم مرة واحدة للدورة (من صفوف groups عند أول طلب فقط)
+        peers = await asyncio.get_running_loop().run_in_executor(None, peer_cache.get_user_peers, user_id)
+        
+        staged_message = None
+        if posting_mode == "forward" and group_ids:
+            staged_message = await self._stage_message(client, task_id, message)
+        
+        async def worker():
+            for index in positions:
+                if stop_event.is_set():
+                    return
+                results[index] = await self._send_to_group(
+                    client, task_id, user_id, group_ids[index], message, stop_event, staged_message, peers
+                )
+        
+        try:
+            workers = min(concurrency, len(group_ids))
+            if workers <= 1:
+                await worker()
+            else:
+                await asyncio.gather(*(worker() for _ in range(workers)))
+        finally:
+            if staged_message is not None:
+                # النسخ المحولة مع drop_author مستقلة عن الأصل، لذا يمكن حذف الرسالة المرحلية
+                try:
+                    await client.delete_messages("me", [staged_message.id])
+                except Exception as e:
+                    logger.error(f"تعذر حذف الرسالة المرحلية للمهمة {task_id}: {str(e)}")
+        return results
+    
+    async def _stage_message(self, client, task_id, message):
+        """نشر محتوى الدورة مرة واحدة في الرسائل المحفوظة؛ عند الفشل تعود الدورة إلى الإرسال المباشر"""
+        try:
+            staged_message = await client.send_message("me", message)
+            logger.info(f"تم نشر الرسالة المرحلية للمهمة {task_id} في الرسائل المحفوظة")
+            return staged_message
+        except Exception as e:
+            logger.error(f"فشل نشر الرسالة المرحلية للمهمة {task_id}، استخدام الإرسال المباشر لهذه الدورة: {str(e)}")
+            return None
+    
+    async def _send_to_group(self, client, task_id, user_id, group_id, message, stop_event, staged_message=None, peers=None):
+        """إرسال الرسالة إلى مجموعة واحدة (أو تحويل الرسالة المرحلية) مع احترام محدد المعدل وحدث التوقف"""
+        from telethon.errors import (
+            FloodWaitError, ChannelPrivateError, ChatAdminRequiredError,
+            ChannelInvalidError, PeerIdInvalidError, ChatIdInvalidError
+        )
+        from telethon.tl.functions.messages import ForwardMessagesRequest
+        from telethon.tl.types import InputPeerSelf
+        
+        try:
+            # الحصول على الكيان من ذاكرة InputPeer أو من تيليجرام عند عدم وجوده
+            entity = await self._resolve_group_entity(client, task_id, user_id, group_id, peers)
+            if entity is None:
+                return "skipped"
             
-            # تنظيف الموارد
+            # انتظار دور الإرسال حسب محدد معدل الحساب
+            rate_delay = self.rate_limiter.reserve(user_id, group_id)
+            if await self._wait_or_stop(stop_event, rate_delay):
+                # إرجاع الرمز المحجوز حتى لا تتأخر المهمة التالية للحساب بإرسال لم يحدث
+                self.rate_limiter.refund(user_id, group_id)
+                logger.info(f"تم إيقاف المهمة {task_id} أثناء انتظار محدد المعدل")
+                return None
+            
+            # إرسال الرسالة، أو تحويل نسخة من الرسالة المرحلية دون اسم المرسل الأصلي
+            if staged_message is not None:
+                await client(ForwardMessagesRequest(
+                    from_peer=InputPeerSelf(),
+                    id=[staged_message.id],
+                    to_peer=entity,
+                    drop_author=True
+                ))
+            else:
+                await client.send_message(entity, message)
+            self.rate_limiter.report_success(user_id)
+            logger.info(f"تم إرسال الرسالة بنجاح للمهمة {task_id} إلى المجموعة: {group_id}")
+            
+            # تحديث عداد الرسائل
             with self.tasks_lock:
-                # إزالة المهمة من قاموس خيوط المستخدمين إذا كانت هذه المهمة هي المهمة النشطة الحالية للمستخدم - تحسين جديد
-                if user_id in self.user_threads and self.user_threads[user_id] == task_id:
-                    del self.user_threads[user_id]
-                    logger.info(f"تم إزالة المهمة {task_id} من قاموس خيوط المستخدم {user_id}")
-                
-                # إزالة الخيط من قاموس الخيوط
-                if task_id in self.task_threads:
-                    del self.task_threads[task_id]
-                
-                # إزالة حدث التوقف من قاموس الأحداث
-                if task_id in self.task_events:
-                    del self.task_events[task_id]
+                if task_id in self.active_tasks:
+                    current_count = self.active_tasks[task_id].get("message_count", 0)
+                    self.active_tasks[task_id]["message_count"] = current_count + 1
+                    self.active_tasks[task_id]["last_activity"] = datetime.now()
+            return "sent"
+        except FloodWaitError as flood_error:
+            wait_time = flood_error.seconds
+            logger.warning(f"انتظار فيضان للمهمة {task_id} عند الإرسال إلى {group_id}. الانتظار {wait_time}ث.")
+            # إبلاغ محدد المعدل ليخفض معدل الحساب ويحظر الإرسال حتى انتهاء المدة
+            self.rate_limiter.report_flood_wait(user_id, wait_time, group_id)
             
-            # حفظ الحالة النهائية
-            save_result = self.save_active_tasks()
-            if save_result:
-                logger.info(f"تم حفظ حالة المهام النهائية بعد انتهاء المهمة {task_id}")
+            # انتظار حتى انتهاء وقت الانتظار أو حتى يتم تعيين حدث التوقف
+            if await self._wait_or_stop(stop_event, wait_time):
+                logger.info(f"تم إيقاف المهمة {task_id} أثناء انتظار الفيضان")
+            return "failed"
+        except (ChannelPrivateError, ChannelInvalidError, PeerIdInvalidError, ChatIdInvalidError) as peer_error:
+            # الكيان المخزن لم يعد صالحاً، إبطاله ليتم حله من جديد في الدورة التالية
+            logger.error(f"كيان غير صالح للمهمة {task_id} عند الإرسال إلى {group_id}: {str(peer_error)}")
+            await asyncio.get_running_loop().run_in_executor(None, peer_cache.invalidate, user_id, group_id)
+            return "failed"
+        except ChatAdminRequiredError as perm_error:
+            logger.error(f"خطأ في الصلاحيات للمهمة {task_id} عند الإرسال إلى {group_id}: {str(perm_error)}")
+            return "failed"
+        except Exception as e:
+            logger.error(f"خطأ غير متوقع للمهمة {task_id} عند الإرسال إلى {group_id}: {str(e)}")
+            return "failed"
+    
+    async def _wait_or_stop(self, stop_event, seconds):
+        """الانتظار مدة محددة أو حتى تعيين حدث التوقف؛ تُرجع True إذا تم إيقاف المهمة"""
+        if seconds <= 0:
+            return stop_event.is_set()
+        return await stop_event.wait_async(seconds)
+    
+    async def _resolve_group_entity(self, client, task_id, user_id, group_id, peers=None):
+        """الحصول على كيان المجموعة: من ذاكرة InputPeer المخزنة أولاً، ثم من تيليجرام وتخزينه
+        peers هي خريطة كيانات المستخدم المحملة مرة واحدة للدورة؛ الإبطال يحذف منها مباشرة
+        فيصبح السجل مفقوداً ويُحل من جديد. يُرجع None إذا تعذر الحصول على الكيان"""
+        from telethon.tl.functions.channels import JoinChannelRequest
+        
+        loop = asyncio.get_running_loop()
+        
+        if peers is None:
+            peers = await loop.run_in_executor(None, peer_cache.get_user_peers, user_id)
+        record = peers.get(str(group_id))
+        if record is not None:
+            input_peer = input_peer_from_record(record)
+            if input_peer is not None:
+                return input_peer
+        
+        try:
+            # محاولة التعامل مع المعرف كرقم
+            try:
+                numeric_group_id = int(group_id)
+                entity = await client.get_entity(numeric_group_id)
+            except ValueError:
+                # ربما اسم مستخدم مثل @channelname
+                entity = await client.get_entity(group_id)
+        except ValueError as e:
+            logger.error(f"معرف المجموعة غير صالح للمهمة {task_id}: {group_id} - {str(e)}")
+            return None
+        except Exception as e:
+            logger.error(f"خطأ في الحصول على كيان المجموعة للمهمة {task_id}: {group_id} - {str(e)}")
+            
+            # محاولة الانضمام إذا كانت قناة عامة
+            if isinstance(group_id, str) and group_id.startswith('@'):
+                try:
+                    logger.info(f"محاولة الانضمام إلى القناة العامة للمهمة {task_id}: {group_id}")
+                    await client(JoinChannelRequest(group_id))
+                    entity = await client.get_entity(group_id)
+                    logger.info(f"تم الانضمام بنجاح إلى القناة للمهمة {task_id}: {group_id}")
+                except Exception as join_error:
+                    logger.error(f"فشل الانضمام إلى القناة للمهمة {task_id}: {group_id} - {str(join_error)}")
+                    return None
             else:
-                logger.warning(f"فشل حفظ حالة المهام النهائية بعد انتهاء المهمة {task_id}")
+                return None
+        
+        # تخزين الكيان المحلول لتجنب طلبات get_entity في الدورات التالية
+        try:
+            peer = peer_from_entity(entity)
+            if peer is not None:
+                await loop.run_in_executor(None, peer_cache.store, user_id, group_id, peer)
+        except Exception as cache_error:
+            logger.error(f"خطأ في تخزين كيان المجموعة {group_id} للمهمة {task_id}: {str(cache_error)}")
+        
+        return entity
+    
+    def _finalize_task(self, task_id, user_id):
+        """تنظيف موارد المهمة بعد انتهاء الروتين المشترك"""
+        with self.tasks_lock:
+            # إزالة المهمة من قاموس خيوط المستخدمين إذا كانت هذه المهمة هي المهمة النشطة الحالية للمستخدم - تحسين جديد
+            if user_id in self.user_threads and self.user_threads[user_id] == task_id:
+                del self.user_threads[user_id]
+                logger.info(f"تم إزالة المهمة {task_id} من قاموس خيوط المستخدم {user_id}")
+            
+            # إزالة حدث التوقف من قاموس الأحداث
+            if task_id in self.task_events:
+                del self.task_events[task_id]
+        
+        # حفظ الحالة النهائية
+        save_result = self.save_active_tasks()
+        if save_result:
+            logger.info(f"تم حفظ حالة المهام النهائية بعد انتهاء المهمة {task_id}")
+        else:
+            logger.warning(f"فشل حفظ حالة المهام النهائية بعد انتهاء المهمة {task_id}")
     
     def _stop_task_internal(self, task_id):
         """إيقاف مهمة داخليًا"""
@@ -898,6 +1122,11 @@ class PostingService:
             self.task_events[task_id].set()
             logger.info(f"تم تعيين حدث التوقف للمهمة {task_id}")
             
+            # المهمة تنتظر موعدها في المجدول (لا توجد دورة جارية): إنهاؤها مباشرة
+            if self.scheduler is not None and self.scheduler.cancel(task_id):
+                self._finalize_stopped_task(task_id, self.active_tasks[task_id].get("user_id"))
+                return True
+            
             # تحديث حالة المهمة
             self.active_tasks[task_id]["status"] = "stopping"
             self.active_tasks[task_id]["last_activity"] = datetime.now()
@@ -950,10 +1179,14 @@ class PostingService:
         return stopped_count
     
     def get_task_status(self, task_id):
-        """الحصول على بيانات حالة مهمة محددة"""
+        """الحصول على بيانات حالة مهمة محددة مع حالة محدد معدل الحساب"""
         with self.tasks_lock:
             task_data = self.active_tasks.get(task_id)
-            return task_data.copy() if task_data else None
+            if not task_data:
+                return None
+            status = task_data.copy()
+        status["rate_limit"] = self.rate_limiter.get_state(status.get("user_id"))
+        return status
     
     def get_all_tasks_status(self, user_id=None):
         """الحصول على بيانات حالة جميع المهام أو مهام مستخدم محدد"""
@@ -966,14 +1199,30 @@ class PostingService:
                 all_tasks_copy = {tid: tdata.copy() for tid, tdata in self.active_tasks.items()}
                 return list(all_tasks_copy.values()) # إرجاع قائمة من قواميس بيانات جميع المهام
 
+    def get_engine_stats(self):
+        """الحصول على إحصائيات محرك النشر (الوضع، عدد الحلقات والخيوط والروتينات)"""
+        with self.tasks_lock:
+            stats = {
+                "mode": self.engine_mode,
+                "task_threads": sum(1 for thread in self.task_threads.values() if thread.is_alive()),
+                "task_coroutines": sum(1 for future in self.task_futures.values() if not future.done()),
+            }
+        if self.engine is not None:
+            stats["engine"] = self.engine.get_stats()
+        if self.scheduler is not None:
+            stats["scheduler"] = self.scheduler.get_stats()
+        return stats
 
     def clear_all_tasks_permanently(self):
         """مسح جميع المهام النشطة بشكل دائم."""
         with self.tasks_lock:
             self.active_tasks = {}
             self.task_threads = {}
+            self.task_futures = {}
             self.task_events = {}
             self.user_threads = {}
+        if self.scheduler is not None:
+            self.scheduler.clear()
         self.save_active_tasks()
         logger.info("تم مسح جميع المهام النشطة بشكل دائم.")
         return True, "تم مسح جميع المهام النشطة بنجاح."
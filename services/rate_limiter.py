@@ -0,0 +1,126 @@
+import logging
+import threading
+import time
+
+# تكوين التسجيل
+logger = logging.getLogger(__name__)
+
+
+class _AccountBucket:
+    """دلو رموز لحساب واحد مع معدل متكيف وحظر مؤقت بعد FloodWait"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.flood_waits = 0
+        self.last_flood_seconds = 0
+        self.chat_next_allowed = {}  # {chat_id: أقرب وقت مسموح للإرسال}
+
+    def refill(self, now):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(float(self.burst), self.tokens + elapsed * self.rate)
+            self.updated = now
+
+
+class AccountRateLimiter:
+    """محدد معدل بدلو رموز لكل حساب تيليجرام (واختيارياً لكل محادثة وجهة).
+
+    reserve() يحجز رمزاً ويُرجع مدة الانتظار اللازمة قبل الإرسال، فيستطيع المستدعي الانتظار
+    بطريقته الخاصة (مع مراقبة حدث التوقف). يتكيف المعدل بأسلوب AIMD: يُخفض عند كل FloodWait
+    ويرتفع تدريجياً مع كل إرسال ناجح حتى الحد الأقصى."""
+
+    def __init__(self, rate=20.0, burst=20, min_rate=0.02, max_rate=None,
+                 backoff_factor=0.5, recovery_step=0.05, per_chat_interval=0):
+        self.initial_rate = rate
+        self.burst = max(1, int(burst))
+        self.min_rate = min_rate
+        # بعد FloodWait يعود المعدل تدريجياً حتى المعدل المضبوط (أو max_rate إذا كان أعلى)
+        self.max_rate = max(max_rate or rate, rate)
+        self.backoff_factor = backoff_factor
+        self.recovery_step = recovery_step
+        self.per_chat_interval = per_chat_interval
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, account_key):
+        bucket = self._buckets.get(account_key)
+        if bucket is None:
+            bucket = _AccountBucket(self.initial_rate, self.burst)
+            self._buckets[account_key] = bucket
+        return bucket
+
+    def reserve(self, account_key, chat_id=None):
+        """حجز رمز إرسال للحساب وإرجاع عدد الثواني الواجب انتظارها قبل الإرسال (0 للإرسال فوراً)"""
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._bucket(account_key)
+            bucket.refill(now)
+
+            # يمكن أن يصبح الرصيد سالباً: كل رمز محجوز مسبقاً يؤخر الحجز التالي بمقدار 1/rate
+            bucket.tokens -= 1
+            delay = 0.0 if bucket.tokens >= 0 else -bucket.tokens / bucket.rate
+            delay = max(delay, bucket.blocked_until - now)
+
+            if chat_id is not None and self.per_chat_interval > 0:
+                chat_key = str(chat_id)
+                send_at = max(now + delay, bucket.chat_next_allowed.get(chat_key, 0.0))
+                bucket.chat_next_allowed[chat_key] = send_at + self.per_chat_interval
+                delay = send_at - now
+
+            return max(0.0, delay)
+
+    def refund(self, account_key, chat_id=None):
+        """إرجاع رمز محجوز لم يُستخدم (توقفت المهمة أثناء انتظار دورها)"""
+        with self._lock:
+            bucket = self._buckets.get(account_key)
+            if bucket is None:
+                return
+            bucket.refill(time.monotonic())
+            bucket.tokens = min(float(bucket.burst), bucket.tokens + 1)
+            if chat_id is not None and self.per_chat_interval > 0:
+                chat_key = str(chat_id)
+                if chat_key in bucket.chat_next_allowed:
+                    bucket.chat_next_allowed[chat_key] -= self.per_chat_interval
+
+    def report_success(self, account_key):
+        """زيادة المعدل تدريجياً بعد إرسال ناجح"""
+        with self._lock:
+            bucket = self._bucket(account_key)
+            bucket.rate = min(self.max_rate, bucket.rate + self.recovery_step)
+
+    def report_flood_wait(self, account_key, seconds, chat_id=None):
+        """تسجيل FloodWait: حظر الحساب حتى انتهاء المدة وخفض المعدل"""
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._bucket(account_key)
+            bucket.refill(now)
+            bucket.blocked_until = max(bucket.blocked_until, now + seconds)
+            bucket.rate = max(self.min_rate, bucket.rate * self.backoff_factor)
+            # بدء الاستئناف برصيد فارغ حتى لا تُرسل دفعة كاملة فور انتهاء الحظر
+            bucket.tokens = min(bucket.tokens, 0.0)
+            bucket.flood_waits += 1
+            bucket.last_flood_seconds = seconds
+            if chat_id is not None and self.per_chat_interval > 0:
+                bucket.chat_next_allowed[str(chat_id)] = now + seconds + self.per_chat_interval
+            logger.warning(f"FloodWait للحساب {account_key} لمدة {seconds}ث، المعدل الجديد {bucket.rate:.3f} رسالة/ث")
+
+    def get_state(self, account_key):
+        """الحالة الحالية لدلو الحساب (للعرض في حالة المهمة)"""
+        with self._lock:
+            bucket = self._buckets.get(account_key)
+            if bucket is None:
+                return None
+            now = time.monotonic()
+            bucket.refill(now)
+            return {
+                "rate_per_second": round(bucket.rate, 4),
+                "tokens": round(bucket.tokens, 2),
+                "burst": bucket.burst,
+                "blocked_for_seconds": round(max(0.0, bucket.blocked_until - now), 1),
+                "flood_waits": bucket.flood_waits,
+                "last_flood_seconds": bucket.last_flood_seconds,
+            }
@@ -0,0 +1,132 @@
+import asyncio
+import heapq
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingReply:
+    __slots__ = ("chat", "reply_to", "text", "on_sent", "due")
+
+    def __init__(self, chat, reply_to, text, on_sent, due):
+        self.chat = chat
+        self.reply_to = reply_to
+        self.text = text
+        self.on_sent = on_sent
+        self.due = due
+
+
+class ReplyScheduler:
+    """
+    Delayed auto-replies of one account, sent from a single task instead of one sleeping handler per message.
+
+    Pending replies sit in a heap ordered by due time, at most one per chat:
+    - a new message in a chat that already has a pending reply is merged into it
+      (the reply keeps its due time and answers the newest message);
+    - a chat that got a reply less than chat_window seconds ago gets no new one;
+    - when max_pending chats are waiting, new replies are dropped.
+    Only the chat, message ID and text are kept, not the Telethon event.
+    """
+
+    def __init__(self, client, max_pending=100, chat_window=30.0):
+        self.client = client
+        self.max_pending = max_pending
+        self.chat_window = chat_window
+        self._heap = []  # [(due, seq, chat_key)]
+        self._pending = {}  # {chat_key: _PendingReply}
+        self._last_sent = {}  # {chat_key: monotonic time of the last reply}
+        self._seq = 0
+        self._wakeup = None
+        self._task = None
+        self.stats = {"scheduled": 0, "merged": 0, "throttled": 0, "dropped": 0, "sent": 0, "failed": 0}
+
+    def schedule(self, chat_key, chat, reply_to, text, delay, on_sent=None):
+        """
+        Queue a reply to message reply_to in chat after delay seconds (call from the client's event loop).
+        on_sent() runs after a successful send. Returns 'scheduled', 'merged', 'throttled' or 'dropped'.
+        """
+        now = time.monotonic()
+        pending = self._pending.get(chat_key)
+        if pending is not None:
+            pending.chat, pending.reply_to, pending.text, pending.on_sent = chat, reply_to, text, on_sent
+            self.stats["merged"] += 1
+            return "merged"
+
+        if len(self._last_sent) > self.max_pending * 10:
+            self._forget_old_chats()
+        last_sent = self._last_sent.get(chat_key)
+        if last_sent is not None and now - last_sent < self.chat_window:
+            self.stats["throttled"] += 1
+            return "throttled"
+
+        if len(self._pending) >= self.max_pending:
+            self.stats["dropped"] += 1
+            return "dropped"
+
+        due = now + delay
+        self._pending[chat_key] = _PendingReply(chat, reply_to, text, on_sent, due)
+        self._seq += 1
+        heapq.heappush(self._heap, (due, self._seq, chat_key))
+        self.stats["scheduled"] += 1
+
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        elif self._heap[0][2] == chat_key:
+            # The new reply is due before the one the task is sleeping on
+            self._wakeup.set()
+        return "scheduled"
+
+    async def _run(self):
+        while self._heap:
+            due, _, chat_key = self._heap[0]
+            timeout = due - time.monotonic()
+            if timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            pending = self._pending.pop(chat_key, None)
+            if pending is None:
+                continue
+            await self._send(chat_key, pending)
+        self._forget_old_chats()
+
+    async def _send(self, chat_key, pending):
+        try:
+            await self.client.send_message(pending.chat, pending.text, reply_to=pending.reply_to)
+            self._last_sent[chat_key] = time.monotonic()
+            self.stats["sent"] += 1
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.error(f"Error sending auto-reply: {str(e)}")
+            return
+        if pending.on_sent is not None:
+            try:
+                pending.on_sent()
+            except Exception as e:
+                logger.error(f"Error after sending auto-reply: {str(e)}")
+
+    def _forget_old_chats(self):
+        """Drop send times older than the window so _last_sent stays bounded"""
+        cutoff = time.monotonic() - self.chat_window
+        self._last_sent = {chat_key: sent for chat_key, sent in self._last_sent.items() if sent >= cutoff}
+
+    def pending_count(self):
+        return len(self._pending)
+
+    def get_stats(self):
+        return dict(self.stats, pending=len(self._pending))
+
+    def stop(self):
+        """Cancel the pending replies"""
+        self._pending.clear()
+        self._heap.clear()
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
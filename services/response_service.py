@@ -1,13 +1,68 @@
-from telethon import TelegramClient, events
-from telethon.sessions import StringSession
+from telethon import events, types
 import asyncio
 import logging
 import random
+import re
 from datetime import datetime
 import time
 import threading
-from database.db_mongodb import Database
-from config.config import API_ID, API_HASH
+from database import Database
+from config.config import API_ID, API_HASH, AUTO_REPLY_MAX_PENDING, AUTO_REPLY_CHAT_WINDOW
+from services.client_pool import client_pool
+from services.keyword_matcher import KeywordMatcher
+from services.log_sink import response_log_sink
+from services.reply_scheduler import ReplyScheduler
+
+class MentionMatcher:
+    """
+    Decides whether a group message names the account, with one precompiled regex and no network calls.
+    Matches @username (and any extra active usernames) and the first name, case-insensitively.
+    """
+
+    def __init__(self):
+        self.user_id = None
+        self._pattern = None
+
+    def update_from_user(self, me):
+        """Rebuild from a User (e.g. the result of client.get_me())"""
+        self.user_id = me.id
+        self.update_names(me.first_name, self._usernames(me.username, getattr(me, 'usernames', None)))
+
+    def update_from_event(self, update):
+        """Rebuild from an UpdateUserName for this account"""
+        self.update_names(update.first_name, self._usernames(getattr(update, 'username', None), getattr(update, 'usernames', None)))
+
+    @staticmethod
+    def _usernames(username, usernames):
+        names = [username] if username else []
+        for item in usernames or []:
+            if getattr(item, 'active', True) and item.username not in names:
+                names.append(item.username)
+        return names
+
+    def update_names(self, first_name, usernames):
+        alternatives = []
+        if usernames:
+            # (?!\w) so @name does not match @name_other
+            alternatives.append(r'@(?:' + '|'.join(re.escape(name) for name in usernames) + r')(?!\w)')
+        if first_name and first_name.strip():
+            alternatives.append(re.escape(first_name.strip()))
+        self._pattern = re.compile('|'.join(alternatives), re.IGNORECASE) if alternatives else None
+
+    def matches(self, message_text):
+        return bool(self._pattern and message_text and self._pattern.search(message_text))
+
+
+# Keyword categories in priority order: a message gets the first category with a matching keyword
+DEFAULT_KEYWORDS = [
+    ('greetings', ['مرحبا', 'اهلا', 'السلام', 'هاي', 'هلا', 'موجود']),
+    ('thanks', ['شكرا', 'مشكور', 'تسلم']),
+    ('help', ['?', 'كيف', 'ممكن', 'ساعدني', 'مساعدة', 'بوت']),
+    ('affirmative', ['نعم', 'اي', 'صح', 'تمام', 'اوك']),
+    ('negative', ['لا', 'مش', 'مو', 'غير']),
+    ('private', ['بكم', 'اسعار']),  # Use private response for pricing questions
+]
+
 
 class ResponseService:
     def __init__(self):
@@ -26,6 +81,12 @@ class ResponseService:
             'help': ['جرب كذا', 'ممكن تحاول بطريقة ثانية', 'حاول مرة ثانية'],
             'private': ['مش هنا انتظرني', 'مشغول شويه بحيك']  # New response type for private messages
         }
+        
+        # Compiled keyword matchers: the default one, and one per user with custom keywords
+        self.default_keyword_matcher = KeywordMatcher(DEFAULT_KEYWORDS, 'greetings')
+        self.keyword_matchers = {}  # {user_id: KeywordMatcher}
+        # Parsed responses documents per user: {user_id: (responses, keywords)}
+        self.response_cache = {}
     
     async def start_auto_response(self, user_id):
         """
@@ -45,20 +106,31 @@ class ResponseService:
             
             session_string = user['session_string']
             
-            # Create client with session string
-            client = TelegramClient(StringSession(session_string), API_ID, API_HASH)
-            await client.connect()
+            # Borrow the account's shared client from the pool (reuses an existing connection if any)
+            client = await client_pool.acquire(session_string, API_ID, API_HASH)
             
             # Check if session is valid
-            if not await client.is_user_authorized():
-                await client.disconnect()
+            if client is None:
                 return (False, "جلسة غير صالحة. يرجى تسجيل الدخول مرة أخرى.")
             
             # Get user responses from database or use defaults
             user_responses = self.get_user_responses(user_id)
             
+            # Resolve the account identity once; UpdateUserName keeps the matcher current
+            mention_matcher = MentionMatcher()
+            try:
+                mention_matcher.update_from_user(await client_pool.call(client, client.get_me))
+            except Exception as e:
+                self.logger.error(f"Error resolving account for auto-response: {str(e)}")
+            
+            # Delayed replies are queued here instead of sleeping inside the handler
+            reply_scheduler = ReplyScheduler(client, AUTO_REPLY_MAX_PENDING, AUTO_REPLY_CHAT_WINDOW)
+            
+            async def handle_user_name_update(update):
+                if update.user_id == mention_matcher.user_id:
+                    mention_matcher.update_from_event(update)
+            
             # Register event handlers for group messages
-            @client.on(events.NewMessage(incoming=True))
             async def handle_new_message(event):
                 try:
                     # Skip messages from self
@@ -74,56 +146,46 @@ class ResponseService:
                         # Get random response for private messages
                         response = self.get_random_response(user_responses, 'private')
                         
-                        # Add natural delay (1-2 seconds for private messages)
-                        delay = random.uniform(1, 2)
-                        await asyncio.sleep(delay)
-                        
-                        # Send response
-                        if event and hasattr(event, 'reply'):
-                            reply = await event.reply(response)
-                            # Log response
-                            if reply:
-                                self.log_response(user_id, event.chat_id, message_text, response, is_private=True)
+                        # Reply after a natural delay (1-2 seconds for private messages)
+                        chat_id = event.chat_id
+                        reply_scheduler.schedule(
+                            chat_id, event.input_chat or chat_id, event.message.id, response, random.uniform(1, 2),
+                            lambda: self.log_response(user_id, chat_id, message_text, response, is_private=True)
+                        )
                         return
                     
                     # For group messages, check if the user is mentioned
-                    me = await client.get_me()
-                    
-                    is_mentioned = False
-                    if event.message.mentioned:
-                        is_mentioned = True
-                    elif me.username and f"@{me.username}" in message_text:
-                        is_mentioned = True
-                    elif me.first_name and me.first_name.lower() in message_text.lower():
-                        is_mentioned = True
-                    
-                    if not is_mentioned:
+                    if not event.message.mentioned and not mention_matcher.matches(message_text):
                         return
                     
                     # Determine response type based on message content
-                    response_type = self.determine_response_type(message_text)
+                    response_type = self.determine_response_type(message_text, user_id)
                     
                     # Get random response for the type
                     response = self.get_random_response(user_responses, response_type)
                     
-                    # Add 10-second delay for group messages as requested
-                    await asyncio.sleep(10)
-                    
-                    # Send response
-                    if event and hasattr(event, 'reply'):
-                        reply = await event.reply(response)
-                        # Log response
-                        if reply:
-                            self.log_response(user_id, event.chat_id, message_text, response, is_private=False)
-                    else:
-                        self.logger.error("Event object does not have reply method or is None")
+                    # Reply after a 10-second delay for group messages as requested
+                    chat_id = event.chat_id
+                    reply_scheduler.schedule(
+                        chat_id, event.input_chat or chat_id, event.message.id, response, 10,
+                        lambda: self.log_response(user_id, chat_id, message_text, response, is_private=False)
+                    )
                     
                 except Exception as e:
                     self.logger.error(f"Error in handle_new_message: {str(e)}")
             
+            # Handlers run on the pool loop that owns the client
+            new_message_event = events.NewMessage(incoming=True)
+            await client_pool.call(client, client.add_event_handler, handle_new_message, new_message_event)
+            user_name_event = events.Raw(types.UpdateUserName)
+            await client_pool.call(client, client.add_event_handler, handle_user_name_update, user_name_event)
+            
             # Store client instance
             self.active_clients[user_id] = {
                 'client': client,
+                'handler': (handle_new_message, new_message_event),
+                'name_handler': (handle_user_name_update, user_name_event),
+                'reply_scheduler': reply_scheduler,
                 'status': 'running',
                 'start_time': datetime.now()
             }
@@ -153,9 +215,16 @@ class ResponseService:
             if user_id not in self.active_clients:
                 return (False, "الردود التلقائية غير نشطة حالياً.")
             
-            # Disconnect client
+            # Detach the handler and return the shared client to the pool
             client = self.active_clients[user_id]['client']
-            await client.disconnect()
+            for key in ('handler', 'name_handler'):
+                handler = self.active_clients[user_id].get(key)
+                if handler:
+                    await client_pool.call(client, client.remove_event_handler, *handler)
+            reply_scheduler = self.active_clients[user_id].get('reply_scheduler')
+            if reply_scheduler:
+                await client_pool.call(client, reply_scheduler.stop)
+            await client_pool.release(client)
             
             # Remove client instance
             del self.active_clients[user_id]
@@ -206,6 +275,68 @@ class ResponseService:
             self.logger.error(f"Error in get_auto_response_status: {str(e)}")
             return (False, f"حدث خطأ أثناء جلب حالة الردود التلقائية: {str(e)}")
     
+    def _load_user_responses(self, user_id):
+        """
+        Load all responses documents of user in one query and cache them parsed
+        Response types without a document are seeded with the defaults in one batched insert
+        Returns:
+            - (responses, keywords) tuple of dicts keyed by response type
+        """
+        cached = self.response_cache.get(user_id)
+        if cached is not None:
+            return cached
+        
+        documents = {}
+        for document in self.responses_collection.find(
+            {'user_id': user_id}, projection={'response_type': 1, 'response_text': 1, 'keywords': 1}
+        ):
+            documents[document.get('response_type')] = document
+        
+        user_responses = {}
+        user_keywords = {}
+        seed_operations = []
+        for response_type in self.default_responses:
+            document = documents.get(response_type)
+            if document and document.get('response_text'):
+                # تحويل النص إلى قائمة إذا كان مخزناً كنص
+                response_text = document['response_text']
+                if isinstance(response_text, str):
+                    # تقسيم النص إلى قائمة باستخدام الفاصلة
+                    user_responses[response_type] = [r.strip() for r in response_text.split(',')]
+                else:
+                    user_responses[response_type] = [response_text]
+            else:
+                # Use default responses; only documents that do not exist yet are saved,
+                # an existing document is never overwritten with the defaults
+                user_responses[response_type] = self.default_responses[response_type]
+                if not document:
+                    seed_operations.append({'insert_one': {'document': {
+                        'user_id': user_id,
+                        'response_type': response_type,
+                        'response_text': ','.join(self.default_responses[response_type]),
+                        'is_active': 1,
+                        'created_at': datetime.now(),
+                        'updated_at': datetime.now()
+                    }}})
+            
+            keywords = document.get('keywords') if document else None
+            if isinstance(keywords, str):
+                keywords = [k.strip() for k in keywords.split(',')]
+            if keywords:
+                user_keywords[response_type] = [k for k in keywords if k]
+        
+        if seed_operations and self.responses_collection.bulk_write(seed_operations) is None:
+            # Not cached, so the seeding is retried on next load
+            return user_responses, user_keywords
+        
+        self.response_cache[user_id] = (user_responses, user_keywords)
+        return user_responses, user_keywords
+    
+    def invalidate_user_responses(self, user_id):
+        """Drop the cached responses and keyword matcher of user"""
+        self.response_cache.pop(user_id, None)
+        self.keyword_matchers.pop(user_id, None)
+    
     def get_user_responses(self, user_id):
         """
         Get user responses from database or use defaults
@@ -213,40 +344,8 @@ class ResponseService:
             - dict of response types and their responses
         """
         try:
-            # Get user responses from database
-            user_responses = {}
-            
-            for response_type in self.default_responses:
-                responses = self.responses_collection.find_one({
-                    'user_id': user_id,
-                    'response_type': response_type
-                })
-                
-                if responses and 'response_text' in responses:
-                    # تحويل النص إلى قائمة إذا كان مخزناً كنص
-                    response_text = responses['response_text']
-                    if isinstance(response_text, str):
-                        # تقسيم النص إلى قائمة باستخدام الفاصلة
-                        user_responses[response_type] = [r.strip() for r in response_text.split(',')]
-                    else:
-                        user_responses[response_type] = [response_text]
-                else:
-                    # Use default responses
-                    user_responses[response_type] = self.default_responses[response_type]
-                    
-                    # Save default responses to database
-                    self.responses_collection.update_one(
-                        {'user_id': user_id, 'response_type': response_type},
-                        {'$set': {
-                            'response_text': ','.join(self.default_responses[response_type]),
-                            'is_active': 1,
-                            'created_at': datetime.now(),
-                            'updated_at': datetime.now()
-                        }},
-                        upsert=True
-                    )
-            
-            return user_responses
+            user_responses, _ = self._load_user_responses(user_id)
+            return {response_type: list(responses) for response_type, responses in user_responses.items()}
         except Exception as e:
             self.logger.error(f"Error in get_user_responses: {str(e)}")
             # في حالة حدوث خطأ، استخدم الردود الافتراضية
@@ -275,6 +374,7 @@ class ResponseService:
                 }},
                 upsert=True
             )
+            self.invalidate_user_responses(user_id)
             
             return (True, f"تم تحديث ردود {response_type} بنجاح.")
             
@@ -282,30 +382,82 @@ class ResponseService:
             self.logger.error(f"Error in set_user_responses: {str(e)}")
             return (False, f"حدث خطأ أثناء تحديث الردود: {str(e)}")
     
-    def determine_response_type(self, message_text):
+    def get_user_keywords(self, user_id):
+        """
+        Get the custom keywords of user (the 'keywords' field of their responses documents)
+        Returns:
+            - dict of response types and their keywords
+        """
+        _, user_keywords = self._load_user_responses(user_id)
+        return {response_type: list(keywords) for response_type, keywords in user_keywords.items()}
+    
+    def set_user_keywords(self, user_id, response_type, keywords):
+        """
+        Set custom keywords that classify a message as response_type, in addition to the defaults
+        Returns:
+            - (success, message) tuple
+        """
+        try:
+            if response_type not in self.default_responses:
+                return (False, f"نوع الرد غير صالح: {response_type}")
+            
+            keywords = [k.strip() for k in keywords.split(',')] if isinstance(keywords, str) else list(keywords)
+            # Make sure the responses document exists (seeded with the defaults) so the update
+            # below never creates a document without response_text
+            self._load_user_responses(user_id)
+            # Stored comma-separated like response_text (SQLite cannot bind lists)
+            updated = self.responses_collection.update_one(
+                {'user_id': user_id, 'response_type': response_type},
+                {'$set': {
+                    'keywords': ','.join(k for k in keywords if k),
+                    'updated_at': datetime.now()
+                }}
+            )
+            # Rebuild the matcher on next use
+            self.invalidate_user_responses(user_id)
+            
+            if not updated:
+                self.logger.error(f"Failed to save keywords of {response_type} for user {user_id}")
+                return (False, "حدث خطأ أثناء حفظ الكلمات.")
+            
+            return (True, f"تم تحديث كلمات {response_type} بنجاح.")
+            
+        except Exception as e:
+            self.logger.error(f"Error in set_user_keywords: {str(e)}")
+            return (False, f"حدث خطأ أثناء تحديث الكلمات: {str(e)}")
+    
+    def get_keyword_matcher(self, user_id=None):
+        """
+        Get the compiled keyword matcher for user (built once, rebuilt after set_user_keywords)
+        Returns:
+            - KeywordMatcher
+        """
+        if user_id is None:
+            return self.default_keyword_matcher
+        matcher = self.keyword_matchers.get(user_id)
+        if matcher is None:
+            try:
+                user_keywords = self.get_user_keywords(user_id)
+            except Exception as e:
+                self.logger.error(f"Error in get_keyword_matcher: {str(e)}")
+                return self.default_keyword_matcher
+            if user_keywords:
+                matcher = KeywordMatcher(
+                    [(category, keywords + user_keywords.get(category, [])) for category, keywords in DEFAULT_KEYWORDS],
+                    'greetings'
+                )
+            else:
+                matcher = self.default_keyword_matcher
+            self.keyword_matchers[user_id] = matcher
+        return matcher
+    
+    def determine_response_type(self, message_text, user_id=None):
         """
-        Determine response type based on message content
+        Determine response type based on message content, using user's custom keywords if any
         Returns:
             - response type string
         """
-        message_text = message_text.lower()
-        
-        # Simple keyword-based classification
-        if any(word in message_text for word in ['مرحبا', 'اهلا', 'السلام', 'هاي', 'هلا', 'موجود']):
-            return 'greetings'
-        elif any(word in message_text for word in ['شكرا', 'مشكور', 'تسلم']):
-            return 'thanks'
-        elif '?' in message_text or any(word in message_text for word in ['كيف', 'ممكن', 'ساعدني', 'مساعدة', 'بوت']):
-            return 'help'
-        elif any(word in message_text for word in ['نعم', 'اي', 'صح', 'تمام', 'اوك']):
-            return 'affirmative'
-        elif any(word in message_text for word in ['لا', 'مش', 'مو', 'غير']):
-            return 'negative'
-        elif any(word in message_text for word in ['بكم', 'اسعار']):
-            return 'private'  # Use private response for pricing questions
-        else:
-            # Default to greetings
-            return 'greetings'
+        return self.get_keyword_matcher(user_id).classify(message_text)
     
     def get_random_response(self, user_responses, response_type):
         """
@@ -328,7 +480,7 @@ class ResponseService:
     
     def log_response(self, user_id, chat_id, message, response, is_private=False):
         """
-        Log response in database
+        Log response in database (buffered and written in batches by response_log_sink)
         """
         log = {
             'user_id': user_id,
@@ -339,7 +491,7 @@ class ResponseService:
             'timestamp': datetime.now()
         }
         
-        self.db.get_collection('response_logs').insert_one(log)
+        response_log_sink.write(log)
     
     def get_response_types(self):
         """
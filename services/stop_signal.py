@@ -0,0 +1,62 @@
+import asyncio
+import threading
+
+
+class StopSignal:
+    """إشارة توقف لمهمة نشر: متوافقة مع واجهة threading.Event (set/is_set/wait)
+    ويمكن انتظارها داخل حلقة الأحداث دون استطلاع دوري.
+
+    set() يوقظ فوراً جميع الروتينات المنتظرة عبر call_soon_threadsafe على حلقاتها،
+    لذلك لا يكلف الانتظار شيئاً سوى مؤقت واحد في الحلقة حتى انتهاء المهلة."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._waiters = set()  # {(loop, future)}
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def set(self):
+        """تعيين الإشارة (آمنة من أي خيط) وإيقاظ جميع المنتظرين"""
+        with self._lock:
+            self._event.set()
+            waiters = list(self._waiters)
+            self._waiters.clear()
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(self._wake, future)
+            except RuntimeError:
+                # الحلقة مغلقة بالفعل
+                pass
+
+    @staticmethod
+    def _wake(future):
+        if not future.done():
+            future.set_result(True)
+
+    def wait(self, timeout=None):
+        """انتظار متزامن (للاستخدام من الخيوط العادية)"""
+        return self._event.wait(timeout)
+
+    async def wait_async(self, timeout=None):
+        """انتظار الإشارة أو انتهاء المهلة؛ تُرجع True إذا تم تعيين الإشارة"""
+        if self._event.is_set():
+            return True
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (loop, future)
+        with self._lock:
+            if self._event.is_set():
+                return True
+            self._waiters.add(waiter)
+
+        try:
+            await asyncio.wait({future}, timeout=timeout)
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+            if not future.done():
+                future.cancel()
+        return self._event.is_set()
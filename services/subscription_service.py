@@ -1,6 +1,11 @@
 from datetime import datetime, timedelta
+from collections import OrderedDict
+import copy
+import threading
+import time
 import uuid
-from database.db_mongodb import Database
+from database import Database
+from database.async_db import async_db
 from database.models import User, Subscription
 from config.config import ADMIN_USER_ID, DEFAULT_SUBSCRIPTION_DAYS
 import logging
@@ -15,7 +20,7 @@ class FallbackCollection:
     def find_one(self, query):
         logger.warning("Using fallback collection: find_one")
         return None
-    def find(self, query):
+    def find(self, query, *args, **kwargs):
         logger.warning("Using fallback collection: find")
         return []
     def update_one(self, query, update, upsert=False):
@@ -42,6 +47,66 @@ class FallbackCollection:
             deleted_count = 0
         return MockDeleteResult()
 
+class UserCache:
+    """
+    Process-wide LRU/TTL cache of User objects keyed by user_id.
+    Shared by every SubscriptionService instance (handlers, middleware and decorators each create one).
+    Entries expire after ttl seconds so writes made outside SubscriptionService are picked up.
+    """
+
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict() # {user_id: (expires_at, user)}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id):
+        """Return a copy of the cached User, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            # Callers mutate the User before save_user, so never hand out the cached instance
+            return copy.copy(entry[1])
+
+    def put(self, user):
+        with self._lock:
+            self._entries[user.user_id] = (time.monotonic() + self.ttl, copy.copy(user))
+            self._entries.move_to_end(user.user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+# Shared user cache
+user_cache = UserCache()
+
 class SubscriptionService:
     def __init__(self):
         """تهيئة خدمة الاشتراك مع التعامل مع الأخطاء المحتملة"""
@@ -117,11 +182,23 @@ class SubscriptionService:
 
     # Merged get_user from ddd
     def get_user(self, user_id):
+        user = user_cache.get(user_id)
+        if user is not None:
+            return user
         user_data = self.users_collection.find_one({'user_id': user_id})
         if user_data:
-            return User.from_dict(user_data)
+            user = User.from_dict(user_data)
+            user_cache.put(user)
+            return user
         return None
 
+    def invalidate_user(self, user_id):
+        """Drop a cached user after writing its row outside save_user"""
+        user_cache.invalidate(user_id)
+
+    def get_user_cache_stats(self):
+        return user_cache.get_stats()
+
     # NEW: Function to get user and update info if changed
     def get_or_update_user(self, update):
         """Get user from DB, create if not exists, and update info if changed."""
@@ -170,13 +247,26 @@ class SubscriptionService:
     # Merged save_user from ddd
     def save_user(self, user):
         user.updated_at = datetime.now()
-        self.users_collection.update_one(
+        # Invalidate first so a failed write never leaves the old row cached as current
+        user_cache.invalidate(user.user_id)
+        saved = self.users_collection.update_one(
             {'user_id': user.user_id},
             {'$set': user.to_dict()},
             upsert=True
         )
+        if saved:
+            user_cache.put(user)
         return user # ddd version returns user object
 
+    def mark_trial_claimed(self, user_id):
+        """Set trial_claimed on the user's row and drop the cached copy"""
+        result = self.users_collection.update_one(
+            {"user_id": user_id},
+            {"$set": {"trial_claimed": 1}}
+        )
+        user_cache.invalidate(user_id)
+        return result
+
     # Merged create_user from ddd
     def create_user(self, user_id, username=None, first_name=None, last_name=None):
         user = User(user_id, username, first_name, last_name)
@@ -312,16 +402,69 @@ class SubscriptionService:
             logger.error(f"Error removing admin {user_id}: {str(e)}")
             return False, f"❌ حدث خطأ غير متوقع أثناء إلغاء صلاحيات المشرف `{user_id}`."
 
+    # Columns read by User.from_dict; admin-wide scans never need session_string, api_hash, etc.
+    USER_FIELDS = [
+        'user_id', 'username', 'first_name', 'last_name', 'is_admin', 'referral_code',
+        'referred_by', 'trial_claimed', 'subscription_end', 'created_at', 'updated_at'
+    ]
+
     def get_all_users(self):
-        """Get all users from the database."""
+        """Get all users from the database (only the User fields, not sessions or API credentials)."""
         try:
             if self.users_collection is None: return []
-            users_data = self.users_collection.find({})
+            users_data = self.users_collection.find({}, projection=self.USER_FIELDS)
             return [User.from_dict(user_data) for user_data in users_data]
         except Exception as e:
             logger.error(f"Error getting all users: {str(e)}")
             return []
 
+    def iter_all_users(self, batch_size=500):
+        """Stream all users batch by batch in constant memory (for broadcasts and other admin-wide scans)."""
+        try:
+            if self.users_collection is None: return
+            users_data = self.users_collection.find(
+                {}, sort=[('user_id', 1)], projection=self.USER_FIELDS, batch_size=batch_size, lazy=True
+            )
+            for user_data in users_data:
+                yield User.from_dict(user_data)
+        except Exception as e:
+            logger.error(f"Error iterating all users: {str(e)}")
+
+    def count_users(self, query=None):
+        """Count users matching query without loading them."""
+        try:
+            if self.users_collection is None: return 0
+            return self.users_collection.count_documents(query or {})
+        except Exception as e:
+            logger.error(f"Error counting users: {str(e)}")
+            return 0
+
+    # Awaitable variants for handlers on the bot's event loop: the query runs on the
+    # database executor (database.async_db) so a slow commit doesn't block other updates
+    async def get_user_async(self, user_id):
+        return await async_db.run(self.get_user, user_id)
+
+    async def save_user_async(self, user):
+        return await async_db.run(self.save_user, user)
+
+    async def get_or_update_user_async(self, update):
+        return await async_db.run(self.get_or_update_user, update)
+
+    async def create_user_async(self, user_id, username=None, first_name=None, last_name=None):
+        return await async_db.run(self.create_user, user_id, username, first_name, last_name)
+
+    async def add_subscription_async(self, user_id, days=DEFAULT_SUBSCRIPTION_DAYS, added_by=None):
+        return await async_db.run(self.add_subscription, user_id, days, added_by)
+
+    async def remove_subscription_async(self, user_id):
+        return await async_db.run(self.remove_subscription, user_id)
+
+    async def get_all_active_users_async(self):
+        return await async_db.run(self.get_all_active_users)
+
+    async def count_users_async(self, query=None):
+        return await async_db.run(self.count_users, query)
+
     # Keep original get_all_active_users if different from ddd version
     # The ddd version was already merged by the script, let's keep that one.
     def get_all_active_users(self):
@@ -353,7 +496,7 @@ class SubscriptionService:
         """Get all admin users from the database."""
         try:
             if self.users_collection is None: return []
-            users_data = self.users_collection.find({'is_admin': True})
+            users_data = self.users_collection.find({'is_admin': True}, projection=self.USER_FIELDS)
             return [User.from_dict(user_data) for user_data in users_data]
         except Exception as e:
             logger.error(f"Error getting all admins: {str(e)}")
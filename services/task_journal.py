@@ -0,0 +1,191 @@
+import os
+import json
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+
+# تكوين التسجيل
+logger = logging.getLogger(__name__)
+
+
+def _json_default(value):
+    """تحويل كائنات datetime إلى سلاسل ISO أثناء التسلسل"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class TaskJournal:
+    """سجل حالة مهام النشر في جدول SQLite بوضع WAL.
+    كل مهمة سجل مضغوط واحد، والحفظ مؤجل ومجمّع: عدة طلبات حفظ متتالية تنتج معاملة واحدة
+    تكتب فقط المهام التي تغيرت منذ آخر حفظ (الكتابة ذرية بفضل المعاملة)."""
+
+    LEGACY_IMPORT_KEY = "legacy_json_imported"
+
+    def __init__(self, db_path, debounce_seconds=1.0, snapshot_provider=None):
+        self.db_path = db_path
+        self.debounce_seconds = debounce_seconds
+        # دالة تُرجع {task_id: task_data} بالحالة الحالية للمهام عند وقت الحفظ
+        self.snapshot_provider = snapshot_provider
+
+        self._written = {}  # {task_id: آخر نص JSON تمت كتابته}
+        self._timer = None
+        self._timer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS posting_tasks (
+                task_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at TEXT
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS journal_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+        self.conn.commit()
+
+    @staticmethod
+    def _serialize(task_data):
+        return json.dumps(task_data, ensure_ascii=False, separators=(",", ":"), default=_json_default)
+
+    def load(self):
+        """تحميل جميع المهام المحفوظة {task_id: task_data}"""
+        with self._flush_lock:
+            rows = self.conn.execute("SELECT task_id, data FROM posting_tasks").fetchall()
+            tasks = {}
+            for task_id, data in rows:
+                try:
+                    tasks[task_id] = json.loads(data)
+                    self._written[task_id] = data
+                except ValueError as e:
+                    logger.error(f"سجل تالف للمهمة {task_id} في سجل المهام: {str(e)}")
+            return tasks
+
+    def import_legacy_files(self, json_files):
+        """استيراد لمرة واحدة من ملفات JSON القديمة (الملف الأول في القائمة له الأولوية)"""
+        with self._flush_lock:
+            row = self.conn.execute(
+                "SELECT value FROM journal_meta WHERE key = ?", (self.LEGACY_IMPORT_KEY,)
+            ).fetchone()
+            if row:
+                return 0
+
+            imported = {}
+            for json_file in json_files:
+                if not os.path.exists(json_file):
+                    continue
+                try:
+                    with open(json_file, 'r', encoding='utf-8') as f:
+                        loaded_tasks = json.load(f)
+                except Exception as e:
+                    logger.error(f"تعذر قراءة ملف المهام القديم {json_file}: {str(e)}")
+                    continue
+                for task_id, task_data in loaded_tasks.items():
+                    imported.setdefault(task_id, task_data)
+                logger.info(f"تمت قراءة {len(loaded_tasks)} مهمة من الملف القديم {json_file}")
+
+            now = datetime.now().isoformat()
+            with self.conn:
+                for task_id, task_data in imported.items():
+                    self.conn.execute(
+                        "INSERT OR IGNORE INTO posting_tasks (task_id, data, updated_at) VALUES (?, ?, ?)",
+                        (task_id, self._serialize(task_data), now)
+                    )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO journal_meta (key, value) VALUES (?, ?)",
+                    (self.LEGACY_IMPORT_KEY, now)
+                )
+            logger.info(f"تم استيراد {len(imported)} مهمة من ملفات JSON القديمة إلى سجل المهام")
+            return len(imported)
+
+    def request_flush(self):
+        """طلب حفظ مؤجل؛ الطلبات المتتالية خلال فترة التأجيل تُدمج في حفظ واحد"""
+        with self._timer_lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.debounce_seconds, self._timer_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _timer_flush(self):
+        with self._timer_lock:
+            self._timer = None
+        self.flush()
+
+    def flush(self):
+        """كتابة المهام المتغيرة وحذف المهام المزالة في معاملة واحدة"""
+        if self.snapshot_provider is None:
+            return True
+
+        with self._flush_lock:
+            try:
+                snapshot = self.snapshot_provider()
+                serialized = {task_id: self._serialize(task_data) for task_id, task_data in snapshot.items()}
+                changed = {
+                    task_id: data for task_id, data in serialized.items()
+                    if self._written.get(task_id) != data
+                }
+                removed = [task_id for task_id in self._written if task_id not in serialized]
+
+                if not changed and not removed:
+                    return True
+
+                now = datetime.now().isoformat()
+                with self.conn:
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO posting_tasks (task_id, data, updated_at) VALUES (?, ?, ?)",
+                        [(task_id, data, now) for task_id, data in changed.items()]
+                    )
+                    self.conn.executemany(
+                        "DELETE FROM posting_tasks WHERE task_id = ?",
+                        [(task_id,) for task_id in removed]
+                    )
+
+                self._written.update(changed)
+                for task_id in removed:
+                    del self._written[task_id]
+                logger.debug(f"سجل المهام: تم حفظ {len(changed)} مهمة متغيرة وحذف {len(removed)} مهمة")
+                return True
+            except Exception as e:
+                logger.error(f"خطأ في حفظ سجل المهام: {str(e)}")
+                return False
+
+    def stop_running_tasks(self):
+        """تعيين جميع المهام قيد التشغيل إلى stopped مباشرة في السجل (تُستخدم عند الإيقاف الكامل للبوت)"""
+        with self._flush_lock:
+            rows = self.conn.execute("SELECT task_id, data FROM posting_tasks").fetchall()
+            updates = []
+            for task_id, data in rows:
+                try:
+                    task_data = json.loads(data)
+                except ValueError:
+                    continue
+                if task_data.get("status") == "running":
+                    task_data["status"] = "stopped"
+                    updates.append((self._serialize(task_data), datetime.now().isoformat(), task_id))
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE posting_tasks SET data = ?, updated_at = ? WHERE task_id = ?", updates
+                )
+            self._written.clear()
+            return len(updates)
+
+    def close(self):
+        """إلغاء أي حفظ مؤجل، ثم الحفظ النهائي وإغلاق الاتصال"""
+        with self._timer_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self.flush()
+        with self._flush_lock:
+            self.conn.close()
@@ -0,0 +1,133 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+# تكوين التسجيل
+logger = logging.getLogger(__name__)
+
+
+class TaskScheduler:
+    """مجدول مركزي لأوقات تشغيل مهام النشر مبني على كومة صغرى (min-heap).
+
+    خيط واحد ينام حتى أقرب موعد ثم يسلم جميع المهام المستحقة دفعة واحدة إلى دالة dispatch.
+    الإدراج وإعادة الجدولة O(log n)، والإلغاء O(1) بالحذف الكسول (يُتجاهل الإدخال القديم عند خروجه من الكومة)،
+    ولا يوجد أي روتين أو مؤقت خامل لكل مهمة."""
+
+    def __init__(self, dispatch, name="posting-scheduler"):
+        """dispatch: دالة تُستدعى من خيط المجدول بقائمة معرفات المهام المستحقة"""
+        self.dispatch = dispatch
+        self.name = name
+        self._heap = []        # [(fire_at, seq, task_id)]
+        self._entries = {}     # {task_id: (fire_at, seq)} الإدخال الصالح الوحيد لكل مهمة
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        """تشغيل خيط المجدول (مرة واحدة فقط)"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def schedule(self, task_id, fire_at):
+        """جدولة (أو إعادة جدولة) مهمة في وقت محدد (طابع زمني بالثواني)"""
+        self.start()
+        with self._cond:
+            entry = (fire_at, next(self._seq))
+            self._entries[task_id] = entry
+            heapq.heappush(self._heap, (entry[0], entry[1], task_id))
+            self._compact()
+            # إيقاظ الخيط فقط إذا أصبح هذا الموعد هو الأقرب
+            if self._heap[0][2] == task_id:
+                self._cond.notify()
+
+    def cancel(self, task_id):
+        """إلغاء الموعد المجدول لمهمة؛ تُرجع True إذا كانت المهمة مجدولة"""
+        with self._cond:
+            return self._entries.pop(task_id, None) is not None
+
+    def is_scheduled(self, task_id):
+        with self._cond:
+            return task_id in self._entries
+
+    def next_fire_time(self, task_id):
+        """الموعد المجدول للمهمة أو None"""
+        with self._cond:
+            entry = self._entries.get(task_id)
+            return entry[0] if entry else None
+
+    def clear(self):
+        """إلغاء جميع المواعيد"""
+        with self._cond:
+            self._heap = []
+            self._entries = {}
+
+    def _compact(self):
+        """إعادة بناء الكومة عندما تتراكم الإدخالات الملغاة"""
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(fire_at, seq, task_id) for task_id, (fire_at, seq) in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    def _is_current(self, item):
+        fire_at, seq, task_id = item
+        return self._entries.get(task_id) == (fire_at, seq)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                due = []
+                while self._running:
+                    # إسقاط الإدخالات الملغاة من رأس الكومة
+                    while self._heap and not self._is_current(self._heap[0]):
+                        heapq.heappop(self._heap)
+
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+
+                    now = time.time()
+                    if self._heap[0][0] > now:
+                        self._cond.wait(self._heap[0][0] - now)
+                        continue
+
+                    while self._heap and self._heap[0][0] <= now:
+                        item = heapq.heappop(self._heap)
+                        if self._is_current(item):
+                            del self._entries[item[2]]
+                            due.append(item[2])
+                    break
+
+                if not self._running:
+                    return
+
+            try:
+                self.dispatch(due)
+            except Exception as e:
+                logger.error(f"خطأ في تسليم المهام المستحقة من المجدول: {str(e)}")
+
+    def get_stats(self):
+        """إحصائيات المجدول للمراقبة"""
+        with self._cond:
+            return {
+                "scheduled": len(self._entries),
+                "heap_size": len(self._heap),
+                "next_fire_in": round(max(0.0, min(fire_at for fire_at, _ in self._entries.values()) - time.time()), 1)
+                if self._entries else None,
+            }
+
+    def shutdown(self, timeout=5):
+        """إيقاف خيط المجدول"""
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            thread = self._thread
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
@@ -15,12 +15,12 @@ async def subscription_check_callback(update: Update, context: CallbackContext):
     await query.answer()
 
     # Get the channel subscription instance
-    from utils.channel_subscription_fix import enhanced_channel_subscription
+    from utils.channel_subscription import enhanced_channel_subscription
 
-    # Check if user is subscribed to the channel
-    is_subscribed, required_channel = await enhanced_channel_subscription.check_user_subscription(
-        context.bot, user_id
-    )
+    # The user pressed "check again": drop the cached result and ask Telegram
+    enhanced_channel_subscription.invalidate_user_subscription(user_id)
+    required_channel = enhanced_channel_subscription.get_required_channel()
+    is_subscribed = await enhanced_channel_subscription.check_user_subscription(user_id, context.bot)
     if is_subscribed:
         # User is subscribed, show success message
         # Check if required_channel is available before using it
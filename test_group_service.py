@@ -0,0 +1,99 @@
+"""
+Regression tests for GroupService persistence (groups and their cached InputPeer records).
+
+Run from the repository root:
+    python -m pytest -q test_group_service.py
+"""
+import os
+import sqlite3
+
+import pytest
+
+pytest.importorskip("dotenv")
+os.environ.setdefault("BOT_TOKEN", "test-token")
+os.environ.setdefault("DATABASE_BACKEND", "memory")
+
+from benchmarks import fake_telethon
+
+fake_telethon.install()
+
+import services.group_service as group_module
+from database.db import Database as SQLiteDatabase
+from database.db_memory import Database as MemoryDatabase
+
+BACKENDS = {'sqlite': SQLiteDatabase, 'memory': MemoryDatabase}
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def service(request, tmp_path, monkeypatch):
+    """A fresh GroupService on an empty database of the given backend"""
+    database_class = BACKENDS[request.param]
+    monkeypatch.setenv('DATABASE_BACKEND', request.param)
+    monkeypatch.chdir(tmp_path) # SQLite creates data/telegram_bot.db relative to the working directory
+    monkeypatch.setattr(database_class, '_instance', None)
+    monkeypatch.setattr(group_module, 'Database', database_class)
+    service = group_module.GroupService()
+    yield service
+    service.db.close()
+
+
+def test_group_peers_are_stored(service):
+    user_id = 2001
+    groups = [
+        {'group_id': '-1001', 'title': 'قناة', 'username': 'channel_one', 'member_count': 50,
+         'peer': {'peer_type': 'channel', 'peer_id': 1001, 'access_hash': 987654321}},
+        {'group_id': '-2002', 'title': 'مجموعة', 'description': 'وصف',
+         'peer': {'peer_type': 'chat', 'peer_id': 2002, 'access_hash': None}},
+    ]
+    assert service.add_groups(user_id, groups)
+
+    assert service.get_group_peers(user_id) == {
+        '-1001': {'peer_type': 'channel', 'peer_id': 1001, 'access_hash': 987654321},
+        '-2002': {'peer_type': 'chat', 'peer_id': 2002, 'access_hash': None},
+    }
+
+
+def test_old_groups_table_is_migrated(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data')
+    conn = sqlite3.connect(SQLiteDatabase.DB_PATH)
+    conn.execute("CREATE TABLE groups (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, group_id TEXT, "
+                 "title TEXT, blacklisted INTEGER DEFAULT 0, created_at TEXT, updated_at TEXT)")
+    conn.execute("INSERT INTO groups (user_id, group_id, title) VALUES (2002, '-3003', 'قديمة')")
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(SQLiteDatabase, '_instance', None)
+    monkeypatch.setattr(group_module, 'Database', SQLiteDatabase)
+    service = group_module.GroupService()
+    try:
+        assert service.add_group(2002, '-3003', 'قديمة', username='old_group', member_count=7,
+                                 peer={'peer_type': 'chat', 'peer_id': 3003, 'access_hash': None})
+        group = service.groups_collection.find_one({'user_id': 2002, 'group_id': '-3003'})
+        assert (group['username'], group['member_count'], group['peer_id']) == ('old_group', 7, 3003)
+    finally:
+        service.db.close()
+
+
+def test_add_groups_inserts_then_updates(service):
+    user_id = 2003
+    assert service.add_groups(user_id, [
+        {'group_id': '-4001', 'title': 'الأولى', 'member_count': 10},
+        {'group_id': '-4002', 'title': 'الثانية', 'username': 'second_group'},
+    ])
+    assert sorted(group['group_id'] for group in service.get_user_groups(user_id)) == ['-4001', '-4002']
+
+    # Re-importing updates the existing rows in place and adds the new group
+    assert service.add_groups(user_id, [
+        {'group_id': '-4001', 'title': 'الأولى (معدلة)', 'member_count': 12,
+         'peer': {'peer_type': 'channel', 'peer_id': 4001, 'access_hash': 11}},
+        {'group_id': '-4003', 'title': 'الثالثة'},
+    ])
+
+    groups = {group['group_id']: group for group in service.get_user_groups(user_id)}
+    assert sorted(groups) == ['-4001', '-4002', '-4003']
+    assert (groups['-4001']['title'], groups['-4001']['member_count']) == ('الأولى (معدلة)', 12)
+    assert groups['-4002']['username'] == 'second_group'
+    assert service.get_group_peers(user_id) == {
+        '-4001': {'peer_type': 'channel', 'peer_id': 4001, 'access_hash': 11},
+    }
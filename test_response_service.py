@@ -0,0 +1,117 @@
+"""
+Regression tests for ResponseService persistence (custom responses and keywords)
+on the SQLite and memory backends.
+
+Run from the repository root:
+    python -m pytest -q test_response_service.py
+"""
+import os
+
+import pytest
+
+pytest.importorskip("dotenv")
+os.environ.setdefault("BOT_TOKEN", "test-token")
+os.environ.setdefault("DATABASE_BACKEND", "memory")
+
+from benchmarks import fake_telethon
+
+fake_telethon.install()
+
+import services.response_service as response_module
+from database.db import Database as SQLiteDatabase
+from database.db_memory import Database as MemoryDatabase
+
+BACKENDS = {'sqlite': SQLiteDatabase, 'memory': MemoryDatabase}
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def service(request, tmp_path, monkeypatch):
+    """A fresh ResponseService on an empty database of the given backend"""
+    database_class = BACKENDS[request.param]
+    monkeypatch.setenv('DATABASE_BACKEND', request.param)
+    monkeypatch.chdir(tmp_path) # SQLite creates data/telegram_bot.db relative to the working directory
+    monkeypatch.setattr(database_class, '_instance', None)
+    monkeypatch.setattr(response_module, 'Database', database_class)
+    service = response_module.ResponseService()
+    yield service
+    service.db.close()
+
+
+def test_custom_responses_survive_cache_miss(service):
+    user_id = 1001
+    success, _ = service.set_user_responses(user_id, 'greetings', ['هلا والله', 'حياك'])
+    assert success
+
+    service.invalidate_user_responses(user_id)
+    assert service.get_user_responses(user_id)['greetings'] == ['هلا والله', 'حياك']
+
+    # A second miss (after the other types were seeded) must not reset them either
+    service.invalidate_user_responses(user_id)
+    responses = service.get_user_responses(user_id)
+    assert responses['greetings'] == ['هلا والله', 'حياك']
+    assert responses['thanks'] == service.default_responses['thanks']
+
+    stored = service.responses_collection.find_one({'user_id': user_id, 'response_type': 'greetings'})
+    assert stored['response_text'] == 'هلا والله,حياك'
+
+
+def test_missing_types_are_seeded_once(service):
+    user_id = 1002
+    service.get_user_responses(user_id)
+    service.invalidate_user_responses(user_id)
+    service.get_user_responses(user_id)
+
+    documents = service.responses_collection.find({'user_id': user_id})
+    response_types = sorted(document['response_type'] for document in documents)
+    assert response_types == sorted(service.default_responses)
+
+
+def test_custom_keywords_persist(service):
+    user_id = 1003
+    service.set_user_responses(user_id, 'thanks', ['العفو'])
+    success, _ = service.set_user_keywords(user_id, 'thanks', 'يعطيك العافية, ممنون')
+    assert success
+
+    service.invalidate_user_responses(user_id)
+    assert service.get_user_keywords(user_id) == {'thanks': ['يعطيك العافية', 'ممنون']}
+    assert service.get_user_responses(user_id)['thanks'] == ['العفو']
+    assert service.determine_response_type('ممنون منك', user_id) == 'thanks'
+
+
+def test_existing_document_is_not_overwritten(service):
+    user_id = 1004
+    service.responses_collection.insert_one({'user_id': user_id, 'response_type': 'help', 'keywords': 'دعم'})
+
+    assert service.get_user_responses(user_id)['help'] == service.default_responses['help']
+
+    documents = service.responses_collection.find({'user_id': user_id, 'response_type': 'help'})
+    assert len(documents) == 1
+    assert documents[0]['keywords'] == 'دعم'
+    assert not documents[0].get('response_text')
+
+
+def test_response_logs_are_written(service):
+    from services.log_sink import BufferedLogSink
+
+    sink = BufferedLogSink('response_logs', batch_size=10, flush_interval=0.01)
+    for i in range(3):
+        assert sink.write({'user_id': 1005, 'chat_id': -100, 'message': f'msg {i}', 'response': 'تمام',
+                           'is_private': False, 'timestamp': '2026-01-01T00:00:00'})
+    sink.close()
+
+    assert sink.get_stats()['written'] == 3
+    assert sink.get_stats()['dropped'] == 0
+    assert len(service.db.get_collection('response_logs').find({'user_id': 1005})) == 3
+
+
+def test_failed_log_flush_counts_as_dropped(service):
+    from services.log_sink import BufferedLogSink
+
+    sink = BufferedLogSink('response_logs', batch_size=10, flush_interval=60)
+    sink._collection = type('RejectingCollection', (), {'insert_many': lambda self, documents: []})()
+    sink.write({'user_id': 1006})
+    sink.write({'user_id': 1006})
+    sink.close()
+
+    stats = sink.get_stats()
+    assert (stats['written'], stats['dropped'], stats['failed']) == (0, 2, 1)
@@ -3,11 +3,71 @@ import logging
 import json
 import os
 import datetime
+import threading
+import time
+from collections import OrderedDict
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes, MessageHandler, filters
+from telegram.ext import ContextTypes, MessageHandler, ChatMemberHandler, filters
 
 logger = logging.getLogger(__name__)
 
+# حالات العضوية التي تعني أن المستخدم مشترك في القناة
+MEMBER_STATUSES = ('member', 'administrator', 'creator')
+
+class MembershipCache:
+    """ذاكرة مؤقتة محدودة الحجم لنتائج get_chat_member مفتاحها (القناة، المستخدم).
+
+    للنتيجة الإيجابية مدة صلاحية أطول من السلبية: المشترك نادراً ما يغادر،
+    بينما غير المشترك يُتوقع أن يشترك قريباً فيجب إعادة التحقق منه أسرع."""
+
+    def __init__(self, positive_ttl=600, negative_ttl=30, max_size=10000):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # {(channel, user_id): (expires_at, is_member)}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(channel, user_id):
+        return ((channel or "").lower(), user_id)
+
+    def get(self, channel, user_id):
+        """النتيجة المخزنة أو None عند عدم وجودها أو انتهاء صلاحيتها"""
+        key = self._key(channel, user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, channel, user_id, is_member):
+        key = self._key(channel, user_id)
+        ttl = self.positive_ttl if is_member else self.negative_ttl
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, is_member)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, channel, user_id):
+        with self._lock:
+            self._entries.pop(self._key(channel, user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
 class EnhancedChannelSubscription:
     def __init__(self):
         self.required_channel = None
@@ -15,6 +75,12 @@ class EnhancedChannelSubscription:
         self.is_mandatory = False
         self.expiry_date = None
         self.settings_file = os.path.join(os.path.dirname(__file__), 'channel_settings.json')
+        # ذاكرة مؤقتة لنتائج التحقق من العضوية لتجنب طلب Bot API مع كل تحديث
+        self.membership_cache = MembershipCache(
+            positive_ttl=int(os.getenv("CHANNEL_MEMBER_CACHE_TTL", "600")),
+            negative_ttl=int(os.getenv("CHANNEL_NON_MEMBER_CACHE_TTL", "30")),
+            max_size=int(os.getenv("CHANNEL_MEMBER_CACHE_SIZE", "10000"))
+        )
         self.load_settings()
         
         # Define exempt commands - commands that can be used without subscription
@@ -30,6 +96,8 @@ class EnhancedChannelSubscription:
             logger.debug(f"[set_required_channel] Added @ prefix: {channel}") # DEBUG
         self.required_channel = channel
         self.is_mandatory = bool(channel)
+        # نتائج العضوية المخزنة تخص القناة السابقة
+        self.membership_cache.clear()
         logger.debug(f"[set_required_channel] Set channel to: {self.required_channel}, mandatory: {self.is_mandatory}") # DEBUG
 
         # تعيين تاريخ انتهاء الاشتراك الإجباري إذا تم تحديد المدة
@@ -160,22 +228,52 @@ class EnhancedChannelSubscription:
         except Exception as e:
             logger.error(f"خطأ أثناء تحميل إعدادات الاشتراك الإجباري: {str(e)}")
 
-    async def check_user_subscription(self, user_id, bot):
-        """التحقق من اشتراك المستخدم في القناة المطلوبة"""
+    async def check_user_subscription(self, user_id, bot, use_cache=True):
+        """التحقق من اشتراك المستخدم في القناة المطلوبة (مع ذاكرة مؤقتة للنتائج)"""
         if not self.is_mandatory_subscription():
             return True
 
+        channel = self.required_channel
+        if use_cache:
+            cached = self.membership_cache.get(channel, user_id)
+            if cached is not None:
+                return cached
+
         try:
             # التحقق من اشتراك المستخدم في القناة
-            chat_member = await bot.get_chat_member(chat_id=self.required_channel, user_id=user_id)
+            chat_member = await bot.get_chat_member(chat_id=channel, user_id=user_id)
             status = chat_member.status
             # المستخدم مشترك إذا كان عضواً أو مشرفاً أو مالكاً
-            is_subscribed = status in ['member', 'administrator', 'creator']
+            is_subscribed = status in MEMBER_STATUSES
+            self.membership_cache.put(channel, user_id, is_subscribed)
             return is_subscribed
         except Exception as e:
-            logger.error(f"خطأ أثناء التحقق من اشتراك المستخدم {user_id} في القناة {self.required_channel}. نوع الخطأ: {type(e).__name__}. الرسالة: {str(e)}", exc_info=True)
-            # في حالة حدوث خطأ، نفترض أن المستخدم غير مشترك
+            logger.error(f"خطأ أثناء التحقق من اشتراك المستخدم {user_id} في القناة {channel}. نوع الخطأ: {type(e).__name__}. الرسالة: {str(e)}", exc_info=True)
+            # في حالة حدوث خطأ، نفترض أن المستخدم غير مشترك (دون تخزين النتيجة)
+            return False
+
+    def invalidate_user_subscription(self, user_id):
+        """حذف نتيجة العضوية المخزنة للمستخدم (مثلاً عند الضغط على زر التحقق مرة أخرى)"""
+        self.membership_cache.invalidate(self.required_channel, user_id)
+
+    def _is_required_chat(self, chat):
+        """هل المحادثة هي القناة المطلوبة (بالمعرف أو باسم المستخدم)"""
+        channel = self.required_channel
+        if not channel or chat is None:
             return False
+        if chat.username and f"@{chat.username}".lower() == channel.lower():
+            return True
+        return str(chat.id) == channel
+
+    async def chat_member_updated(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """تحديث الذاكرة المؤقتة من تحديثات ChatMemberUpdated للقناة المطلوبة (يتطلب أن يكون البوت مشرفاً فيها)"""
+        chat_member = update.chat_member
+        if not chat_member or not self._is_required_chat(chat_member.chat):
+            return
+        new_member = chat_member.new_chat_member
+        is_member = new_member.status in MEMBER_STATUSES
+        self.membership_cache.put(self.required_channel, new_member.user.id, is_member)
+        logger.debug(f"تحديث عضوية المستخدم {new_member.user.id} في {self.required_channel}: {new_member.status}")
 
     async def check_bot_is_admin(self, bot):
         """التحقق مما إذا كان البوت مشرفاً في القناة المطلوبة"""
@@ -220,16 +318,14 @@ class EnhancedChannelSubscription:
             return
 
         # التحقق من المشرف (المشرفون معفون من التحقق) + تحديث معلومات المستخدم
-        from services.subscription_service import SubscriptionService
-        subscription_service = SubscriptionService()
-        # Use get_or_update_user to ensure user info is fresh
-        db_user = subscription_service.get_or_update_user(update)
-        if not db_user: # Handle case where user couldn't be fetched/created
+        # سياق الطلب يُحسب مرة واحدة هنا وتقرؤه المزخرفات والمعالجات اللاحقة لنفس التحديث
+        from utils.request_context import get_request_context
+        request_context = await get_request_context(update, context)
+        if not request_context or not request_context.db_user: # Handle case where user couldn't be fetched/created
             logger.error(f"[subscription_middleware] Could not get or create user for ID: {user_id}")
             # Don't raise CancelledError here, let the flow continue, maybe it's a non-critical update
             return # Or handle appropriately
-        is_admin = db_user.is_admin
-        if is_admin:
+        if request_context.is_admin:
             return
 
         # Fix: Check if the message is a command and if it's in the exempt list
@@ -240,7 +336,7 @@ class EnhancedChannelSubscription:
                 return
 
         # التحقق من اشتراك المستخدم
-        is_subscribed = await self.check_user_subscription(user_id, context.bot)
+        is_subscribed = await request_context.is_channel_member(context.bot)
         if not is_subscribed:
             # إرسال رسالة الاشتراك الإجباري
             channel = self.get_required_channel()
@@ -290,24 +386,21 @@ def auto_channel_subscription_required(func):
             return # Cannot proceed without user
         user_id = update.effective_user.id
 
-        # التحقق من المشرف (المشرفون معفون من التحقق) + تحديث معلومات المستخدم
-        from services.subscription_service import SubscriptionService
-        subscription_service = SubscriptionService()
-        # Use get_or_update_user to ensure user info is fresh
-        db_user = subscription_service.get_or_update_user(update)
-        if not db_user: # Handle case where user couldn't be fetched/created
+        # التحقق من المشرف (المشرفون معفون من التحقق) + تحديث معلومات المستخدم (من سياق الطلب)
+        from utils.request_context import get_request_context
+        request_context = await get_request_context(update, context)
+        if not request_context or not request_context.db_user: # Handle case where user couldn't be fetched/created
             logger.error(f"[auto_channel_subscription_required] Could not get or create user for ID: {user_id}")
             # Maybe send an error message or just return
             await update.effective_message.reply_text("حدث خطأ أثناء معالجة بيانات المستخدم.")
             return
-        is_admin = db_user.is_admin
 
-        if is_admin:
+        if request_context.is_admin:
             return await func(self, update, context, *args, **kwargs)
 
         # التحقق من اشتراك المستخدم
         if subscription_manager.is_mandatory_subscription():
-            is_subscribed = await subscription_manager.check_user_subscription(user_id, context.bot)
+            is_subscribed = await request_context.is_channel_member(context.bot)
             if not is_subscribed:
                 channel = subscription_manager.get_required_channel()
                 logger.info(f"Decorator check: User {user_id} not subscribed. Required channel: {channel}") # Added logging
@@ -340,5 +433,11 @@ def setup_enhanced_subscription(application):
         MessageHandler(filters.ALL, subscription_manager.subscription_middleware),
         group=-1  # أولوية عالية لضمان تنفيذ الوسيط قبل معالجة الرسائل
     )
+    # إبقاء ذاكرة العضوية محدثة من تحديثات chat_member للقناة المطلوبة
+    # (تصل فقط إذا كان البوت مشرفاً في القناة وتم طلب chat_member ضمن allowed_updates)
+    application.add_handler(
+        ChatMemberHandler(subscription_manager.chat_member_updated, ChatMemberHandler.CHAT_MEMBER),
+        group=-1
+    )
 
     return subscription_manager
@@ -2,6 +2,7 @@ from functools import wraps
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext
 from utils.channel_subscription import subscription_manager
+from utils.request_context import get_request_context
 import logging
 
 # إعداد التسجيل
@@ -21,13 +22,11 @@ def admin_required(func):
     """Decorator to restrict command access to admin users only"""
     @wraps(func)
     async def wrapped(self, update: Update, context: CallbackContext, *args, **kwargs):
-        user_id = update.effective_user.id
-
-        # Get user from subscription service
-        user = self.subscription_service.get_user(user_id)
+        # User facts computed once per update (see utils.request_context)
+        request_context = await get_request_context(update, context)
 
         # Check if user is admin
-        if user and user.is_admin:
+        if request_context and request_context.is_admin:
             return await func(self, update, context, *args, **kwargs)
         else:
             await update.effective_chat.send_message(
@@ -44,28 +43,19 @@ def subscription_required(func):
     """Decorator to restrict command access to users with active subscription"""
     @wraps(func)
     async def wrapped(self, update: Update, context: CallbackContext, *args, **kwargs):
-        user_id = update.effective_user.id
-
-        # Get user from subscription service
-        user = self.subscription_service.get_user(user_id)
-
-        # If user doesn't exist, create a new user with default username
-        if not user:
-            username = update.effective_user.username
-            first_name = update.effective_user.first_name
-            last_name = update.effective_user.last_name
-            user = self.subscription_service.create_user(user_id, username, first_name, last_name)
-            logger.info(f"تم إنشاء مستخدم جديد: {user_id}")
+        # User facts computed once per update; the user is created there if missing (see utils.request_context)
+        request_context = await get_request_context(update, context)
 
         # Check if user has active subscription or is admin
-        if user and (user.has_active_subscription() or user.is_admin):
-            # Check channel subscription automatically - FIX: Use subscription_manager instead of channel_subscription
-            is_subscribed = await subscription_manager.check_user_subscription(user_id, context.bot)
+        if request_context and request_context.db_user and (request_context.has_active_subscription or request_context.is_admin):
             required_channel = subscription_manager.get_required_channel()
 
             # If user is admin, bypass channel subscription check
-            if user.is_admin:
+            if request_context.is_admin:
                 is_subscribed = True
+            else:
+                # Check channel subscription automatically (memoized for the rest of the update)
+                is_subscribed = await request_context.is_channel_member(context.bot)
 
             if is_subscribed:
                 # User is subscribed to the channel, proceed
@@ -0,0 +1,65 @@
+import logging
+
+# إعداد التسجيل
+logger = logging.getLogger(__name__)
+
+# Key of the current update's RequestContext in context.user_data
+REQUEST_CONTEXT_KEY = "_request_context"
+
+# One SubscriptionService for the middleware and decorators instead of one per call
+_subscription_service = None
+
+
+def get_subscription_service():
+    """Shared SubscriptionService instance (created on first use)"""
+    global _subscription_service
+    if _subscription_service is None:
+        from services.subscription_service import SubscriptionService
+        _subscription_service = SubscriptionService()
+    return _subscription_service
+
+
+class RequestContext:
+    """Facts about the user behind one update, computed once and read by the middleware, decorators and handlers"""
+
+    def __init__(self, update_id, user_id, db_user):
+        self.update_id = update_id
+        self.user_id = user_id
+        self.db_user = db_user
+        self.is_admin = bool(db_user and db_user.is_admin)
+        self.has_active_subscription = bool(db_user and db_user.has_active_subscription())
+        # None until checked; mandatory-channel membership needs a Bot API call
+        self.channel_member = None
+
+    async def is_channel_member(self, bot):
+        """Membership in the mandatory channel, checked at most once per update"""
+        if self.channel_member is None:
+            from utils.channel_subscription import subscription_manager
+            self.channel_member = await subscription_manager.check_user_subscription(self.user_id, bot)
+        return self.channel_member
+
+
+async def get_request_context(update, context):
+    """
+    Return the RequestContext of this update, building it on first use.
+
+    The group=-1 subscription middleware builds it for messages; updates that skip the middleware
+    (e.g. callback queries) build it in the first decorator or handler that asks.
+    Returns None for updates without a user.
+    """
+    if not update or not update.effective_user:
+        return None
+
+    user_data = context.user_data
+    request_context = user_data.get(REQUEST_CONTEXT_KEY) if user_data is not None else None
+    if request_context is not None and request_context.update_id == update.update_id:
+        return request_context
+
+    # Get or create the user and refresh the stored Telegram profile fields
+    db_user = await get_subscription_service().get_or_update_user_async(update)
+    if not db_user:
+        logger.error(f"[request_context] Could not get or create user for ID: {update.effective_user.id}")
+    request_context = RequestContext(update.update_id, update.effective_user.id, db_user)
+    if user_data is not None:
+        user_data[REQUEST_CONTEXT_KEY] = request_context
+    return request_context